@@ -6,6 +6,7 @@ import traceback
 from ublox_gps import UbloxGps
 
 from EosPayload.lib.base_drivers.position_aware_driver_base import PositionAwareDriverBase
+from EosPayload.lib.data_log.binary_format import DataLogSchema
 from EosLib.format.formats.position import Position, FlightState
 from EosLib.packet.packet import Packet, DataHeader
 from EosLib.device import Device
@@ -26,6 +27,17 @@ class GPSDriver(PositionAwareDriverBase):
         self.uart = None
         self.gps = None
 
+    @staticmethod
+    def get_data_log_schema() -> DataLogSchema:
+        return DataLogSchema([
+            ('gps_time', 'd'),
+            ('latitude', 'd'),
+            ('longitude', 'd'),
+            ('altitude_m', 'd'),
+            ('speed_m_s', 'd'),
+            ('satellites', 'B'),
+        ])
+
     def setup(self) -> None:
         super().setup()
 
@@ -83,7 +95,7 @@ class GPSDriver(PositionAwareDriverBase):
 
                 data_points = [date_time, gps_lat, gps_long, gps_alt, gps_speed, gps_sat]
                 try:
-                    self.data_log([str(datum) for datum in data_points])
+                    self.data_log(data_points)
                 except Exception as e:
                     logger.warning(f"exception thrown while logging data: {e}\n{traceback.format_exc()}")
 
@@ -101,7 +113,7 @@ class GPSDriver(PositionAwareDriverBase):
                             logger.info("Got first valid GPS fix")
 
                     try:
-                        self._mqtt.send(Topic.RADIO_TRANSMIT, gps_packet)
+                        self.mqtt_send(Topic.RADIO_TRANSMIT, gps_packet)
                         self.last_transmit_time = datetime.datetime.now()
                     except Exception as e:
                         logger.warning(f"exception thrown while sending mqtt packet: {e}\n{traceback.format_exc()}")
@@ -1,17 +1,26 @@
-from inspect import isclass
-from pkgutil import iter_modules
-from pathlib import Path
-from importlib import import_module
-
-# iterate through the modules in the current package
-package_dir = Path(__file__).resolve().parent
-for (_, module_name, _) in iter_modules([str(package_dir)]):
-
-    # import the module and iterate through its attributes
-    module = import_module(f"{__name__}.{module_name}")
-    for attribute_name in dir(module):
-        attribute = getattr(module, attribute_name)
-
-        if isclass(attribute):
-            # Add the class to this package's variables
-            globals()[attribute_name] = attribute
+from EosPayload.lib.driver_registry import DriverInfo, load_driver_class, scan_drivers
+
+""" Driver classes are found by scanning this package's source (see EosPayload.lib.driver_registry) and their modules
+are only imported when a class is first accessed, eg `drivers.GPSDriver`, so importing this package doesn't import
+every driver's dependencies. """
+
+_registry: dict[str, DriverInfo] | None = None
+
+
+def get_registry() -> dict[str, DriverInfo]:
+    """ :return: every driver in this package by class name, scanned on first use """
+    global _registry
+    if _registry is None:
+        _registry = scan_drivers()
+    return _registry
+
+
+def __getattr__(name: str):
+    driver = get_registry().get(name)
+    if driver is None:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+    return load_driver_class(driver)
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(get_registry()))
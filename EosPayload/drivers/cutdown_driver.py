@@ -41,8 +41,8 @@ class CutdownDriver(PositionAwareDriverBase):
         GPIO.output(CutdownDriver.cutdown_pin, GPIO.LOW)
         if self._mqtt:
             mqtt_logger = logging.getLogger(self._pretty_id + ".cutdown-subscriber")
-            self._mqtt.user_data_set({'logger': mqtt_logger, 'queue': self._command_queue})
-            self._mqtt.register_subscriber(Topic.CUTDOWN_COMMAND, self.cutdown_trigger_mqtt)
+            self._mqtt.register_subscriber(Topic.CUTDOWN_COMMAND, self.cutdown_trigger_mqtt,
+                                           {'logger': mqtt_logger, 'queue': self._command_queue})
 
     def cleanup(self):
         try:
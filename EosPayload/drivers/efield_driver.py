@@ -9,6 +9,7 @@ from EosLib.packet.data_header import DataHeader
 from EosLib.packet.definitions import Priority
 
 from EosPayload.lib.base_drivers.driver_base import DriverBase
+from EosPayload.lib.data_log.binary_format import DataLogSchema
 from EosPayload.lib.mqtt import Topic
 
 try:
@@ -25,6 +26,10 @@ class ElectricFieldSensor(DriverBase):
         self.pin_2 = "P9_38"
         self.pin_3 = "P9_40"
 
+    @staticmethod
+    def get_data_log_schema() -> DataLogSchema:
+        return DataLogSchema([('voltage_1', 'd'), ('voltage_2', 'd'), ('voltage_3', 'd')])
+
     def setup(self) -> None:
         super().setup()
         try:
@@ -54,11 +59,8 @@ class ElectricFieldSensor(DriverBase):
                 self._logger.info(f"An error occurred while reading voltages: {e}\n{traceback.format_exc()}")
 
             try:
-                row = []
-                for value in voltages:
-                    row.append(str(value))
                 # logged as Voltage 1, Voltage 2, Voltage 3
-                self.data_log(row)
+                self.data_log(voltages)
             except Exception as e:
                 logger.error(f"An unhandled exception occurred while logging data: {e}\n{traceback.format_exc()}")
 
@@ -74,7 +76,7 @@ class ElectricFieldSensor(DriverBase):
                         body=efield_obj,
                         data_header=header,
                     )
-                    self._mqtt.send(Topic.RADIO_TRANSMIT, packet)
+                    self.mqtt_send(Topic.RADIO_TRANSMIT, packet)
                 except Exception as e:
                     logger.error(f"exception occurred while creating EField format: {e}\n{traceback.format_exc()}")
 
@@ -38,8 +38,7 @@ class PingDriver(DriverBase):
 
     def device_command(self, logger: logging.Logger) -> None:
         if self._mqtt:
-            self._mqtt.user_data_set({'logger': logger})
-            self._mqtt.register_subscriber(Topic.PING_COMMAND, self.ping_reply)
+            self._mqtt.register_subscriber(Topic.PING_COMMAND, self.ping_reply, {'logger': logger})
         counter = 0
         while True:
             self.ping_ground(counter, logger)
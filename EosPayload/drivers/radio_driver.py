@@ -1,8 +1,5 @@
-import threading
-from datetime import datetime
-from queue import PriorityQueue
-
 import logging
+import paho.mqtt.client as mosquitto
 try:
     import pyudev
 except ModuleNotFoundError:
@@ -23,10 +20,15 @@ from EosLib.packet.transmit_header import TransmitHeader
 
 from EosPayload.lib.base_drivers.driver_base import DriverBase
 from EosPayload.lib.mqtt import Topic
+from EosPayload.lib.radio.backpressure import Backpressure
+from EosPayload.lib.radio.aggregation import SUBFRAME_OVERHEAD, AggregationConfig, aggregate_size, encode_frame, \
+    max_subframe_payload, split_frame
+from EosPayload.lib.radio.encoding import MAX_EXPANSION, DeltaDecoder, DeltaEncoder, EncodingConfig, \
+    load_dictionary
+from EosPayload.lib.radio.scheduler import DownlinkConfig, DownlinkScheduler, PutResult, QueuedPacket
 
 
 class RadioDriver(DriverBase):
-    _thread_queue = PriorityQueue()
     sequence_number = 0
 
     # mapping from destination to mqtt topic
@@ -41,11 +43,47 @@ class RadioDriver(DriverBase):
         super().__init__(output_directory, config)
         self.port = None
         self.remote = None
-        self.log_lock = threading.Lock()
+        self._downlink: DownlinkScheduler | None = None
+        self._aggregation = AggregationConfig()
+        self._frames_sent = 0
+        self._packets_aggregated = 0
+        self._encoder: DeltaEncoder | None = None
+        self._dictionary: bytes | None = None
+        self._backpressure_published: bool | None = None
 
     def setup(self) -> None:
         super().setup()
 
+        try:
+            downlink_config = DownlinkConfig.from_settings(self._settings)
+        except ValueError as e:
+            self._logger.error(f"invalid downlink config, using the defaults: {e}")
+            downlink_config = DownlinkConfig()
+        self._downlink = DownlinkScheduler(downlink_config)
+        self._logger.info(f"downlink paced to {downlink_config.rate:g} bytes/s (burst {downlink_config.burst} bytes),"
+                          f" strict classes {[priority.name for priority in downlink_config.strict]}, weights"
+                          f" { {priority.name: weight for priority, weight in downlink_config.weights.items()} },"
+                          f" max wait {downlink_config.max_wait:g}s, capacity {downlink_config.max_packets} packets /"
+                          f" {downlink_config.max_bytes} bytes")
+        try:
+            self._aggregation = AggregationConfig.from_settings(self._settings)
+        except ValueError as e:
+            self._logger.error(f"invalid aggregation config, sending one packet per frame: {e}")
+        if self._aggregation.enabled:
+            self._logger.info(f"aggregating packets into frames of up to {self._aggregation.max_frame} bytes, holding"
+                              f" packets back for up to {self._aggregation.window:g}s")
+        try:
+            encoding_config = EncodingConfig.from_settings(self._settings)
+            self._dictionary = load_dictionary(encoding_config.dictionary)
+            if encoding_config.enabled:
+                self._encoder = DeltaEncoder(encoding_config, self._dictionary)
+                self._logger.info(f"delta encoding {[data_type.name for data_type in encoding_config.types]} packets,"
+                                  f" a keyframe every {encoding_config.keyframe_interval} packets or"
+                                  f" {encoding_config.keyframe_max_age:g}s, dictionary"
+                                  f" {encoding_config.dictionary or 'none'}")
+        except (ValueError, OSError) as e:
+            self._logger.error(f"invalid encoding config, sending packets unencoded: {e}")
+
         try:
             pyudev
         except NameError:
@@ -90,8 +128,7 @@ class RadioDriver(DriverBase):
     def device_read(self, logger: logging.Logger) -> None:
         # TODO: refactor to move this stuff to setup, a separate thread is pointless
         # Receives data from radio and sends it to MQTT
-        def data_receive_callback(xbee_message):
-            packet = xbee_message.data  # raw bytearray packet
+        def receive_packet(packet: bytes):
             logger.info("Packet received ~~~~~~")
             try:
                 packet_object = Packet.decode(bytes(packet))  # convert packet bytearray to packet object
@@ -99,26 +136,22 @@ class RadioDriver(DriverBase):
                 logger.error(f"Exception occurred while receiving packet: {e}\n{traceback.format_exc()}\n{packet}")
                 return
 
-            # Try to data log the packet, but we really don't want to block in a callback
-            if self.log_lock.acquire(blocking=False):
-                try:
+            # data_log hands the row off to the writer thread, so this doesn't block the callback
+            try:
 
-                    '''
-                    READING THE CSV FILE
-                    transmit header makes up first 2 columns:
-                            sequence number, RSSI
-                        data header makes up last 4 columns:
-                            sender, data type, priority, destination
-                    '''
-                    t_h, d_h = packet_object.transmit_header, packet_object.data_header
-                    self.data_log(["received", f"{t_h.send_seq_num}", f"{t_h.send_rssi}", Device(d_h.sender).name,
-                                   Type(d_h.data_type).name, Priority(d_h.priority).name, Device(d_h.destination).name])
+                '''
+                READING THE CSV FILE
+                transmit header makes up first 2 columns:
+                        sequence number, RSSI
+                    data header makes up last 4 columns:
+                        sender, data type, priority, destination
+                '''
+                t_h, d_h = packet_object.transmit_header, packet_object.data_header
+                self.data_log(["received", f"{t_h.send_seq_num}", f"{t_h.send_rssi}", Device(d_h.sender).name,
+                               Type(d_h.data_type).name, Priority(d_h.priority).name, Device(d_h.destination).name])
 
-                except Exception as e:
-                    logger.error(f"Exception occurred while logging packet: {e}")
-                self.log_lock.release()
-            else:
-                logger.warning("Unable to acquire lock to log received packet")
+            except Exception as e:
+                logger.error(f"Exception occurred while logging packet: {e}")
 
             dest = packet_object.data_header.destination  # packet object
             if dest in self.device_map:  # mapping from device to mqtt topic
@@ -128,6 +161,22 @@ class RadioDriver(DriverBase):
             else:
                 logger.info("no mqtt destination mapping")
 
+        decoder = DeltaDecoder(self._dictionary)
+
+        def data_receive_callback(xbee_message):
+            # a frame holds several packets if the other end aggregates them
+            for frame in split_frame(bytes(xbee_message.data)):
+                try:
+                    packet = decoder.decode(frame)  # raw packet
+                except ValueError as e:
+                    logger.error(f"Exception occurred while decoding packet: {e}\n{frame}")
+                    continue
+                if packet is None:
+                    logger.warning(f"dropped a delta encoded packet whose keyframe was lost"
+                                   f" ({decoder.missing_keyframe} so far)")
+                    continue
+                receive_packet(packet)
+
         # Receives data from MQTT and sends it down to ground station according to priority
         def xbee_send_callback(_client, _userdata, message):
             # gets message from MQTT and convert transmit_packet to packet object (look at Thomas code)
@@ -139,31 +188,33 @@ class RadioDriver(DriverBase):
                 packet_from_mqtt.transmit_header = new_transmit_header
 
                 # Store to data file
-                if self.log_lock.acquire(blocking=False):
-                    try:
-
-                        '''
-                        READING THE CSV FILE
-                        transmit header makes up first 2 columns:
-                            sequence number, RSSI
-                        data header makes up last 4 columns:
-                            sender, data type, priority, destination
-                        '''
-                        t_h, d_h = packet_from_mqtt.transmit_header, packet_from_mqtt.data_header
-                        self.data_log(["sent", f"{t_h.send_seq_num}", f"{t_h.send_rssi}", Device(d_h.sender).name,
-                                       Type(d_h.data_type).name, Priority(d_h.priority).name,
-                                       Device(d_h.destination).name])
-                    except Exception as e:
-                        logger.error(f"Exception occurred while logging packet: {e}")
-
-                    self.log_lock.release()
-                else:
-                    logger.warning("Unable to acquire lock to log sent packet")
+                try:
+
+                    '''
+                    READING THE CSV FILE
+                    transmit header makes up first 2 columns:
+                        sequence number, RSSI
+                    data header makes up last 4 columns:
+                        sender, data type, priority, destination
+                    '''
+                    t_h, d_h = packet_from_mqtt.transmit_header, packet_from_mqtt.data_header
+                    self.data_log(["sent", f"{t_h.send_seq_num}", f"{t_h.send_rssi}", Device(d_h.sender).name,
+                                   Type(d_h.data_type).name, Priority(d_h.priority).name,
+                                   Device(d_h.destination).name])
+                except Exception as e:
+                    logger.error(f"Exception occurred while logging packet: {e}")
 
                 # add packet to queue
-                priority = packet_from_mqtt.data_header.priority
+                priority = Priority(packet_from_mqtt.data_header.priority)
                 logger.info(f"Enqueuing packet seq={self.sequence_number}")
-                self._thread_queue.put((priority, datetime.now(), packet_from_mqtt,))
+                result = self._downlink.put(packet_from_mqtt, packet_from_mqtt.encode(), priority)
+                d_h = packet_from_mqtt.data_header
+                if result == PutResult.SUPERSEDED:
+                    logger.info(f"packet seq={self.sequence_number} superseded a queued {Type(d_h.data_type).name}"
+                                f" packet from {Device(d_h.sender).name}")
+                elif result == PutResult.DROPPED:
+                    logger.warning(f"downlink queue full, dropped {priority.name} packet seq={self.sequence_number}"
+                                   f" from {Device(d_h.sender).name}")
 
                 self.sequence_number = (self.sequence_number + 1) % 256  # sequence number can't exceed 255
             except Exception as e:
@@ -175,17 +226,104 @@ class RadioDriver(DriverBase):
 
     # queue thread stuff
     def device_command(self, logger: logging.Logger) -> None:
+        # sends queued packets as fast as the downlink scheduler's pacing allows, in the order it picks
+        metrics_interval = self._downlink.config.metrics_interval
+        next_metrics = time.monotonic() + metrics_interval
         while True:
-            # TODO: refactor to be non-blocking so stop signal can be checked
-            (priority, timestamp, packet) = self._thread_queue.get()
-            logger.info(f":: = {packet.body}")
+            self.check_stop_signal(logger)
+            self._publish_backpressure(logger)
+            entry = self._downlink.get(timeout=1)
+            if metrics_interval and time.monotonic() >= next_metrics:
+                next_metrics = time.monotonic() + metrics_interval
+                logger.info(f"downlink metrics ({self._frames_sent} frames, {self._packets_aggregated} packets sent"
+                            f" in aggregate frames, queue {self._downlink.fill():.0%} full):"
+                            + "".join(f"\n\t{priority.name}: {metrics}"
+                                      for priority, metrics in self._downlink.metrics().items()))
+                if self._encoder is not None:
+                    logger.info("encoding metrics:" + "".join(f"\n\t{Type(data_type).name}: {stats}"
+                                                              for data_type, stats in self._encoder.stats.items()))
+            if entry is None:
+                continue
+            self._encode(entry)
+            entries = self._fill_frame(entry) if self._aggregation.enabled else [entry]
+            for entry in entries:
+                logger.info(f":: = {entry.packet.body}")
             try:
-                self.port.send_data_async(self.remote, packet.encode(), transmit_options=1)
+                self.port.send_data_async(self.remote, encode_frame([entry.payload for entry in entries]),
+                                          transmit_options=1)
+                self._frames_sent += 1
+                if len(entries) > 1:
+                    self._packets_aggregated += len(entries)
             except Exception as e:
-                self._logger.error(f"exception occurred while attempting to send a packet via radio: {e}"
-                                   f"\n{traceback.format_exc()}")
+                logger.error(f"exception occurred while attempting to send a packet via radio: {e}"
+                             f"\n{traceback.format_exc()}")
+                if self._encoder is not None:
+                    # the frame may have held a keyframe, which later deltas must not be sent against
+                    for entry in entries:
+                        self._encoder.forget(entry.packet.data_header.sender, entry.packet.data_header.data_type)
+
+    def _fill_frame(self, first: QueuedPacket) -> list[QueuedPacket]:
+        """ Takes more queued packets to send in the same frame as `first`, until the frame is full, the next packet
+        doesn't fit, or the aggregation window has passed.  The window bounds how long `first` is held back.
+
+        :param first: the packet the frame starts with
+        :return: the packets to send in the frame, in order
+        """
+        max_payload = max_subframe_payload(self._aggregation.max_frame)
+        if len(first.payload) > max_payload:
+            return [first]
+        entries = [first]
+        size = aggregate_size([first.payload])
+        deadline = time.monotonic() + self._aggregation.window
+        # packets are encoded after they are taken, which may make them longer
+        expansion = MAX_EXPANSION if self._encoder is not None else 0
+        while size + SUBFRAME_OVERHEAD + expansion < self._aggregation.max_frame:
+            space = self._aggregation.max_frame - size - SUBFRAME_OVERHEAD - expansion
+            entry = self._downlink.get(max(0.0, deadline - time.monotonic()),
+                                       max_size=min(max_payload - expansion, space), overhead=SUBFRAME_OVERHEAD)
+            if entry is None:
+                break
+            self._encode(entry)
+            entries.append(entry)
+            size += SUBFRAME_OVERHEAD + len(entry.payload)
+        return entries
+
+    def _encode(self, entry: QueuedPacket) -> None:
+        """ Delta encodes and compresses a packet that is about to be sent, if encoding is enabled.  Packets are encoded
+        in the order they are sent, so every delta follows its keyframe on air.  The bytes saved are credited back to
+        the downlink's pacing.
+
+        :param entry: the packet, whose payload is replaced by what to send
+        """
+        if self._encoder is None:
+            return
+        d_h = entry.packet.data_header
+        payload = self._encoder.encode(d_h.sender, d_h.data_type, entry.payload, time.monotonic())
+        self._downlink.refund(entry.priority, len(entry.payload) - len(payload))
+        entry.payload = payload
+
+    def _publish_backpressure(self, logger: logging.Logger) -> None:
+        """ Publishes the downlink's backpressure state on MQTT if it changed since it was last published.  The first
+        call always publishes, replacing whatever an earlier run left retained.  A publish that fails (eg while
+        disconnected) is retried on the next call.
+        """
+        active = self._downlink.backpressure
+        if active == self._backpressure_published or not self._mqtt:
+            return
+        fill = self._downlink.fill()
+        info = self._mqtt.send_state(Topic.RADIO_BACKPRESSURE, Backpressure(active, fill).encode())
+        if info.rc != mosquitto.MQTT_ERR_SUCCESS:
+            return
+        self._backpressure_published = active
+        if active:
+            logger.warning(f"downlink backpressure on, queue {fill:.0%} full")
+        else:
+            logger.info(f"downlink backpressure off, queue {fill:.0%} full")
 
     def cleanup(self):
+        if self._mqtt and self._backpressure_published:
+            # producers shouldn't stay throttled by a radio that isn't running
+            self._mqtt.send_state(Topic.RADIO_BACKPRESSURE, Backpressure().encode())
         if self.port:
             self.port.close()
         super().cleanup()
@@ -20,15 +20,22 @@ from EosLib.packet import Packet
 from EosLib.packet.definitions import Priority
 from EosLib.packet.data_header import DataHeader
 
-from EosPayload.lib.base_drivers.driver_base import DriverBase
+from EosPayload.lib.base_drivers.backpressure_aware_driver_base import BackpressureAwareDriverBase
 from EosPayload.lib.mqtt import Topic
 
 
-class ScienceDriver(DriverBase):
+# seconds between transmitted readings, normally and while the radio is backpressured
+DEFAULT_TRANSMIT_INTERVAL = 5
+DEFAULT_BACKPRESSURE_TRANSMIT_INTERVAL = 30
+
+
+class ScienceDriver(BackpressureAwareDriverBase):
 
     def __init__(self, output_directory: str, config: dict):
         super().__init__(output_directory, config)
         self.count = 0
+        self.transmit_interval = DEFAULT_TRANSMIT_INTERVAL
+        self.backpressure_transmit_interval = DEFAULT_BACKPRESSURE_TRANSMIT_INTERVAL
         self.i2c_bus: I2C | None = None
         self.temp_humidity_sensor: SHTC3 | None = None
         self.barometer: BMP3XX_I2C | None = None
@@ -44,6 +51,18 @@ class ScienceDriver(DriverBase):
         except NameError:
             raise Exception("failed to import pin library")
 
+        settings = self._settings or {}
+        try:
+            transmit_interval = int(settings.get("transmit_interval", DEFAULT_TRANSMIT_INTERVAL))
+            backpressure_transmit_interval = int(settings.get("backpressure_transmit_interval",
+                                                              DEFAULT_BACKPRESSURE_TRANSMIT_INTERVAL))
+        except (TypeError, ValueError) as e:
+            self._logger.error(f"invalid transmit intervals, using the defaults: {e}")
+            transmit_interval, backpressure_transmit_interval = DEFAULT_TRANSMIT_INTERVAL, \
+                DEFAULT_BACKPRESSURE_TRANSMIT_INTERVAL
+        self.transmit_interval = max(1, transmit_interval)
+        self.backpressure_transmit_interval = max(1, backpressure_transmit_interval)
+
         self.register_thread('device-read', self.device_read)
 
         self.i2c_bus = I2C(pin.I2C1_SCL, pin.I2C1_SDA)
@@ -122,8 +141,11 @@ class ScienceDriver(DriverBase):
                 except Exception as e:
                     logger.error(f"An unhandled exception occurred while logging data: {e}\n{traceback.format_exc()}")
 
-                if self.count % 5 == 0:
-                    # only transmit once every 5s
+                interval = self.backpressure_transmit_interval if self.radio_backpressure.active \
+                    else self.transmit_interval
+                if self.count % interval == 0:
+                    # readings are taken every 1s but only transmitted every interval, less often while the radio's
+                    # transmit queue is backed up
                     try:
                         data_header = DataHeader(
                             sender=self.get_device_id(),
@@ -131,7 +153,7 @@ class ScienceDriver(DriverBase):
                             priority=Priority.DATA,
                         )
                         packet = Packet(data, data_header)
-                        self._mqtt.send(Topic.RADIO_TRANSMIT, packet)
+                        self.mqtt_send(Topic.RADIO_TRANSMIT, packet)
                     except Exception as e:
                         logger.error(f"An unhandled exception occurred while transmitting data: {e}"
                                      f"\n{traceback.format_exc()}")
@@ -16,6 +16,7 @@ from EosLib.packet.data_header import DataHeader
 from EosLib.packet.definitions import Priority
 
 from EosPayload.lib.base_drivers.driver_base import DriverBase
+from EosPayload.lib.data_log.binary_format import DataLogSchema
 from EosPayload.lib.mqtt import Topic
 
 
@@ -27,6 +28,15 @@ class TelemetryI2CDriver(DriverBase):
         self.i2c = None
         self.mpr = None
 
+    @staticmethod
+    def get_data_log_schema() -> DataLogSchema:
+        return DataLogSchema([
+            ('temperature_c', 'd'),
+            ('x_rotation', 'd'),
+            ('y_rotation', 'd'),
+            ('z_rotation', 'd'),
+        ])
+
     def setup(self) -> None:
         super().setup()
 
@@ -58,8 +68,7 @@ class TelemetryI2CDriver(DriverBase):
                 continue
 
             try:
-                self.data_log([str(temperature), str(round(x_rotation, 4)),
-                               str(round(y_rotation, 4)), str(round(z_rotation, 4))])
+                self.data_log([temperature, round(x_rotation, 4), round(y_rotation, 4), round(z_rotation, 4)])
             except Exception as e:
                 logger.warning(f"exception occurred while logging data: {e}\n{traceback.format_exc()}")
 
@@ -86,7 +95,7 @@ class TelemetryI2CDriver(DriverBase):
                 body=telemetry_obj,
                 data_header=header,
             )
-            self._mqtt.send(Topic.RADIO_TRANSMIT, packet)
+            self.mqtt_send(Topic.RADIO_TRANSMIT, packet)
 
             count += 1
             self.thread_sleep(logger, 2)
@@ -45,8 +45,8 @@ class ValveDriver(PositionAwareDriverBase):
         
         if self._mqtt:
             mqtt_logger = logging.getLogger(self._pretty_id + ".valve-subscriber")
-            self._mqtt.user_data_set({'logger': mqtt_logger, 'queue': self._command_queue})
-            self._mqtt.register_subscriber(Topic.VALVE_COMMAND, self.valve_trigger_mqtt)
+            self._mqtt.register_subscriber(Topic.VALVE_COMMAND, self.valve_trigger_mqtt,
+                                           {'logger': mqtt_logger, 'queue': self._command_queue})
 
     def cleanup(self):
         try:
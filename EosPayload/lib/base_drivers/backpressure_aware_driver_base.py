@@ -0,0 +1,30 @@
+import logging
+
+from EosPayload.lib.base_drivers.driver_base import DriverBase
+from EosPayload.lib.mqtt import Topic
+from EosPayload.lib.radio.backpressure import Backpressure
+
+
+class BackpressureAwareDriverBase(DriverBase):
+    """ A driver that keeps track of the radio's backpressure, so it can transmit less while the downlink is backed up
+    """
+
+    def __init__(self, output_directory: str, config: dict):
+        super().__init__(output_directory, config)
+        self.radio_backpressure = Backpressure()
+
+    def setup(self) -> None:
+        super().setup()
+        self._mqtt.register_subscriber(Topic.RADIO_BACKPRESSURE, self.backpressure_callback)
+
+    def backpressure_callback(self, _client, _userdata, message):
+        # runs in the MQTT thread, which may not use self._logger
+        logger = logging.getLogger(self._pretty_id + ".thread-mqtt")
+        try:
+            backpressure = Backpressure.decode(message.payload)
+        except ValueError as e:
+            logger.error(f"failed to decode message sent to {Topic.RADIO_BACKPRESSURE.value}: {e}")
+            return
+        if backpressure.active != self.radio_backpressure.active:
+            logger.info(f"radio backpressure {'on' if backpressure.active else 'off'}")
+        self.radio_backpressure = backpressure
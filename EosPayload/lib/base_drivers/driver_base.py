@@ -1,6 +1,9 @@
 from datetime import datetime
+from enum import Enum, unique
+from multiprocessing.connection import Connection
 import logging
 import os
+import signal
 import sys
 import threading
 import time
@@ -13,13 +16,37 @@ from EosLib.packet import Packet
 from EosLib.packet.data_header import DataHeader
 from EosLib.packet.definitions import Priority
 
+from EosPayload.lib.data_log import DataFormat, DataLogConfig
+from EosPayload.lib.data_log.binary_format import DataLogSchema, open_binary_data_file
+from EosPayload.lib.data_log.buffered_writer import BufferedDataWriter
+from EosPayload.lib.data_log.rotation import RotatingDataFile
+from EosPayload.lib.data_log.writer_thread import DataLogStats, DataWriterThread
+from EosPayload.lib.health_table import HealthSlot
 from EosPayload.lib.thread_container import ThreadContainer
-from EosPayload.lib.logger import init_logging
+from EosPayload.lib.logger import LoggingConfig, init_logging, shutdown_logging
 from EosPayload.lib.mqtt import MQTT_HOST, Topic
+from EosPayload.lib.mqtt.batching import BatchConfig, PacketBatcher
 from EosPayload.lib.mqtt.client import Client
+from EosPayload.lib.mqtt.connection_manager import acquire_client, release_client
+from EosPayload.lib.mqtt.resilience import ResilienceConfig
 from EosPayload.lib.util import validate_process_name
 
 
+# how often the driver logs its health and, without a health table, publishes a heartbeat
+HEARTBEAT_INTERVAL = 10  # seconds
+
+
+@unique
+class StartupStatus(str, Enum):
+    READY = 'ready'
+    FAILED = 'failed'
+
+
+class _StopRequested(BaseException):
+    """ Raised in the driver's main thread when orchEOStrator asks it to stop (SIGTERM).  Not an Exception, so the
+    run loop's error handling doesn't swallow it. """
+
+
 class DriverBase:
 
     _mqtt: Client | None
@@ -56,6 +83,16 @@ class DriverBase:
         """
         return []
 
+    @staticmethod
+    def get_data_log_schema() -> DataLogSchema | None:
+        """ [OPTIONAL] Defaults to None. Declares the columns passed to data_log() so they can be stored in the compact
+        binary format when the device's data_log settings select `"format": "binary"`.  Drivers without a schema
+        always log CSV.
+
+        :return: the schema of the values passed to data_log(), or None
+        """
+        return None
+
     #
     # INITIALIZATION AND DESTRUCTION METHODS
     #
@@ -76,7 +113,14 @@ class DriverBase:
         # private -- these variables should never be referenced by subclasses
         self.__threads = {}
         self.__stop_signal = threading.Event()
-        self.__data_file = None
+        self.__data_writer: DataWriterThread | None = None
+        self.__data_schema: DataLogSchema | None = None
+        self.__reported_data_log_drops = 0
+        self.__mqtt_batcher: PacketBatcher | None = None
+        self.__startup_signal: Connection | None = None
+        self.__health_slot: HealthSlot | None = None
+        self.__health_loops = 0
+        self.__stopped = False
 
         # protected -- these variables may be referenced by subclasses.  see restrictions below.
         self._logger = None  # may be referenced only in methods that run in the main thread (setup, cleanup, etc)
@@ -96,8 +140,15 @@ class DriverBase:
         # I don't think there's a need for validation here since orchEOStrator guarantees it's set up
 
         # set up logging
-        init_logging(os.path.join(self._output_directory, 'logs', self._pretty_id + '.log'))
+        logging_config_error = None
+        try:
+            logging_config = LoggingConfig.from_settings(self._settings)
+        except ValueError as e:
+            logging_config, logging_config_error = LoggingConfig(), e
+        init_logging(os.path.join(self._output_directory, 'logs', self._pretty_id + '.log'), logging_config)
         self._logger = logging.getLogger(self._pretty_id)
+        if logging_config_error is not None:
+            self._logger.error(f"invalid logging config, using default logging: {logging_config_error}")
 
         self._logger.info("init complete")
 
@@ -117,20 +168,98 @@ class DriverBase:
 
         # set up mqtt
         try:
-            self._mqtt = Client(MQTT_HOST)
+            spill_path = os.path.join(self._output_directory, 'artifacts', self._pretty_id + '.mqtt-spill')
+            resilience = ResilienceConfig.from_settings(self._settings, spill_path)
+        except ValueError as e:
+            self._logger.error(f"invalid mqtt config, using non-resilient mqtt: {e}")
+            resilience = ResilienceConfig()
+        try:
+            if resilience.resilient:
+                self._logger.info(f"resilient mqtt enabled (reconnect backoff {resilience.reconnect_min_delay}s to"
+                                  f" {resilience.reconnect_max_delay}s, spill file {resilience.spill_path})")
+            self._mqtt = acquire_client(MQTT_HOST, resilience=resilience)
             self.__threads['mqtt'] = ThreadContainer('mqtt', self._mqtt.get_thread(), ThreadStatus.ALIVE)
         except Exception as e:
             self._logger.critical(f"Failed to setup MQTT: {e}\n{traceback.format_exc()}")
 
+        # attach to orchEOStrator's shared-memory health table, if it has one
+        if self.__health_slot is None:
+            try:
+                self.__health_slot = HealthSlot.from_environment(self.get_device_id())
+                if self.__health_slot is not None:
+                    export_interval = self.__health_slot.mqtt_export_interval
+                    self._logger.info(f"reporting health through the shared-memory health table every"
+                                      f" {self.__health_slot.update_interval}s, "
+                                      + (f"exporting heartbeats over MQTT every {export_interval}s" if export_interval
+                                         else "not publishing heartbeats over MQTT"))
+            except Exception as e:
+                self._logger.error(f"failed to attach to the health table, publishing heartbeats over MQTT: {e}")
+
+        # set up mqtt batching
+        try:
+            batch_config = BatchConfig.from_settings(self._settings)
+        except ValueError as e:
+            self._logger.error(f"invalid mqtt_batching config, sending packets unbatched: {e}")
+            batch_config = BatchConfig()
+        if self._mqtt and batch_config.enabled:
+            self.__mqtt_batcher = PacketBatcher(self._mqtt, batch_config, f"{self.get_device_id()}-thread-mqtt-batcher")
+            if self.__mqtt_batcher.thread is not None:
+                self.__threads['mqtt-batcher'] = ThreadContainer('mqtt-batcher', self.__mqtt_batcher.thread,
+                                                                 ThreadStatus.ALIVE)
+            self._logger.info(f"mqtt batching enabled (up to {batch_config.max_packets} packets or"
+                              f" {batch_config.max_bytes} bytes, linger {batch_config.linger}s)")
+
         # open data file
-        self.__data_file = open(os.path.join(self._output_directory, 'data', self._pretty_id + '.dat'), 'a')
+        try:
+            data_log_config = DataLogConfig.from_settings(self._settings)
+        except ValueError as e:
+            self._logger.error(f"invalid data_log config, using the default data logging: {e}")
+            data_log_config = DataLogConfig()
+        data_directory = os.path.join(self._output_directory, 'data')
+        data_path = os.path.join(data_directory, self._pretty_id + '.dat')
+        if data_log_config.format == DataFormat.BINARY and self.get_data_log_schema() is None:
+            self._logger.error("binary data logging requested but driver has no data log schema, logging CSV instead")
+            data_log_config.format = DataFormat.CSV
+        if data_log_config.format == DataFormat.BINARY:
+            self.__data_schema = self.get_data_log_schema()
+            opener = lambda path: open_binary_data_file(path, self.__data_schema)[0]
+        else:
+            opener = lambda path: open(path, 'a')
+
+        if data_log_config.rotate:
+            data_file = RotatingDataFile(data_directory, self._pretty_id, '.dat', opener, data_log_config.rotate_bytes,
+                                         data_log_config.rotate_interval, data_log_config.compression,
+                                         logging.getLogger(self._pretty_id + ".thread-data-compressor"))
+            if data_file.compressor_thread is not None:
+                self.__threads['data-compressor'] = ThreadContainer('data-compressor', data_file.compressor_thread,
+                                                                    ThreadStatus.ALIVE)
+            self._logger.info(f"data file rotation enabled (every {data_log_config.rotate_bytes} bytes or"
+                              f" {data_log_config.rotate_interval}s, compression: {data_log_config.compression.value})")
+        elif data_log_config.format == DataFormat.BINARY:
+            data_file, data_path = open_binary_data_file(data_path, self.__data_schema)
+        else:
+            data_file = opener(data_path)
+        if data_log_config.format == DataFormat.BINARY:
+            self._logger.info("binary data logging enabled")
+        self.__data_writer = DataWriterThread(
+            f"{self.get_device_id()}-thread-data-writer",
+            BufferedDataWriter(data_file, data_log_config),
+            data_log_config,
+            logging.getLogger(self._pretty_id + ".thread-data-writer"),
+        )
+        self.__data_writer.start()
+        self.__threads['data-writer'] = ThreadContainer('data-writer', self.__data_writer.thread, ThreadStatus.ALIVE)
+        if data_log_config.buffered:
+            self._logger.info(f"buffered data logging enabled (flush every {data_log_config.flush_rows} rows,"
+                              f" {data_log_config.flush_bytes} bytes or {data_log_config.flush_interval}s)")
 
     def __del__(self):
         """ Driver destructor.  Responsible for cleanup tasks on graceful shutdown.
         Should never be overriden by subclasses.  Use the cleanup() method instead.
         """
-        self.cleanup()
-        logging.shutdown()
+        if not self.__stopped:
+            self.cleanup()
+            shutdown_logging()
 
     def cleanup(self):
         """ [OPTIONAL] Subclass-defined method to do any clean-up / deinitialization on graceful shutdown.
@@ -142,15 +271,23 @@ class DriverBase:
         """
         self._logger.info("Starting cleanup")
 
-        # close data file
-        self.__data_file.flush()
-        self.__data_file.close()
+        # close data file (drains the writer queue and forces a flush of any buffered rows)
+        if self.__data_writer is not None:
+            self.__data_writer.close(timeout=5)
+            self.__report_data_log_drops()
 
-        # kill mqtt client
-        self._mqtt.loop_stop()  # blocking.  this will join the thread, no way around it sadly
-        self._mqtt.disconnect()
-        self._mqtt.__del__()  # explicitly closing sockets just in case
-        self._mqtt = None
+        # publish any pending batches, then kill mqtt client
+        if self.__mqtt_batcher is not None:
+            self.__mqtt_batcher.close(timeout=5)
+            self.__mqtt_batcher = None
+        if self._mqtt:
+            self._logger.info(f"mqtt connection metrics: {self._mqtt.get_metrics()}")
+            release_client(self._mqtt)
+            self._mqtt = None
+
+        if self.__health_slot is not None:
+            self.__health_slot.close()
+            self.__health_slot = None
 
         # request shutdown for all registered threads
         self.__stop_signal.set()
@@ -162,20 +299,45 @@ class DriverBase:
     # CORE METHODS
     #
 
-    def run(self) -> None:
+    def run(self, startup_signal: Connection | None = None) -> None:
         """ The "main" function for the driver.  Invokes setup() and spawns threads.  Issues heartbeat messages.
         Executes in the Driver Main Thread.
         Should never be overriden by subclasses.  Use device_read or device_command instead.
         Should only ever be invoked by orchEOStrator.
+
+        :param startup_signal: if set, a (StartupStatus, message) tuple is sent on it once the driver's threads have
+                               been started (READY), or if setup() raised (FAILED).  It is closed afterwards.
         """
 
+        self.__startup_signal = startup_signal
+        # orchEOStrator stops drivers with SIGTERM, which runs cleanup() before the process exits.  Ctrl-C sends SIGINT
+        # to every process in the terminal's process group, so it is left to orchEOStrator to stop the drivers
+        signal.signal(signal.SIGTERM, self.__request_stop)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
         self._logger.info("device starting up in " + os.getcwd())
+        try:
+            self.__run()
+        except _StopRequested:
+            self._logger.info("received stop request from orchEOStrator, cleaning up")
+            self.__stopped = True
+            self.cleanup()
+            shutdown_logging()
+
+    def __request_stop(self, _signum, _frame) -> None:
+        """ SIGTERM handler.  Unwinds run() so the driver cleans up; further SIGTERMs are ignored while it does. """
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        raise _StopRequested()
+
+    def __run(self) -> None:
+        """ Runs setup, starts the driver's threads, reports startup and runs the health loop """
         try:
             self._logger.info("running setup")
+            setup_error = None
             try:
                 self.setup()
             except Exception as err:
                 self._logger.error(f"Error occurred while running setup: {err}\n{traceback.format_exc()}")
+                setup_error = err
             self._logger.info("setup complete")
 
             # thread setup
@@ -194,19 +356,50 @@ class DriverBase:
             self._logger.info("done starting threads")
 
             self._logger.info("device startup complete")
-
-            # health check loop
+            if setup_error is not None:
+                self.__signal_startup(StartupStatus.FAILED, f"setup raised {setup_error!r}")
+            else:
+                self.__signal_startup(StartupStatus.READY)
+
+            # health check loop.  With a health table the driver's slot is updated every update_interval, and
+            # heartbeats are only published every mqtt_export_interval (if at all)
+            update_interval = export_interval = HEARTBEAT_INTERVAL
+            if self.__health_slot is not None:
+                update_interval = self.__health_slot.update_interval
+                export_interval = self.__health_slot.mqtt_export_interval
+            next_report = next_export = time.monotonic()
             while True:
-                if not self.is_healthy():
-                    log_message = f"device unhealthy:"
-                    for name, thread_container in self.__threads.items():
-                        log_message += f"\n\tthread-{name} status: {thread_container.status.name}"
-                    self._logger.critical(log_message)
-
-                self.__send_heartbeat()
-                time.sleep(10)
+                healthy = self.is_healthy()
+                self.__update_health_slot(healthy)
+
+                now = time.monotonic()
+                if now >= next_report:
+                    next_report = now + HEARTBEAT_INTERVAL
+                    if not healthy:
+                        log_message = f"device unhealthy:"
+                        for name, thread_container in self.__threads.items():
+                            log_message += f"\n\tthread-{name} status: {thread_container.status.name}"
+                        self._logger.critical(log_message)
+                    self.__report_data_log_drops()
+                if export_interval and now >= next_export:
+                    next_export = now + export_interval
+                    self.__send_heartbeat()
+                time.sleep(update_interval)
         except Exception as err:
             self._logger.error(f"Error occurred in driver run() method: {err}\n{traceback.format_exc()}")
+            self.__signal_startup(StartupStatus.FAILED, f"run raised {err!r}")
+
+    def __signal_startup(self, status: StartupStatus, message: str = "") -> None:
+        """ Reports the outcome of startup to orchEOStrator, if it asked for it and it hasn't been reported yet """
+        startup_signal = self.__startup_signal
+        if startup_signal is None:
+            return
+        self.__startup_signal = None
+        try:
+            startup_signal.send((status, message))
+            startup_signal.close()
+        except OSError as e:
+            self._logger.warning(f"failed to report startup status to orchEOStrator: {e}")
 
     #
     # THREADING METHODS
@@ -317,6 +510,25 @@ class DriverBase:
                 return False
         return True
 
+    def __update_health_slot(self, is_healthy: bool) -> None:
+        """ Overwrites this driver's slot in orchEOStrator's shared-memory health table, if there is one.
+        Should not be overriden or invoked by subclasses.
+
+        :param is_healthy: the result of is_healthy()
+        """
+        if self.__health_slot is None:
+            return
+        self.__health_loops += 1
+        thread_statuses = [thread.status for thread in self.__threads.values()]
+        self.__health_slot.update(
+            is_healthy,
+            0,  # custom state bitvector, as in the heartbeat
+            threading.active_count(),
+            thread_statuses.count(ThreadStatus.ALIVE),
+            thread_statuses.count(ThreadStatus.DEAD),
+            self.__health_loops,
+        )
+
     def __send_heartbeat(self) -> bool:
         """ Dispatches a heartbeat message to MQTT.
         Should not be overriden or invoked by subclasses.
@@ -371,19 +583,59 @@ class DriverBase:
     # DATA REPORTING METHODS
     #
 
-    def data_log(self, data: str | list[str]) -> bool:
-        """ Logs row of data to a CSV file
-        This function is not thread safe -- invoke from at most 1 thread.
+    def mqtt_send(self, topic: Topic, packet: Packet) -> bool:
+        """ Sends a packet over MQTT.  If mqtt_batching is enabled in the device settings, the packet may be held for up
+        to the configured linger time and coalesced with other packets for the same topic.
+        Thread safe.  Non-blocking.
 
-        :param data: an array of strings, or a pre-encoded csv row.  If array, the current isoformat timestamp is
-                     prepended and a newline is appended.
-        :return: True on success, False otherwise
+        :param topic: the topic to send to
+        :param packet: the packet to send
+        :return: True if the packet was sent or queued, False if MQTT is not set up
+        """
+        if self.__mqtt_batcher is not None:
+            return self.__mqtt_batcher.send(topic, packet)
+        if self._mqtt:
+            self._mqtt.send(topic, packet)
+            return True
+        return False
+
+    def get_data_log_stats(self) -> DataLogStats | None:
+        """ :return: counts of rows queued, written, dropped and backpressured by data_log,
+                     or None if the data file is not open """
+        if self.__data_writer is None:
+            return None
+        return self.__data_writer.stats()
+
+    def __report_data_log_drops(self) -> None:
+        """ Logs a warning if data_log has dropped rows since the last report """
+        stats = self.get_data_log_stats()
+        if stats is not None and stats.dropped > self.__reported_data_log_drops:
+            self._logger.warning(f"data log dropped {stats.dropped - self.__reported_data_log_drops} rows because the"
+                                 f" writer queue was full ({stats.dropped} dropped, {stats.backpressured}"
+                                 f" backpressured, {stats.written} written in total)")
+            self.__reported_data_log_drops = stats.dropped
+
+    def data_log(self, data: str | list) -> bool:
+        """ Logs row of data to a CSV file, or a packed record to a binary file if the binary format is enabled
+        Thread safe.  Rows are handed off to the driver's data writer thread, so this never blocks on disk I/O.
+        If the writer queue is full the row is dropped (see get_data_log_stats()).
+        If buffered data logging is enabled in the device settings, rows are written to disk in batches and may
+        remain in memory for up to the configured flush interval.
+
+        :param data: an array of values, or a pre-encoded csv row.  If array, the current timestamp is prepended: for
+                     CSV each value is converted with str(), the isoformat timestamp is prepended and a newline is
+                     appended; for binary the values must match get_data_log_schema().  Pre-encoded rows are not
+                     supported by the binary format.
+        :return: True if the row was queued, False if it was dropped
         """
+        if self.__data_schema is not None:
+            if isinstance(data, str):
+                raise TypeError("pre-encoded csv rows cannot be logged in binary format")
+            return self.__data_writer.put(self.__data_schema.pack(time.time_ns(), data))
+
         if isinstance(data, str):
             data_str = data
         else:
             timestamp = datetime.now().isoformat()
-            data_str = ','.join([timestamp, *data]) + "\n"
-        self.__data_file.write(data_str)
-        self.__data_file.flush()
-        return True
+            data_str = ','.join([timestamp, *[str(datum) for datum in data]]) + "\n"
+        return self.__data_writer.put(data_str)
@@ -1,4 +1,3 @@
-import inspect
 import json
 import logging
 import os
@@ -8,7 +7,7 @@ from copy import deepcopy
 from EosLib import device
 
 from EosPayload import drivers
-from EosPayload.lib.base_drivers.driver_base import DriverBase
+from EosPayload.lib.driver_registry import DriverInfo, load_driver_class
 from EosPayload.lib.orcheostrator.device_container import DeviceContainer, Status
 from EosPayload.lib.util import validate_process_name
 
@@ -47,31 +46,13 @@ class OrcheostratorConfigParser:
         return raw_config
 
     @staticmethod
-    def valid_driver(driver) -> bool:
-        """ Determines if given class is a valid driver.
+    def collect_valid_driver_classes() -> dict[str, DriverInfo]:
+        """ Returns a dict that maps the name of every driver class to where it is defined.  Driver modules are not
+        imported (see EosPayload.lib.driver_registry).
 
-        :param driver: the class in question
-        :return: True if valid, otherwise False
+        :return: A dict of driver names and driver info
         """
-        return (
-                (driver is not None)
-                and inspect.isclass(driver)
-                and inspect.getmodule(driver).__name__.startswith("EosPayload.drivers")
-                and issubclass(driver, DriverBase)
-        )
-
-    @staticmethod
-    def collect_valid_driver_classes() -> dict[str, DriverBase]:
-        """ Iterates over all drivers and returns a dict that maps their name to their class object
-
-        :return: A dict of driver names and classes
-        """
-        valid_driver_classes = {}
-        for attribute_name in dir(drivers):
-            driver = getattr(drivers, attribute_name)
-            if OrcheostratorConfigParser.valid_driver(driver):
-                valid_driver_classes.update({attribute_name: driver})
-        return valid_driver_classes
+        return dict(drivers.get_registry())
 
     @staticmethod
     def get_pretty_id_from_config(config: dict) -> str:
@@ -151,12 +132,17 @@ class OrcheostratorConfigParser:
         settings = device_config.get("settings")
         optional_driver_settings = deepcopy(device_config.get("settings"))
 
-        if driver_class.get_required_config_fields():
+        required_config_fields = driver_class.required_config_fields
+        if required_config_fields is None:
+            # the driver computes its required fields, so its module has to be imported to ask it
+            required_config_fields = load_driver_class(driver_class).get_required_config_fields()
+
+        if required_config_fields:
             if settings is None:
                 self.logger.error(f"{self.config_indent}Driver settings are required but not provided, skipping")
                 return
             self.logger.info(f"{self.config_indent}Required driver settings:")
-            for required_config_field in driver_class.get_required_config_fields():
+            for required_config_field in required_config_fields:
                 if settings.get(required_config_field) is None:
                     self.logger.error(f"{self.config_indent}{self.config_indent}Driver setting "
                                       f"{required_config_field} is required but not provided, skipping")
@@ -0,0 +1,88 @@
+from dataclasses import dataclass
+from enum import Enum, unique
+
+from EosPayload.lib.util import settings_section
+
+# Buffered mode defaults.  Whichever budget is hit first triggers a flush, so the worst-case data-loss window on an
+# unexpected termination is DEFAULT_FLUSH_INTERVAL seconds or DEFAULT_FLUSH_ROWS rows, whichever is smaller.
+DEFAULT_FLUSH_ROWS = 256
+DEFAULT_FLUSH_BYTES = 64 * 1024
+DEFAULT_FLUSH_INTERVAL = 2.0  # seconds
+
+# Rotation is disabled unless a size or interval limit is set.  Closed segments are compressed in the background.
+DEFAULT_ROTATE_BYTES = 0
+DEFAULT_ROTATE_INTERVAL = 0.0  # seconds
+
+# Rows waiting for the writer thread.  Rows logged while the queue is full are dropped after overflow_timeout.
+DEFAULT_QUEUE_CAPACITY = 4096
+DEFAULT_OVERFLOW_TIMEOUT = 0.0  # seconds
+
+
+@unique
+class DataFormat(str, Enum):
+    CSV = 'csv'
+    BINARY = 'binary'
+
+
+@unique
+class Compression(str, Enum):
+    NONE = 'none'
+    GZIP = 'gzip'
+    ZSTD = 'zstd'
+
+
+@dataclass
+class DataLogConfig:
+    buffered: bool = False
+    flush_rows: int = DEFAULT_FLUSH_ROWS
+    flush_bytes: int = DEFAULT_FLUSH_BYTES
+    flush_interval: float = DEFAULT_FLUSH_INTERVAL
+    queue_capacity: int = DEFAULT_QUEUE_CAPACITY
+    overflow_timeout: float = DEFAULT_OVERFLOW_TIMEOUT
+    format: DataFormat = DataFormat.CSV
+    rotate_bytes: int = DEFAULT_ROTATE_BYTES
+    rotate_interval: float = DEFAULT_ROTATE_INTERVAL
+    compression: Compression = Compression.GZIP
+
+    @property
+    def rotate(self) -> bool:
+        return self.rotate_bytes > 0 or self.rotate_interval > 0
+
+    @staticmethod
+    def from_settings(settings: dict | None) -> 'DataLogConfig':
+        """ Builds a config from the optional `data_log` dict in a device's `settings`.
+
+        :param settings: the device settings from the config file (may be None)
+        :return: the data log config.  Unbuffered (flush every row) unless `buffered` is true.
+        :raises ValueError: if a setting is invalid
+        """
+        data_log_settings = settings_section(settings, "data_log")
+        try:
+            data_format = DataFormat(data_log_settings.get("format", DataFormat.CSV))
+            compression = Compression(data_log_settings.get("compression", Compression.GZIP))
+        except ValueError as e:
+            raise ValueError(f"data_log {e}") from e
+        try:
+            config = DataLogConfig(
+                buffered=bool(data_log_settings.get("buffered", False)),
+                flush_rows=int(data_log_settings.get("flush_rows", DEFAULT_FLUSH_ROWS)),
+                flush_bytes=int(data_log_settings.get("flush_bytes", DEFAULT_FLUSH_BYTES)),
+                flush_interval=float(data_log_settings.get("flush_interval", DEFAULT_FLUSH_INTERVAL)),
+                queue_capacity=int(data_log_settings.get("queue_capacity", DEFAULT_QUEUE_CAPACITY)),
+                overflow_timeout=float(data_log_settings.get("overflow_timeout", DEFAULT_OVERFLOW_TIMEOUT)),
+                format=data_format,
+                rotate_bytes=int(data_log_settings.get("rotate_bytes", DEFAULT_ROTATE_BYTES)),
+                rotate_interval=float(data_log_settings.get("rotate_interval", DEFAULT_ROTATE_INTERVAL)),
+                compression=compression,
+            )
+        except TypeError as e:
+            raise ValueError(f"invalid data_log settings: {e}") from e
+        if config.flush_rows < 1 or config.flush_bytes < 1 or config.flush_interval < 0:
+            raise ValueError("data_log flush_rows and flush_bytes must be >= 1 and flush_interval must be >= 0")
+        if config.queue_capacity < 1 or config.overflow_timeout < 0:
+            raise ValueError("data_log queue_capacity must be >= 1 and overflow_timeout must be >= 0")
+        if config.rotate_bytes < 0 or config.rotate_interval < 0:
+            raise ValueError("data_log rotate_bytes and rotate_interval must be >= 0")
+        if not config.buffered:
+            config.flush_rows = 1
+        return config
@@ -0,0 +1,196 @@
+import json
+import math
+import os
+import struct
+from datetime import datetime
+from typing import BinaryIO, Iterator
+
+try:
+    import numpy as np
+except ModuleNotFoundError:
+    pass
+
+from EosPayload.lib.data_log.rotation import open_segment
+
+"""
+Binary data file layout (all integers little-endian):
+    magic           8 bytes, MAGIC
+    header length   uint32, length of the JSON header in bytes
+    header          utf8 JSON: {"version": 1, "fields": [[name, struct type code], ...]}
+    records         fixed-width packed records: int64 timestamp (ns since the epoch) followed by each field
+
+A trailing partial record (eg from a power loss mid-write) is ignored by the readers and truncated away when the file
+is reopened for appending.
+"""
+
+MAGIC = b'EOSDAT\x00\x01'
+VERSION = 1
+TIMESTAMP_FIELD = 'timestamp_ns'
+
+# struct type code -> numpy dtype
+FIELD_TYPES = {
+    'b': '<i1',
+    'B': '<u1',
+    '?': '?',
+    'h': '<i2',
+    'H': '<u2',
+    'i': '<i4',
+    'I': '<u4',
+    'q': '<i8',
+    'Q': '<u8',
+    'f': '<f4',
+    'd': '<f8',
+}
+FLOAT_TYPES = ('f', 'd')
+
+
+class DataLogSchema:
+    """ Describes the columns of a driver's binary data file.  Every record is prefixed with an int64 timestamp. """
+
+    def __init__(self, fields: list[tuple[str, str]]):
+        """
+        :param fields: (name, struct type code) for each column, in order.  See FIELD_TYPES for supported codes.
+        """
+        names = [name for name, _ in fields]
+        if len(set(names)) != len(names) or TIMESTAMP_FIELD in names:
+            raise ValueError(f"field names must be unique and may not be '{TIMESTAMP_FIELD}'")
+        for name, type_code in fields:
+            if type_code not in FIELD_TYPES:
+                raise ValueError(f"field '{name}' has unsupported type '{type_code}'")
+
+        self.fields = [(name, type_code) for name, type_code in fields]
+        self._struct = struct.Struct('<q' + ''.join(type_code for _, type_code in self.fields))
+        self._fills = [math.nan if type_code in FLOAT_TYPES else 0 for _, type_code in self.fields]
+
+    @property
+    def record_size(self) -> int:
+        return self._struct.size
+
+    def pack(self, timestamp_ns: int, values: list) -> bytes:
+        """ Encodes one record.  None values are stored as NaN for float fields and 0 otherwise.
+
+        :param timestamp_ns: the record timestamp in ns since the epoch
+        :param values: one value per field
+        :return: the packed record
+        """
+        if len(values) != len(self.fields):
+            raise ValueError(f"expected {len(self.fields)} values, got {len(values)}")
+        return self._struct.pack(timestamp_ns, *[fill if value is None else value
+                                                 for value, fill in zip(values, self._fills)])
+
+    def unpack_all(self, data: bytes) -> Iterator[tuple]:
+        """ :return: an iterator of (timestamp_ns, *values) tuples for every whole record in data """
+        whole_records = len(data) - len(data) % self.record_size
+        return self._struct.iter_unpack(data[:whole_records])
+
+    def header(self) -> bytes:
+        """ :return: the file header for this schema """
+        header_json = json.dumps({"version": VERSION, "fields": self.fields}).encode()
+        return MAGIC + struct.pack('<I', len(header_json)) + header_json
+
+    def numpy_dtype(self):
+        """ :return: a numpy structured dtype matching one record """
+        try:
+            np
+        except NameError:
+            raise Exception("failed to import numpy library")
+        return np.dtype([(TIMESTAMP_FIELD, '<i8')] + [(name, FIELD_TYPES[type_code])
+                                                       for name, type_code in self.fields])
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, DataLogSchema) and self.fields == other.fields
+
+
+def read_header(file: BinaryIO) -> tuple[DataLogSchema, int]:
+    """ Reads the header of a binary data file
+
+    :param file: a binary file positioned at the start of the data file
+    :return: the schema and the offset of the first record
+    """
+    if file.read(len(MAGIC)) != MAGIC:
+        raise ValueError("not an EosPayload binary data file")
+    (header_length,) = struct.unpack('<I', file.read(4))
+    header = json.loads(file.read(header_length))
+    if header.get("version") != VERSION:
+        raise ValueError(f"unsupported binary data file version {header.get('version')}")
+    return DataLogSchema([tuple(field) for field in header["fields"]]), len(MAGIC) + 4 + header_length
+
+
+def open_binary_data_file(path: str, schema: DataLogSchema) -> tuple[BinaryIO, str]:
+    """ Opens a binary data file for appending, writing the header if the file is new.
+    If the file already exists with a different schema (or isn't a binary data file), the next free path of the form
+    `<name>.<n><ext>` is used instead so existing data is never mixed with incompatible records.
+
+    :param path: the preferred path of the data file
+    :param schema: the schema of the records that will be written
+    :return: the open file and the path that was actually used
+    """
+    root, ext = os.path.splitext(path)
+    candidate = path
+    suffix = 0
+    while True:
+        if not os.path.exists(candidate) or os.path.getsize(candidate) == 0:
+            file = open(candidate, 'wb')
+            file.write(schema.header())
+            file.flush()
+            return file, candidate
+
+        try:
+            with open(candidate, 'rb') as existing:
+                existing_schema, data_offset = read_header(existing)
+        except (ValueError, struct.error, json.JSONDecodeError, UnicodeDecodeError, KeyError, TypeError):
+            existing_schema, data_offset = None, 0
+
+        if existing_schema == schema:
+            # drop any partial record left behind by an unclean shutdown so appended records stay aligned
+            size = os.path.getsize(candidate)
+            partial = (size - data_offset) % schema.record_size
+            if partial:
+                os.truncate(candidate, size - partial)
+            return open(candidate, 'ab'), candidate
+
+        suffix += 1
+        candidate = f"{root}.{suffix}{ext}"
+
+
+def read_binary_data_file(path: str, mmap: bool = False):
+    """ Loads a binary data file into a numpy structured array with a single np.fromfile / np.memmap call.
+    Columns are accessed by field name, eg `data['timestamp_ns']`.
+
+    :param path: the binary data file
+    :param mmap: if True, memory-map the file instead of reading it into memory
+    :return: a numpy structured array with one element per record
+    """
+    try:
+        np
+    except NameError:
+        raise Exception("failed to import numpy library")
+
+    with open(path, 'rb') as file:
+        schema, data_offset = read_header(file)
+    dtype = schema.numpy_dtype()
+    count = (os.path.getsize(path) - data_offset) // dtype.itemsize
+    if mmap:
+        return np.memmap(path, dtype=dtype, mode='r', offset=data_offset, shape=(count,))
+    return np.fromfile(path, dtype=dtype, count=count, offset=data_offset)
+
+
+def binary_to_csv(src_path: str, dst_path: str) -> int:
+    """ Converts a binary data file to the CSV format written by DriverBase.data_log: an isoformat timestamp
+    followed by each field.  Does not require numpy.  Compressed data segments are decompressed on the fly.
+
+    :param src_path: the binary data file
+    :param dst_path: the CSV file to write
+    :return: the number of rows written
+    """
+    with open_segment(src_path) as src:
+        schema, _ = read_header(src)
+        data = src.read()
+
+    rows = 0
+    with open(dst_path, 'w') as dst:
+        for timestamp_ns, *values in schema.unpack_all(data):
+            timestamp = datetime.fromtimestamp(timestamp_ns / 1e9).isoformat()
+            dst.write(','.join([timestamp, *[str(value) for value in values]]) + "\n")
+            rows += 1
+    return rows
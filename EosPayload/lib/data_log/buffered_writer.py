@@ -0,0 +1,71 @@
+import time
+from typing import BinaryIO, TextIO
+
+from EosPayload.lib.data_log import DataFormat, DataLogConfig
+
+
+class BufferedDataWriter:
+    """ Accumulates data rows in memory and writes them to the underlying file in batches.
+
+    A batch is written and flushed (one write syscall) as soon as the row-count or byte-count budget is exhausted.
+    The time budget is enforced by the owner, which must call flush() once seconds_until_flush() reaches zero -- see
+    DataWriterThread.  Not thread safe.
+    """
+
+    def __init__(self, file: TextIO | BinaryIO, config: DataLogConfig | None = None):
+        """
+        :param file: an open, writable file -- binary if config.format is BINARY, text otherwise.  Ownership is taken;
+                     it is closed by close().
+        :param config: the flush budgets.  Defaults to flushing every row.
+        """
+        self._file = file
+        self._config = config if config is not None else DataLogConfig()
+        self._empty_row = b'' if self._config.format == DataFormat.BINARY else ''
+        self._rows = []
+        self._bytes = 0
+        self._first_row_time = 0.0
+
+        self.rows_written = 0
+        self.flush_count = 0
+
+    def write(self, row: str | bytes) -> bool:
+        """ Buffers a row, flushing if the row or byte budget is exhausted.
+
+        :param row: a pre-encoded csv row (including the trailing newline) or packed binary record
+        :return: True on success, False if the writer has been closed
+        """
+        if self._file is None:
+            return False
+        if not self._rows:
+            self._first_row_time = time.monotonic()
+        self._rows.append(row)
+        self._bytes += len(row)
+        if len(self._rows) >= self._config.flush_rows or self._bytes >= self._config.flush_bytes:
+            self.flush()
+        return True
+
+    def seconds_until_flush(self) -> float | None:
+        """ :return: seconds until the time budget of the current batch runs out (<= 0 if overdue),
+                     or None if nothing is buffered """
+        if not self._rows:
+            return None
+        return self._config.flush_interval - (time.monotonic() - self._first_row_time)
+
+    def flush(self) -> None:
+        """ Writes out all buffered rows """
+        if not self._rows or self._file is None:
+            return
+        self._file.write(self._empty_row.join(self._rows))
+        self._file.flush()
+        self.rows_written += len(self._rows)
+        self.flush_count += 1
+        self._rows = []
+        self._bytes = 0
+
+    def close(self) -> None:
+        """ Flushes all buffered rows and closes the file.  Subsequent writes are rejected. """
+        if self._file is None:
+            return
+        self.flush()
+        self._file.close()
+        self._file = None
@@ -0,0 +1,247 @@
+import gzip
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import traceback
+from datetime import datetime
+from queue import SimpleQueue
+from typing import BinaryIO, Callable, TextIO
+
+try:
+    import zstandard
+except ModuleNotFoundError:
+    pass
+
+from EosPayload.lib.data_log import Compression
+
+"""
+Segment files are named `<pretty_id>.seg<NNNNN><ext>` (plus `.gz` / `.zst` once compressed) and numbering continues
+across restarts.  `<pretty_id>.index.json` lists every segment:
+    [{"segment": 1, "file": "gps-driver-002.seg00001.dat.gz", "start": "<isoformat>", "end": "<isoformat>",
+      "bytes": 123456}, ...]
+start and end are the times of the first and last write to the segment.  Rows are written in batches, so the first row
+of a segment may precede start by up to the data log flush interval.  end is null for the segment currently being
+written.
+"""
+
+COMPRESSED_EXTENSIONS = {
+    Compression.GZIP: '.gz',
+    Compression.ZSTD: '.zst',
+}
+COPY_CHUNK_SIZE = 1024 * 1024
+LOW_PRIORITY_NICE = 19
+
+
+def open_segment(path: str) -> BinaryIO:
+    """ Opens a (possibly compressed) data segment for reading
+
+    :param path: the segment file
+    :return: a readable binary file of the uncompressed segment
+    """
+    if path.endswith(COMPRESSED_EXTENSIONS[Compression.GZIP]):
+        return gzip.open(path, 'rb')
+    if path.endswith(COMPRESSED_EXTENSIONS[Compression.ZSTD]):
+        try:
+            zstandard
+        except NameError:
+            raise Exception("failed to import zstandard library")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return open(path, 'rb')
+
+
+class RotatingDataFile:
+    """ A writable file that rolls over to a new numbered segment when it reaches a size or age limit.
+    Closed segments are compressed by a low-priority background thread and recorded in an index file.
+    Not thread safe (other than the compressor thread, which only touches closed segments and the index).
+    """
+
+    def __init__(self, directory: str, name: str, ext: str, opener: Callable[[str], TextIO | BinaryIO],
+                 max_bytes: int, max_seconds: float, compression: Compression, logger: logging.Logger):
+        """
+        :param directory: the directory to write segments and the index to
+        :param name: the base name of the segments (the device pretty id)
+        :param ext: the segment file extension, eg '.dat'
+        :param opener: opens a new segment for writing given its path (eg writing a binary file header)
+        :param max_bytes: start a new segment before a write would make the current one larger than this (0 = never)
+        :param max_seconds: start a new segment once the current one is this many seconds old (0 = never)
+        :param compression: how closed segments are compressed
+        :param logger: used to report rotation and compression events
+        """
+        self._directory = directory
+        self._name = name
+        self._ext = ext
+        self._opener = opener
+        self._max_bytes = max_bytes
+        self._max_seconds = max_seconds
+        self._compression = compression
+        self._logger = logger
+
+        self._index_path = os.path.join(directory, f"{name}.index.json")
+        self._index_lock = threading.Lock()
+        self._index = self._load_index()
+
+        self._file = None
+        self._entry = None
+        self._segment_bytes = 0
+        self._segment_opened = 0.0
+        self._segment_last_write = None
+
+        if self._compression == Compression.ZSTD:
+            try:
+                zstandard
+            except NameError:
+                self._logger.warning("failed to import zstandard library, compressing data segments with gzip instead")
+                self._compression = Compression.GZIP
+
+        self._compress_queue = SimpleQueue()
+        self.compressor_thread = None
+        if self._compression != Compression.NONE:
+            self.compressor_thread = threading.Thread(target=self._compressor_main, name=f"{name}-data-compressor",
+                                                      daemon=True)
+            self.compressor_thread.start()
+            # pick up segments left uncompressed by a previous run
+            for entry in self._index:
+                if not entry["file"].endswith(COMPRESSED_EXTENSIONS[self._compression]):
+                    self._compress_queue.put(entry["segment"])
+
+        self._next_segment = self._find_next_segment()
+
+    def write(self, data: str | bytes) -> int:
+        """ Writes data to the current segment, first rolling over to a new segment if a limit has been reached.
+        Data is never split across segments, so callers writing whole rows get whole rows in every segment.
+        """
+        now = time.monotonic()
+        if self._file is not None and self._segment_bytes > 0 and (
+                (self._max_bytes and self._segment_bytes + len(data) > self._max_bytes)
+                or (self._max_seconds and now - self._segment_opened >= self._max_seconds)):
+            self._close_segment()
+        if self._file is None:
+            self._open_segment()
+
+        written = self._file.write(data)
+        self._segment_bytes += len(data)
+        self._segment_last_write = datetime.now().isoformat()
+        if self._entry["start"] is None:
+            with self._index_lock:
+                self._entry["start"] = self._segment_last_write
+            self._save_index()
+        return written
+
+    def flush(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self) -> None:
+        """ Closes the current segment.  It is queued for compression, but compression is not waited for; segments
+        left uncompressed are picked up on the next run.
+        """
+        if self._file is not None:
+            self._close_segment()
+        self._compress_queue.put(None)
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self._directory, f"{self._name}.seg{segment:05}{self._ext}")
+
+    def _find_next_segment(self) -> int:
+        """ :return: one more than the highest segment number on disk or in the index """
+        pattern = re.compile(re.escape(self._name) + r"\.seg(\d+)" + re.escape(self._ext))
+        highest = max([entry["segment"] for entry in self._index], default=0)
+        for filename in os.listdir(self._directory):
+            match = pattern.match(filename)
+            if match:
+                highest = max(highest, int(match.group(1)))
+        return highest + 1
+
+    def _open_segment(self) -> None:
+        segment = self._next_segment
+        self._next_segment += 1
+        path = self._segment_path(segment)
+        self._file = self._opener(path)
+        self._segment_bytes = 0
+        self._segment_opened = time.monotonic()
+        self._segment_last_write = None
+        self._entry = {"segment": segment, "file": os.path.basename(path), "start": None, "end": None, "bytes": 0}
+        with self._index_lock:
+            self._index.append(self._entry)
+        self._logger.info(f"opened data segment {path}")
+
+    def _close_segment(self) -> None:
+        self._file.close()
+        self._file = None
+        with self._index_lock:
+            self._entry["end"] = self._segment_last_write
+            self._entry["bytes"] = self._segment_bytes
+        self._save_index()
+        self._compress_queue.put(self._entry["segment"])
+        self._entry = None
+
+    def _load_index(self) -> list[dict]:
+        """ Loads the index left by previous runs.  Segments that were never closed (eg after a power loss) get their
+        end time from the file modification time.
+        """
+        try:
+            with open(self._index_path) as index_file:
+                index = json.load(index_file)
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            self._logger.error(f"unable to read data segment index {self._index_path}, starting a new one: {e}")
+            return []
+
+        for entry in index:
+            path = os.path.join(self._directory, entry["file"])
+            if entry["end"] is None and os.path.exists(path):
+                entry["end"] = datetime.fromtimestamp(os.path.getmtime(path)).isoformat()
+                entry["bytes"] = os.path.getsize(path)
+        return index
+
+    def _save_index(self) -> None:
+        """ Atomically rewrites the index file """
+        with self._index_lock:
+            tmp_path = self._index_path + ".tmp"
+            with open(tmp_path, 'w') as index_file:
+                json.dump(self._index, index_file, indent=1)
+            os.replace(tmp_path, self._index_path)
+
+    def _compress(self, src_path: str, dst_path: str) -> None:
+        tmp_path = dst_path + ".tmp"
+        with open(src_path, 'rb') as src:
+            if self._compression == Compression.ZSTD:
+                with open(tmp_path, 'wb') as dst:
+                    zstandard.ZstdCompressor().copy_stream(src, dst)
+            else:
+                with gzip.open(tmp_path, 'wb') as dst:
+                    shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+        os.replace(tmp_path, dst_path)
+        os.remove(src_path)
+
+    def _compressor_main(self) -> None:
+        """ Compressor thread main function.  Compresses closed segments one at a time at the lowest CPU priority. """
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), LOW_PRIORITY_NICE)
+        except (AttributeError, OSError) as e:
+            self._logger.warning(f"unable to lower data compressor thread priority: {e}")
+
+        while True:
+            segment = self._compress_queue.get()
+            if segment is None:
+                return
+            try:
+                with self._index_lock:
+                    entry = next((entry for entry in self._index if entry["segment"] == segment), None)
+                if entry is None or entry is self._entry:
+                    continue
+                src_path = os.path.join(self._directory, entry["file"])
+                dst_path = src_path + COMPRESSED_EXTENSIONS[self._compression]
+                if not os.path.exists(src_path):
+                    continue
+                self._compress(src_path, dst_path)
+                with self._index_lock:
+                    entry["file"] = os.path.basename(dst_path)
+                self._save_index()
+            except Exception as e:
+                self._logger.error(f"failed to compress data segment {segment}: {e}\n{traceback.format_exc()}")
@@ -0,0 +1,152 @@
+import logging
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+from queue import SimpleQueue, Empty
+
+from EosPayload.lib.data_log import DataLogConfig
+from EosPayload.lib.data_log.buffered_writer import BufferedDataWriter
+
+# how long the writer thread waits for rows when nothing is buffered
+IDLE_WAIT = 1.0  # seconds
+# how often a producer re-checks for free space while waiting out overflow_timeout
+OVERFLOW_POLL_INTERVAL = 0.005  # seconds
+
+
+@dataclass
+class DataLogStats:
+    queued: int
+    written: int
+    dropped: int
+    backpressured: int
+
+
+class DataWriterThread:
+    """ Owns a BufferedDataWriter and a thread that feeds it from a bounded queue.
+
+    Producers hand rows off through a SimpleQueue, whose put() never blocks on a lock held by the writer, so any
+    number of threads (including MQTT and XBee callbacks) can log without waiting on disk I/O.  When the queue is
+    full a producer waits up to overflow_timeout for space (counted as backpressured) and otherwise drops the row
+    (counted as dropped).  Enqueueing and closing share a lock, held only to check and set the closed flag and
+    enqueue, so no row can land after the writer thread has stopped draining the queue.
+    """
+
+    _STOP = object()
+
+    def __init__(self, name: str, writer: BufferedDataWriter, config: DataLogConfig, logger: logging.Logger):
+        """
+        :param name: the name of the writer thread
+        :param writer: the writer to feed.  Ownership is taken; it is closed by close().
+        :param config: queue capacity, overflow timeout and flush budgets
+        :param logger: used to report write errors from the writer thread
+        """
+        self._writer = writer
+        self._config = config
+        self._logger = logger
+        self._queue = SimpleQueue()
+        self._closed = False
+        self._close_lock = threading.Lock()  # orders enqueues before close()
+        self._counter_lock = threading.Lock()
+        self._dropped = 0
+        self._backpressured = 0
+
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def put(self, row: str | bytes) -> bool:
+        """ Enqueues a row for writing.  Thread safe.  Never blocks on disk I/O.
+
+        :param row: a pre-encoded csv row (including the trailing newline) or packed binary record
+        :return: True if the row was enqueued, False if it was dropped
+        """
+        if self._closed:
+            self._count_drop()
+            return False
+
+        if self._queue.qsize() >= self._config.queue_capacity:
+            if self._config.overflow_timeout <= 0:
+                self._count_drop()
+                return False
+            with self._counter_lock:
+                self._backpressured += 1
+            deadline = time.monotonic() + self._config.overflow_timeout
+            while self._queue.qsize() >= self._config.queue_capacity:
+                if time.monotonic() >= deadline:
+                    self._count_drop()
+                    return False
+                time.sleep(OVERFLOW_POLL_INTERVAL)
+
+        with self._close_lock:
+            if self._closed:
+                self._count_drop()
+                return False
+            self._queue.put(row)
+        return True
+
+    def stats(self) -> DataLogStats:
+        return DataLogStats(
+            queued=self._queue.qsize(),
+            written=self._writer.rows_written,
+            dropped=self._dropped,
+            backpressured=self._backpressured,
+        )
+
+    def close(self, timeout: float | None = None) -> None:
+        """ Stops accepting rows, waits for the writer thread to drain the queue, and closes the file.
+
+        :param timeout: the maximum number of seconds to wait for the writer thread
+        """
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+        if self.thread.is_alive():
+            self._queue.put(self._STOP)
+            self.thread.join(timeout)
+        else:
+            # thread was never started (or died) -- drain from the calling thread instead
+            self._drain()
+            self._writer.close()
+
+    def _count_drop(self) -> None:
+        with self._counter_lock:
+            self._dropped += 1
+
+    def _drain(self) -> None:
+        """ Writes every row currently in the queue """
+        while True:
+            try:
+                row = self._queue.get_nowait()
+            except Empty:
+                return
+            if row is not self._STOP:
+                self._writer.write(row)
+
+    def _run(self) -> None:
+        """ Writer thread main function """
+        try:
+            while True:
+                timeout = self._writer.seconds_until_flush()
+                try:
+                    row = self._queue.get(timeout=IDLE_WAIT if timeout is None else max(timeout, 0))
+                except Empty:
+                    row = None
+                if row is self._STOP:
+                    break
+                if row is not None:
+                    self._writer.write(row)
+                timeout = self._writer.seconds_until_flush()
+                if timeout is not None and timeout <= 0:
+                    self._writer.flush()
+        except Exception as e:
+            self._logger.critical(f"data writer thread terminating due to uncaught exception: {e}"
+                                  f"\n{traceback.format_exc()}")
+        finally:
+            try:
+                self._drain()
+                self._writer.close()
+            except Exception as e:
+                self._logger.error(f"failed to close data file: {e}\n{traceback.format_exc()}")
@@ -0,0 +1,127 @@
+import ast
+import os
+from dataclasses import dataclass
+from importlib import import_module
+
+"""
+Driver discovery without imports.  Every module in EosPayload/drivers is parsed (not imported) and each class that
+derives, directly or through other scanned classes, from DriverBase is recorded with the module that defines it.
+A driver's module is only imported when its class is actually needed (see load_driver_class), which for the payload
+means inside the driver's own process -- so a disabled driver's dependencies (cv2, busio, ...) are never imported.
+"""
+
+DRIVERS_PACKAGE = 'EosPayload.drivers'
+BASE_DRIVERS_PACKAGE = 'EosPayload.lib.base_drivers'
+DRIVER_BASE_CLASS = 'DriverBase'
+
+_EOSPAYLOAD_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DRIVERS_DIR = os.path.join(_EOSPAYLOAD_DIR, 'drivers')
+BASE_DRIVERS_DIR = os.path.join(_EOSPAYLOAD_DIR, 'lib', 'base_drivers')
+
+# a class that doesn't define get_required_config_fields() itself
+_INHERITED = object()
+
+
+@dataclass(frozen=True)
+class DriverInfo:
+    name: str
+    module: str
+    # None if get_required_config_fields() doesn't just return a literal list; load the class to find out
+    required_config_fields: tuple[str, ...] | None = ()
+
+
+@dataclass
+class _ScannedClass:
+    name: str
+    module: str
+    bases: list[str]
+    required_config_fields: tuple[str, ...] | None | object
+
+
+def _base_name(node: ast.expr) -> str | None:
+    """ :return: the class name a base class expression refers to, eg `DriverBase` for `driver_base.DriverBase` """
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    return None
+
+
+def _required_config_fields(class_node: ast.ClassDef) -> tuple[str, ...] | None | object:
+    """ :return: the literal list returned by the class's get_required_config_fields(), _INHERITED if the class doesn't
+                 define it, or None if it does something other than return a literal """
+    for node in class_node.body:
+        if isinstance(node, ast.FunctionDef) and node.name == 'get_required_config_fields':
+            returns = [child for child in ast.walk(node) if isinstance(child, ast.Return)]
+            if len(returns) != 1 or returns[0].value is None:
+                return None
+            try:
+                value = ast.literal_eval(returns[0].value)
+            except ValueError:
+                return None
+            return tuple(value) if isinstance(value, (list, tuple)) else None
+    return _INHERITED
+
+
+def _scan_package(directory: str, package: str) -> list[_ScannedClass]:
+    scanned = []
+    for file_name in sorted(os.listdir(directory)):
+        if not file_name.endswith('.py') or file_name == '__init__.py':
+            continue
+        with open(os.path.join(directory, file_name), 'rb') as source:
+            tree = ast.parse(source.read(), file_name)
+        module = f"{package}.{file_name[:-3]}"
+        for node in tree.body:
+            if isinstance(node, ast.ClassDef):
+                bases = [name for name in map(_base_name, node.bases) if name is not None]
+                scanned.append(_ScannedClass(node.name, module, bases, _required_config_fields(node)))
+    return scanned
+
+
+def scan_drivers(drivers_dir: str = DRIVERS_DIR, drivers_package: str = DRIVERS_PACKAGE) -> dict[str, DriverInfo]:
+    """ Finds every driver class defined in the drivers package without importing anything.  If two modules define a
+    class with the same name, the one in the alphabetically last module wins.
+
+    :param drivers_dir: the directory of the drivers package
+    :param drivers_package: the name of the drivers package
+    :return: a dict mapping driver class names to where they are defined
+    """
+    base_classes = {scanned.name: scanned for scanned in _scan_package(BASE_DRIVERS_DIR, BASE_DRIVERS_PACKAGE)}
+    driver_classes = {scanned.name: scanned for scanned in _scan_package(drivers_dir, drivers_package)}
+
+    def find(name: str) -> _ScannedClass | None:
+        return driver_classes.get(name) or base_classes.get(name)
+
+    def is_driver(name: str, visiting: frozenset = frozenset()) -> bool:
+        if name == DRIVER_BASE_CLASS:
+            return True
+        scanned = find(name)
+        if scanned is None or name in visiting:
+            return False
+        return any(is_driver(base, visiting | {name}) for base in scanned.bases)
+
+    def required_fields(name: str, visiting: frozenset = frozenset()) -> tuple[str, ...] | None:
+        scanned = find(name)
+        if scanned is None or name in visiting:
+            return ()
+        if scanned.required_config_fields is not _INHERITED:
+            return scanned.required_config_fields
+        for base in scanned.bases:
+            if is_driver(base):
+                return required_fields(base, visiting | {name})
+        return ()
+
+    return {
+        name: DriverInfo(name, scanned.module, required_fields(name))
+        for name, scanned in driver_classes.items()
+        if is_driver(name)
+    }
+
+
+def load_driver_class(driver: DriverInfo):
+    """ Imports the driver's module and returns its class
+
+    :param driver: the driver to load
+    :return: the driver class
+    """
+    return getattr(import_module(driver.module), driver.name)
@@ -0,0 +1,197 @@
+import mmap
+import os
+import struct
+import tempfile
+import time
+from dataclasses import dataclass
+
+from EosPayload.lib.util import settings_section
+
+"""
+Shared-memory driver health.  OrchEOStrator creates a fixed-layout table with one slot per enabled device and maps it
+into memory; each driver maps the same file and overwrites its own slot in place every update_interval, and
+OrchEOStrator reads the slots directly -- no packets, no encoding, no MQTT round trip.  MQTT heartbeats become an
+optional, downsampled export (see HealthTableConfig.mqtt_export_interval).
+
+Layout (little endian):
+    header  magic b'EOSH', uint16 version, uint16 slot size, uint32 slot count, float64 update interval,
+            float64 MQTT export interval, padded to HEADER_SIZE
+    slots   uint32 sequence, int32 device id, int32 pid, uint8 healthy, uint32 state, uint16 thread count,
+            uint16 managed threads alive, uint16 managed threads dead, float64 updated (time.monotonic()),
+            uint64 health loop count, padded to SLOT_SIZE
+
+Each slot has a single writer, its driver.  The sequence number is odd while the writer is updating the slot, so a
+reader retries until it sees the same even sequence number before and after reading (a seqlock).  time.monotonic() is
+the system-wide CLOCK_MONOTONIC, so timestamps from every process compare directly.
+"""
+
+MAGIC = b'EOSH'
+VERSION = 1
+HEADER_SIZE = 64
+SLOT_SIZE = 64
+
+# the table location is handed to driver processes through the environment, so it survives any process start method
+HEALTH_TABLE_PATH_ENV = 'EOS_HEALTH_TABLE_PATH'
+
+_HEADER = struct.Struct('<4sHHIdd')
+_SEQUENCE = struct.Struct('<I')
+_SLOT = struct.Struct('<IiiBIHHHdQ')
+_OWNER = struct.Struct('<ii')  # device id and pid, right after the sequence number
+_READ_RETRIES = 100
+
+
+@dataclass
+class HealthTableConfig:
+    enabled: bool = False
+    update_interval: float = 0.5  # seconds
+    stale_after: float = 5.0  # seconds
+    mqtt_export_interval: float = 10.0  # seconds, 0 to never publish heartbeats over MQTT
+    path: str | None = None
+
+    @staticmethod
+    def from_settings(settings: dict | None) -> 'HealthTableConfig':
+        """ Builds a config from the optional `health_table` dict at the top level of the config file
+
+        :param settings: the top level config dict (may be None)
+        :return: the health table config
+        """
+        table_settings = settings_section(settings, "health_table")
+        try:
+            config = HealthTableConfig(
+                enabled=bool(table_settings.get("enabled", False)),
+                update_interval=float(table_settings.get("update_interval", 0.5)),
+                stale_after=float(table_settings.get("stale_after", 5.0)),
+                mqtt_export_interval=float(table_settings.get("mqtt_export_interval", 10.0)),
+                path=table_settings.get("path"),
+            )
+        except TypeError as e:
+            raise ValueError(f"invalid health_table settings: {e}") from e
+        if config.update_interval <= 0 or config.stale_after <= config.update_interval:
+            raise ValueError("health_table update_interval must be > 0 and less than stale_after")
+        if config.mqtt_export_interval < 0:
+            raise ValueError("health_table mqtt_export_interval must be >= 0")
+        return config
+
+
+@dataclass
+class HealthRecord:
+    device_id: int
+    pid: int
+    is_healthy: bool
+    state: int
+    thread_count: int
+    threads_alive: int
+    threads_dead: int
+    updated: float  # time.monotonic() of the driver's last update
+    loops: int
+
+
+def _map(path: str, size: int | None = None) -> mmap.mmap:
+    fd = os.open(path, os.O_RDWR | (os.O_CREAT | os.O_TRUNC if size is not None else 0), 0o600)
+    try:
+        if size is not None:
+            os.ftruncate(fd, size)
+        return mmap.mmap(fd, size or 0)
+    finally:
+        os.close(fd)
+
+
+class HealthTable:
+    """ OrchEOStrator's side of the table: creates it, assigns slots and reads them """
+
+    def __init__(self, config: HealthTableConfig, device_ids: list[int]):
+        """
+        :param config: the health table config
+        :param device_ids: the devices to give slots to
+        """
+        directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+        self.path = config.path or os.path.join(directory, f"eospayload-{os.getpid()}.health")
+        self.config = config
+        self._slots: dict[int, int] = {}
+        self._memory = _map(self.path, HEADER_SIZE + SLOT_SIZE * len(device_ids))
+        _HEADER.pack_into(self._memory, 0, MAGIC, VERSION, SLOT_SIZE, len(device_ids), config.update_interval,
+                          config.mqtt_export_interval)
+        for index, device_id in enumerate(device_ids):
+            self._slots[device_id] = HEADER_SIZE + SLOT_SIZE * index
+            _SLOT.pack_into(self._memory, self._slots[device_id], 0, device_id, 0, 0, 0, 0, 0, 0, 0.0, 0)
+
+    def has_slot(self, device_id: int) -> bool:
+        return device_id in self._slots
+
+    def read(self, device_id: int) -> HealthRecord | None:
+        """ :return: the device's last update, or None if it has no slot or hasn't written it yet """
+        offset = self._slots.get(device_id)
+        if offset is None:
+            return None
+        for _ in range(_READ_RETRIES):
+            sequence = _SEQUENCE.unpack_from(self._memory, offset)[0]
+            if sequence % 2:
+                continue
+            fields = _SLOT.unpack_from(self._memory, offset)
+            if fields[0] == sequence and _SEQUENCE.unpack_from(self._memory, offset)[0] == sequence:
+                break
+        else:
+            return None
+        if fields[0] == 0:
+            return None
+        return HealthRecord(fields[1], fields[2], bool(fields[3]), *fields[4:])
+
+    def close(self) -> None:
+        self._memory.close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class HealthSlot:
+    """ A driver's side of the table: its own slot, which only it writes """
+
+    def __init__(self, memory: mmap.mmap, offset: int, update_interval: float, mqtt_export_interval: float):
+        self.update_interval = update_interval
+        self.mqtt_export_interval = mqtt_export_interval
+        self._memory = memory
+        self._offset = offset
+        self._sequence = _SEQUENCE.unpack_from(memory, offset)[0] & ~1
+        self._pid = os.getpid()
+
+    @staticmethod
+    def from_environment(device_id: int) -> 'HealthSlot | None':
+        """ Maps the table exported by OrchEOStrator and finds the device's slot
+
+        :param device_id: the device to find the slot of
+        :return: the slot, or None if there is no table or it has no slot for the device
+        """
+        path = os.environ.get(HEALTH_TABLE_PATH_ENV)
+        if not path:
+            return None
+        memory = _map(path)
+        magic, version, slot_size, slot_count, update_interval, mqtt_export_interval = _HEADER.unpack_from(memory)
+        if magic != MAGIC or version != VERSION or slot_size != SLOT_SIZE:
+            memory.close()
+            raise ValueError(f"{path} is not a version {VERSION} health table")
+        for index in range(slot_count):
+            offset = HEADER_SIZE + SLOT_SIZE * index
+            if _OWNER.unpack_from(memory, offset + _SEQUENCE.size)[0] == device_id:
+                return HealthSlot(memory, offset, update_interval, mqtt_export_interval)
+        memory.close()
+        return None
+
+    def update(self, is_healthy: bool, state: int, thread_count: int, threads_alive: int, threads_dead: int,
+               loops: int) -> None:
+        """ Overwrites the slot with the driver's current health """
+        device_id = _OWNER.unpack_from(self._memory, self._offset + _SEQUENCE.size)[0]
+        self._sequence += 1
+        _SEQUENCE.pack_into(self._memory, self._offset, self._sequence)
+        _SLOT.pack_into(self._memory, self._offset, self._sequence, device_id, self._pid, is_healthy, state,
+                        thread_count, threads_alive, threads_dead, time.monotonic(), loops)
+        self._sequence += 1
+        _SEQUENCE.pack_into(self._memory, self._offset, self._sequence)
+
+    def close(self) -> None:
+        self._memory.close()
+
+
+def export_health_table(path: str) -> None:
+    """ Makes the table available to every driver process started afterwards """
+    os.environ[HEALTH_TABLE_PATH_ENV] = path
@@ -1,21 +1,260 @@
+from dataclasses import dataclass
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+import atexit
 import logging
+import threading
+import time
+
+from EosPayload.lib.util import settings_section
 
 LOG_FMT = '[%(asctime)s.%(msecs)03d] %(name)s.%(levelname)s: %(message)s'
 DATE_FMT = '%Y-%m-%dT%H:%M:%S'
 
+# the listener thread for queued logging in this process, if any
+_listener: QueueListener | None = None
+# the rate limit filter of this process's handlers, if any, whose pending summaries are logged at shutdown
+_rate_limit_filter: 'RateLimitFilter | None' = None
+
+# a repeated message is let through (annotated with the repeat count) at most once per interval
+DEFAULT_DEDUP_INTERVAL = 60.0  # seconds
+DEFAULT_RATE_LIMIT_BURST = 20
+
+
+@dataclass
+class LoggingConfig:
+    queued: bool = False
+    console_level: int = logging.DEBUG
+    file_level: int = logging.DEBUG
+    dedup: bool = False
+    dedup_interval: float = DEFAULT_DEDUP_INTERVAL
+    rate_limit: float = 0.0  # records per second per logger, 0 = unlimited
+    rate_limit_burst: int = DEFAULT_RATE_LIMIT_BURST
+
+    @staticmethod
+    def from_settings(settings: dict | None) -> 'LoggingConfig':
+        """ Builds a config from the optional `logging` dict in a device's `settings` (or the top level of the config
+        file, for orchEOStrator).
+
+        :param settings: the dict that may contain a `logging` dict (may be None)
+        :return: the logging config
+        """
+        logging_settings = settings_section(settings, "logging")
+        try:
+            return LoggingConfig(
+                queued=bool(logging_settings.get("queued", False)),
+                console_level=LoggingConfig._parse_level(logging_settings.get("console_level", logging.DEBUG)),
+                file_level=LoggingConfig._parse_level(logging_settings.get("file_level", logging.DEBUG)),
+                dedup=bool(logging_settings.get("dedup", False)),
+                dedup_interval=float(logging_settings.get("dedup_interval", DEFAULT_DEDUP_INTERVAL)),
+                rate_limit=float(logging_settings.get("rate_limit", 0.0)),
+                rate_limit_burst=int(logging_settings.get("rate_limit_burst", DEFAULT_RATE_LIMIT_BURST)),
+            )
+        except TypeError as e:
+            raise ValueError(f"invalid logging settings: {e}") from e
+
+    @staticmethod
+    def _parse_level(level: str | int) -> int:
+        if isinstance(level, int):
+            return level
+        if not isinstance(level, str):
+            raise ValueError(f"invalid log level {level!r}")
+        parsed_level = logging.getLevelName(level.upper())
+        if not isinstance(parsed_level, int):
+            raise ValueError(f"invalid log level '{level}'")
+        return parsed_level
+
+
+@dataclass
+class _LoggerState:
+    tokens: float
+    last_refill: float
+    last_message: str | None = None
+    last_level: int = logging.NOTSET
+    last_emitted: float = 0.0
+    repeats: int = 0
+    rate_limited: int = 0
+
+
+class RateLimitFilter(logging.Filter):
+    """ Collapses repeated messages and enforces a per-logger token bucket.
+
+    A message identical to the previous one from the same logger is suppressed, except that it is let through once
+    every dedup_interval seconds annotated with how many times it was repeated.  When a different message arrives, a
+    "repeated N times" summary of the suppressed ones is logged first.  Records beyond the token bucket (rate_limit
+    per second, bursting up to rate_limit_burst) are suppressed and reported in a summary once tokens are available
+    again.  CRITICAL records are never rate limited.
+
+    The same instance may be attached to several handlers; each record is only evaluated once.
+    """
+
+    def __init__(self, dedup: bool, dedup_interval: float, rate_limit: float, rate_limit_burst: int):
+        super().__init__()
+        self._dedup = dedup
+        self._dedup_interval = dedup_interval
+        self._rate_limit = rate_limit
+        self._rate_limit_burst = rate_limit_burst
+        self._lock = threading.Lock()
+        self._states: dict[str, _LoggerState] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        decision = getattr(record, 'rate_limit_decision', None)
+        if decision is not None:
+            return decision
+
+        summaries = []
+        with self._lock:
+            decision = self._decide(record, summaries)
+        record.rate_limit_decision = decision
+
+        # summaries describe earlier records, so they are dispatched before this record is emitted
+        for summary in summaries:
+            logging.getLogger(record.name).handle(summary)
+        return decision
+
+    def _decide(self, record: logging.LogRecord, summaries: list[logging.LogRecord]) -> bool:
+        """ Decides whether to emit the record.  Caller must hold self._lock. """
+        now = time.monotonic()
+        state = self._states.get(record.name)
+        if state is None:
+            state = _LoggerState(tokens=self._rate_limit_burst, last_refill=now)
+            self._states[record.name] = state
+
+        if self._dedup:
+            message = record.getMessage()
+            if message == state.last_message and record.levelno == state.last_level:
+                if now - state.last_emitted < self._dedup_interval:
+                    state.repeats += 1
+                    return False
+                if state.repeats:
+                    record.msg = f"{message} (repeated {state.repeats} more times in the last" \
+                                 f" {now - state.last_emitted:.0f}s)"
+                    record.args = None
+            else:
+                if state.repeats:
+                    summaries.append(self._summary(record, state.last_level, self._repeats_message(state)))
+                state.last_message = message
+                state.last_level = record.levelno
+            state.repeats = 0
 
-def init_logging(log_filename: str) -> None:
-    """ Sets up console and file logging
+        if self._rate_limit > 0 and record.levelno < logging.CRITICAL:
+            state.tokens = min(self._rate_limit_burst, state.tokens + (now - state.last_refill) * self._rate_limit)
+            state.last_refill = now
+            if state.tokens < 1:
+                state.rate_limited += 1
+                return False
+            state.tokens -= 1
+            if state.rate_limited:
+                summaries.append(self._summary(record, logging.WARNING, self._rate_limited_message(state)))
+                state.rate_limited = 0
+
+        state.last_emitted = now
+        return True
+
+    def flush(self) -> None:
+        """ Logs the summaries of the repeated and rate limited messages that haven't been reported yet, eg at shutdown
+        """
+        summaries = []
+        with self._lock:
+            for name, state in self._states.items():
+                record = logging.LogRecord(name, logging.NOTSET, "", 0, "", None, None)
+                if state.repeats:
+                    summaries.append(self._summary(record, state.last_level, self._repeats_message(state)))
+                    state.repeats = 0
+                if state.rate_limited:
+                    summaries.append(self._summary(record, logging.WARNING, self._rate_limited_message(state)))
+                    state.rate_limited = 0
+        for summary in summaries:
+            logging.getLogger(summary.name).handle(summary)
+
+    @staticmethod
+    def _repeats_message(state: _LoggerState) -> str:
+        return f"previous message repeated {state.repeats} more times: {state.last_message}"
+
+    def _rate_limited_message(self, state: _LoggerState) -> str:
+        return f"{state.rate_limited} messages suppressed by rate limit ({self._rate_limit}/s)"
+
+    @staticmethod
+    def _summary(record: logging.LogRecord, level: int, message: str) -> logging.LogRecord:
+        summary = logging.LogRecord(record.name, level, record.pathname, record.lineno, message, None, None)
+        summary.rate_limit_decision = True
+        return summary
+
+
+def init_logging(log_filename: str, config: LoggingConfig | None = None) -> None:
+    """ Sets up console and file logging.  Replaces any handlers from a previous call.
+
+    In queued mode, logging calls only enqueue the record; a single listener thread per process formats it and
+    writes it to the file and console, so callers never block on log I/O.
 
     :param log_filename: filename to write logs to.  File will be opened in append mode.
+    :param config: handler levels, mode, deduplication and rate limits.  Defaults to synchronous logging of every
+                   message.
     """
-    logging.basicConfig(filename=log_filename,
-                        filemode='a',
-                        format=LOG_FMT,
-                        datefmt=DATE_FMT,
-                        level=logging.DEBUG,
-                        force=True)
+    if config is None:
+        config = LoggingConfig()
+
+    _stop_listener()
+    formatter = logging.Formatter(LOG_FMT, DATE_FMT)
+
+    file_handler = logging.FileHandler(log_filename, mode='a')
+    file_handler.setLevel(config.file_level)
+    file_handler.setFormatter(formatter)
+
     console = logging.StreamHandler()
-    console.setLevel(logging.DEBUG)
-    console.setFormatter(logging.Formatter(LOG_FMT, DATE_FMT))
-    logging.getLogger('').addHandler(console)
+    console.setLevel(config.console_level)
+    console.setFormatter(formatter)
+
+    root = logging.getLogger('')
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    # records below both handler levels are discarded before they are created (or enqueued)
+    root.setLevel(min(config.file_level, config.console_level))
+
+    global _rate_limit_filter
+    rate_limit_filter = None
+    if config.dedup or config.rate_limit > 0:
+        rate_limit_filter = RateLimitFilter(config.dedup, config.dedup_interval, config.rate_limit,
+                                            config.rate_limit_burst)
+
+    if config.queued:
+        global _listener
+        log_queue = SimpleQueue()
+        queue_handler = QueueHandler(log_queue)
+        if rate_limit_filter is not None:
+            queue_handler.addFilter(rate_limit_filter)
+        root.addHandler(queue_handler)
+        _listener = QueueListener(log_queue, file_handler, console, respect_handler_level=True)
+        _listener.start()
+    else:
+        if rate_limit_filter is not None:
+            file_handler.addFilter(rate_limit_filter)
+            console.addFilter(rate_limit_filter)
+        root.addHandler(file_handler)
+        root.addHandler(console)
+    _rate_limit_filter = rate_limit_filter
+
+
+def shutdown_logging() -> None:
+    """ Writes out any queued log records, then flushes and closes all handlers.  Use instead of logging.shutdown(). """
+    _stop_listener()
+    logging.shutdown()
+
+
+@atexit.register
+def _stop_listener() -> None:
+    """ Reports the repeated and rate limited messages that are still pending, then stops the queued logging listener
+    thread (if running) after it has written out all queued records
+    """
+    global _listener, _rate_limit_filter
+    if _rate_limit_filter is not None:
+        rate_limit_filter = _rate_limit_filter
+        _rate_limit_filter = None
+        rate_limit_filter.flush()
+    if _listener is not None:
+        listener = _listener
+        _listener = None
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
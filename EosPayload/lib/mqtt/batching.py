@@ -0,0 +1,222 @@
+import logging
+import struct
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+
+import paho.mqtt.client as mosquitto
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+
+from EosPayload.lib.util import settings_section
+
+"""
+Packet batching.  Several packets for the same topic can be published as a single MQTT message whose payload is a
+sequence of (uint32 little-endian length, encoded packet) frames.  Batches are marked with the BATCH_CONTENT_TYPE
+content type property, so a subscriber can always tell a batch from a single packet.  Client splits batches before
+calling subscribers (see split_message), so subscribers receive one message per packet whether or not the sender
+batched.
+"""
+
+BATCH_CONTENT_TYPE = 'application/vnd.eospayload.packet-batch'
+
+DEFAULT_LINGER = 0.05  # seconds
+DEFAULT_MAX_PACKETS = 32
+DEFAULT_MAX_BYTES = 64 * 1024
+
+_FRAME_LENGTH = struct.Struct('<I')
+
+
+@dataclass
+class BatchConfig:
+    enabled: bool = False
+    linger: float = DEFAULT_LINGER  # 0 = only publish full batches (or on flush)
+    max_packets: int = DEFAULT_MAX_PACKETS
+    max_bytes: int = DEFAULT_MAX_BYTES
+
+    @staticmethod
+    def from_settings(settings: dict | None) -> 'BatchConfig':
+        """ Builds a config from the optional `mqtt_batching` dict in a device's `settings`
+
+        :param settings: the device's settings dict (may be None)
+        :return: the batching config
+        """
+        batch_settings = settings_section(settings, "mqtt_batching")
+        try:
+            config = BatchConfig(
+                enabled=bool(batch_settings.get("enabled", False)),
+                linger=float(batch_settings.get("linger", DEFAULT_LINGER)),
+                max_packets=int(batch_settings.get("max_packets", DEFAULT_MAX_PACKETS)),
+                max_bytes=int(batch_settings.get("max_bytes", DEFAULT_MAX_BYTES)),
+            )
+        except TypeError as e:
+            raise ValueError(f"invalid mqtt_batching settings: {e}") from e
+        if config.linger < 0 or config.max_packets < 1 or config.max_bytes < 1:
+            raise ValueError("mqtt_batching linger must be >= 0 and max_packets and max_bytes must be >= 1")
+        return config
+
+
+def encode_batch(payloads: list[bytes]) -> bytes:
+    """ :return: the framed batch payload for the encoded packets """
+    return b''.join(_FRAME_LENGTH.pack(len(payload)) + payload for payload in payloads)
+
+
+def decode_batch(payload: bytes) -> list[bytes]:
+    """ Splits a framed batch payload back into encoded packets
+
+    :param payload: a payload produced by encode_batch()
+    :return: the encoded packets, in the order they were sent
+    """
+    payloads = []
+    offset = 0
+    while offset < len(payload):
+        if offset + _FRAME_LENGTH.size > len(payload):
+            raise ValueError("truncated packet batch frame header")
+        (length,) = _FRAME_LENGTH.unpack_from(payload, offset)
+        offset += _FRAME_LENGTH.size
+        if offset + length > len(payload):
+            raise ValueError("truncated packet batch frame")
+        payloads.append(payload[offset:offset + length])
+        offset += length
+    return payloads
+
+
+def batch_properties() -> Properties:
+    """ :return: the publish properties that mark a message as a batch """
+    properties = Properties(PacketTypes.PUBLISH)
+    properties.ContentType = BATCH_CONTENT_TYPE
+    return properties
+
+
+def is_batch(message: mosquitto.MQTTMessage) -> bool:
+    """ :return: True if the received message is a batch of packets """
+    properties = getattr(message, 'properties', None)
+    return getattr(properties, 'ContentType', None) == BATCH_CONTENT_TYPE
+
+
+def split_message(message: mosquitto.MQTTMessage) -> list[mosquitto.MQTTMessage]:
+    """ Subscriber-side decoder.  Splits a received batch into one message per packet, each of which can be decoded
+    with Packet.decode(message.payload).  Messages that aren't batches are returned as is.
+
+    :param message: the received message
+    :return: one message per packet
+    """
+    if not is_batch(message):
+        return [message]
+
+    messages = []
+    for payload in decode_batch(message.payload):
+        packet_message = mosquitto.MQTTMessage(message.mid, message.topic.encode())
+        packet_message.payload = payload
+        packet_message.qos = message.qos
+        packet_message.retain = message.retain
+        packet_message.timestamp = message.timestamp
+        messages.append(packet_message)
+    return messages
+
+
+class PacketBatcher:
+    """ Coalesces packets sent to the same topic into batches.  A topic's pending batch is published once it holds
+    max_packets packets or max_bytes bytes, or linger seconds after its first packet was added, whichever comes first.
+    A batch holding a single packet is published as a plain packet.  Thread safe.
+
+    Can be used as a context manager, which flushes and closes the batcher on exit.
+    """
+
+    def __init__(self, client, config: BatchConfig, name: str = 'mqtt-batcher'):
+        """
+        :param client: the EosPayload.lib.mqtt.client.Client to publish with
+        :param config: linger time and batch size limits
+        :param name: the name of the linger thread, which is only started if linger > 0
+        """
+        self._client = client
+        self._config = config
+        self._condition = threading.Condition()
+        self._pending: dict[str, list[bytes]] = {}
+        self._pending_bytes: dict[str, int] = {}
+        self._deadlines: dict[str, float] = {}
+        self._closed = False
+
+        self.thread = None
+        if config.linger > 0:
+            self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+            self.thread.start()
+
+    def __enter__(self) -> 'PacketBatcher':
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback) -> None:
+        self.close()
+
+    def send(self, topic: str, packet) -> bool:
+        """ Adds a packet to the topic's pending batch.  Non-blocking.  Once the batcher is closed, packets are
+        published immediately.
+
+        :param topic: the topic to send to
+        :param packet: the Packet to send
+        :return: True (the packet is always accepted)
+        """
+        payload = packet.encode()
+        with self._condition:
+            if self._closed:
+                self._publish([payload], topic)
+                return True
+
+            pending = self._pending.setdefault(topic, [])
+            if not pending:
+                self._deadlines[topic] = time.monotonic() + self._config.linger
+                self._condition.notify()
+            pending.append(payload)
+            self._pending_bytes[topic] = self._pending_bytes.get(topic, 0) + len(payload)
+            if len(pending) >= self._config.max_packets or self._pending_bytes[topic] >= self._config.max_bytes:
+                self._flush_topic(topic)
+        return True
+
+    def flush(self) -> None:
+        """ Publishes every pending batch now """
+        with self._condition:
+            for topic in list(self._pending):
+                self._flush_topic(topic)
+
+    def close(self, timeout: float | None = None) -> None:
+        """ Publishes every pending batch and stops the linger thread
+
+        :param timeout: how long to wait for the linger thread to exit
+        """
+        with self._condition:
+            self._closed = True
+            for topic in list(self._pending):
+                self._flush_topic(topic)
+            self._condition.notify()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+
+    def _flush_topic(self, topic: str) -> None:
+        """ Publishes the topic's pending batch.  Caller must hold self._condition. """
+        payloads = self._pending.pop(topic, None)
+        self._pending_bytes.pop(topic, None)
+        self._deadlines.pop(topic, None)
+        if payloads:
+            self._publish(payloads, topic)
+
+    def _publish(self, payloads: list[bytes], topic: str) -> None:
+        try:
+            self._client.publish_batch(topic, payloads)
+        except Exception as e:
+            logging.getLogger('mqtt').error(f"failed to publish a batch of {len(payloads)} packets to {topic}: {e}"
+                                            f"\n{traceback.format_exc()}")
+
+    def _run(self) -> None:
+        """ Linger thread.  Publishes each pending batch when its linger time expires. """
+        with self._condition:
+            while not self._closed:
+                if not self._deadlines:
+                    self._condition.wait()
+                    continue
+                topic = min(self._deadlines, key=self._deadlines.get)
+                remaining = self._deadlines[topic] - time.monotonic()
+                if remaining > 0:
+                    self._condition.wait(remaining)
+                    continue
+                self._flush_topic(topic)
@@ -1,52 +1,343 @@
-from typing import Callable
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable, Any
 import paho.mqtt.client as mosquitto
+import logging
 import threading
+import time
+import traceback
 
 from EosLib.packet import Packet
 
 from EosPayload.lib.mqtt import QOS, Topic
+from EosPayload.lib.mqtt.batching import BatchConfig, PacketBatcher, DEFAULT_MAX_BYTES, DEFAULT_MAX_PACKETS, \
+    batch_properties, encode_batch, is_batch, split_message
+from EosPayload.lib.mqtt.local_transport import LocalTransport
+from EosPayload.lib.mqtt.resilience import ResilienceConfig, SpillQueue
+
+
+@dataclass
+class ClientMetrics:
+    host: str
+    port: int
+    users: int = 0
+    connects: int = 0
+    disconnects: int = 0
+    threads: int = 0
+    subscriptions: int = 0
+    callbacks: int = 0
+    messages_sent: int = 0
+    messages_received: int = 0
+    batches_sent: int = 0
+    batched_packets_sent: int = 0
+    batches_received: int = 0
+    local_messages_sent: int = 0
+    local_messages_received: int = 0
+    resubscribes: int = 0
+    spilled: int = 0
+    spill_dropped: int = 0
+    replayed: int = 0
 
 
 class Client(mosquitto.Client):
-    
-    def __init__(self, host: str, port: int = 1883):
+
+    def __init__(self, host: str, port: int = 1883, resilience: ResilienceConfig | None = None):
         """ Connects to the MQTT server and spawns a thread for async MQTT operations.
             Connect operation is synchronous / blocking.  Subsequent sends/receives are async.
+            In resilient mode the connect happens in the background instead, and is retried with exponential backoff
+            (see resilience).
+            Prefer EosPayload.lib.mqtt.connection_manager.acquire_client(), which shares one Client per process.
 
         :param host: the hostname of the MQTT server
         :param port: the port of the MQTT server
+        :param resilience: reconnect and spill settings.  Defaults to non-resilient mode.
         """
         super(Client, self).__init__(protocol=mosquitto.MQTTv5)
-        self.connect(host, port)
+        self._subscribers: dict[str, list[tuple[Callable, Any]]] = {}
+        self._subscribers_lock = threading.Lock()
+        self._local: LocalTransport | None = None
+        self._resilience = resilience or ResilienceConfig()
+        self._spill: SpillQueue | None = None
+        self._replay_thread: threading.Thread | None = None
+        self.metrics = ClientMetrics(host, port)
+        self.on_connect = self._handle_connect
+        self.on_disconnect = self._count_disconnect
+
+        if self._resilience.resilient:
+            if self._resilience.spill_path is not None:
+                self._spill = SpillQueue(self._resilience.spill_path, self._resilience.spill_max_bytes)
+            self.reconnect_delay_set(self._resilience.reconnect_min_delay, self._resilience.reconnect_max_delay)
+            self.connect_async(host, port)
+        else:
+            self.connect(host, port)
         self.loop_start()
 
     def __del__(self):
-        """ cleans up MQTT thread on shutdown """
+        """ cleans up MQTT thread (and local transport) on shutdown """
+        if self._local is not None:
+            self._local.close()
         self.loop_stop()
+        if self._spill is not None:
+            with self._spill.lock:
+                self._spill.close()
         super(Client, self).__del__()
 
+    def attach_local_transport(self, path: str, topics: list[str]) -> None:
+        """ Carries the given topics over the local bus (see local_transport) instead of MQTT.  Subscriptions already
+            registered for those topics are added to the bus.  Falls back to MQTT if the bus connection is lost.
+
+        :param path: the local bus socket path
+        :param topics: the topics to carry over the bus
+        :raises OSError: if the bus can't be reached
+        """
+        self._local = LocalTransport(path, topics, self._dispatch_local)
+        with self._subscribers_lock:
+            topics_to_subscribe = [topic for topic in self._subscribers if self._local.handles(topic)]
+        for topic in topics_to_subscribe:
+            self._local.subscribe(topic)
+
     def send(self, topic: Topic, payload: Packet) -> mosquitto.MQTTMessageInfo:
-        """ Send a packet over MQTT.  Will internally queue messages even if not connected.  Will not notify on error.
+        """ Send a packet over MQTT (or the local bus, for local topics).  Will internally queue messages even if not
+            connected.  Will not notify on error.
             Async (Non-Blocking).
 
         :param topic: the topic to send
         :param payload: the packet to send
         :return: MQTTMessageInfo object, which has a wait_for_publish() method if you want to block on this message
         """
-        return self.publish(topic, payload.encode(), QOS.DELIVER_AT_MOST_ONCE)
+        encoded = payload.encode()
+        if not self._publish_local(topic, [encoded]):
+            return self._local_message_info()
+        return self._publish_mqtt(topic, encoded, False)
+
+    def send_many(self, topic: Topic, payloads: list[Packet], max_packets: int = DEFAULT_MAX_PACKETS,
+                  max_bytes: int = DEFAULT_MAX_BYTES) -> list[mosquitto.MQTTMessageInfo]:
+        """ Send several packets to the same topic, coalesced into as few MQTT messages as the limits allow.
+            Subscribers registered with register_subscriber() still receive one message per packet.
+            Async (Non-Blocking).
+
+        :param topic: the topic to send
+        :param payloads: the packets to send, in order
+        :param max_packets: the maximum number of packets per MQTT message
+        :param max_bytes: the maximum encoded size of the packets in one MQTT message (a larger packet is sent alone)
+        :return: an MQTTMessageInfo object per MQTT message sent
+        """
+        infos = []
+        batch = []
+        batch_bytes = 0
+        for packet in payloads:
+            encoded = packet.encode()
+            if batch and (len(batch) >= max_packets or batch_bytes + len(encoded) > max_bytes):
+                infos.append(self.publish_batch(topic, batch))
+                batch = []
+                batch_bytes = 0
+            batch.append(encoded)
+            batch_bytes += len(encoded)
+        if batch:
+            infos.append(self.publish_batch(topic, batch))
+        return infos
+
+    def publish_batch(self, topic: Topic, payloads: list[bytes]) -> mosquitto.MQTTMessageInfo:
+        """ Publish already-encoded packets as a single MQTT message.  A single packet is published as is.
+            Async (Non-Blocking).
+
+        :param topic: the topic to send
+        :param payloads: the encoded packets
+        :return: MQTTMessageInfo object for the message
+        """
+        payloads = self._publish_local(topic, payloads)
+        if not payloads:
+            return self._local_message_info()
+        if len(payloads) == 1:
+            return self._publish_mqtt(topic, payloads[0], False)
+        self.metrics.batches_sent += 1
+        self.metrics.batched_packets_sent += len(payloads)
+        return self._publish_mqtt(topic, encode_batch(payloads), True)
+
+    def send_state(self, topic: Topic, payload: bytes) -> mosquitto.MQTTMessageInfo:
+        """ Publish a retained message, which the server keeps and delivers to every later subscriber, so a state (eg
+            radio backpressure) reaches drivers that start after it last changed.  Always sent over MQTT, and never
+            spilled: a state that was missed is replaced by the next one.
+            Async (Non-Blocking).
+
+        :param topic: the topic to send
+        :param payload: the encoded state
+        :return: MQTTMessageInfo object for the message
+        """
+        self.metrics.messages_sent += 1
+        return self.publish(topic, payload, QOS.DELIVER_AT_MOST_ONCE, retain=True)
+
+    def batch(self, config: BatchConfig | None = None) -> PacketBatcher:
+        """ Creates a batcher that coalesces packets sent through it, per topic, according to the config's linger time
+            and batch size limits.  Use as a context manager, or call close() when done, to publish what remains.
+
+            with client.batch() as batch:
+                for packet in packets:
+                    batch.send(Topic.RADIO_TRANSMIT, packet)
+
+        :param config: linger time and batch size limits.  Defaults to publishing only full batches and whatever is
+                       left when the batcher is closed.
+        :return: the batcher
+        """
+        if config is None:
+            config = BatchConfig(enabled=True, linger=0)
+        return PacketBatcher(self, config)
 
-    def register_subscriber(self, topic: Topic, callback: Callable) -> None:
+    def register_subscriber(self, topic: Topic, callback: Callable, user_data: Any = None) -> None:
         """ Receive an MQTT message.
             Starts listening for messages of the Topic and calling Callback on them.
+            Any number of callbacks may be registered for the same topic; each is called in registration order.
             Async (Non-Blocking).
 
         :param topic: the topic to filter for
         :param callback: a function taking 3 parameters: (client, userdata, message)
+        :param user_data: passed as the userdata parameter of this callback only.  If None, the client-wide user data
+                          (see user_data_set()) is passed instead.
         """
-        self.message_callback_add(topic, callback)
-        self.subscribe(topic, QOS.DELIVER_AT_MOST_ONCE)
+        with self._subscribers_lock:
+            subscribers = self._subscribers.get(topic)
+            first_subscriber = subscribers is None
+            if first_subscriber:
+                subscribers = []
+                self._subscribers[topic] = subscribers
+            subscribers.append((callback, user_data))
+            self.metrics.subscriptions = len(self._subscribers)
+            self.metrics.callbacks += 1
+
+        if first_subscriber:
+            self.message_callback_add(topic, partial(self._dispatch, topic))
+            self.subscribe(topic, QOS.DELIVER_AT_MOST_ONCE)
+            # local topics are received over both, so external tools can still publish to them over MQTT
+            if self._local is not None and self._local.handles(topic):
+                self._local.subscribe(topic)
 
     def get_thread(self) -> threading.Thread | None:
         """ :return: the MQTT background thread or None if none exists """
         return self._thread
 
+    def get_metrics(self) -> ClientMetrics:
+        """ :return: connection, thread and message counts for this client """
+        self.metrics.threads = 1 if self._thread is not None and self._thread.is_alive() else 0
+        if self._spill is not None:
+            self.metrics.spilled = self._spill.spilled
+            self.metrics.spill_dropped = self._spill.dropped
+            self.metrics.replayed = self._spill.replayed
+        return self.metrics
+
+    def _dispatch(self, topic: Topic, client, user_data, message) -> None:
+        """ Calls every callback registered for the topic with its own user data.  An exception in one callback is
+        logged and does not prevent the others from running (or kill the MQTT thread).  Batches are split first, so
+        callbacks are called once per packet.
+        """
+        self.metrics.messages_received += 1
+        if is_batch(message):
+            self.metrics.batches_received += 1
+        try:
+            messages = split_message(message)
+        except ValueError as e:
+            logging.getLogger('mqtt').error(f"dropping malformed packet batch on topic {topic}: {e}")
+            return
+
+        self._deliver(topic, client, user_data, messages)
+
+    def _dispatch_local(self, topic: str, payload: bytes) -> None:
+        """ Dispatches a packet received over the local bus as if it had been received over MQTT """
+        self.metrics.local_messages_received += 1
+        message = mosquitto.MQTTMessage(0, topic.encode())
+        message.payload = payload
+        self._deliver(topic, self, self._userdata, [message])
+
+    def _deliver(self, topic: str, client, user_data, messages: list[mosquitto.MQTTMessage]) -> None:
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers.get(topic, []))
+        for packet_message in messages:
+            for callback, callback_user_data in subscribers:
+                try:
+                    callback(client, user_data if callback_user_data is None else callback_user_data, packet_message)
+                except Exception as e:
+                    callback_name = getattr(callback, '__name__', callback)
+                    logging.getLogger('mqtt').error(f"unhandled exception in subscriber {callback_name} for topic"
+                                                    f" {topic}: {e}\n{traceback.format_exc()}")
+
+    def _publish_local(self, topic: Topic, payloads: list[bytes]) -> list[bytes]:
+        """ Publishes the encoded packets over the local bus if the topic is carried by it
+
+        :return: the packets that still need to be published over MQTT
+        """
+        if self._local is None or not self._local.handles(topic):
+            return payloads
+        for i, payload in enumerate(payloads):
+            if not self._local.publish(topic, payload):
+                return payloads[i:]
+            self.metrics.local_messages_sent += 1
+        return []
+
+    @staticmethod
+    def _local_message_info() -> mosquitto.MQTTMessageInfo:
+        """ :return: an already-published MQTTMessageInfo for messages handed to the local bus """
+        info = mosquitto.MQTTMessageInfo(0)
+        info._set_as_published()
+        return info
+
+    def _publish_mqtt(self, topic: Topic, payload: bytes, batch: bool) -> mosquitto.MQTTMessageInfo:
+        """ Publishes over MQTT, or appends to the spill queue while disconnected (or while older spilled messages are
+        still being replayed, so messages stay in order).
+        """
+        if self._spill is None:
+            return self._publish_now(topic, payload, batch)
+        with self._spill.lock:
+            if self.is_connected() and not self._spill.pending:
+                return self._publish_now(topic, payload, batch)
+            info = mosquitto.MQTTMessageInfo(0)
+            if not self._spill.put(topic, payload, batch):
+                info.rc = mosquitto.MQTT_ERR_QUEUE_SIZE
+            return info
+
+    def _publish_now(self, topic: Topic, payload: bytes, batch: bool) -> mosquitto.MQTTMessageInfo:
+        self.metrics.messages_sent += 1
+        if batch:
+            return self.publish(topic, payload, QOS.DELIVER_AT_MOST_ONCE, properties=batch_properties())
+        return self.publish(topic, payload, QOS.DELIVER_AT_MOST_ONCE)
+
+    def _replay_spill(self) -> None:
+        """ Replay thread.  Publishes spilled messages, oldest first, at no more than replay_rate per second.  Stops
+        if the connection drops again; the next connect starts a new replay.
+        """
+        interval = 1 / self._resilience.replay_rate
+        logger = logging.getLogger('mqtt')
+        logger.info(f"replaying spilled messages from {self._spill.path}")
+        while True:
+            with self._spill.lock:
+                if not self.is_connected():
+                    logger.warning("connection lost while replaying spilled messages")
+                    return
+                record = self._spill.pop()
+                if record is None:
+                    logger.info(f"done replaying spilled messages ({self._spill.replayed} replayed in total)")
+                    return
+                self._publish_now(*record)
+            time.sleep(interval)
+
+    def _handle_connect(self, _client, _user_data, _flags, reason_code, _properties=None) -> None:
+        """ Re-establishes every registered subscription (the broker may have restarted and forgotten them) and
+        starts replaying spilled messages.
+        """
+        self.metrics.connects += 1
+        if reason_code != 0:
+            return
+
+        with self._subscribers_lock:
+            topics = list(self._subscribers)
+        if topics:
+            # subscribe() calls made while disconnected were dropped by paho, so this also covers the first connect
+            self.subscribe([(topic, QOS.DELIVER_AT_MOST_ONCE) for topic in topics])
+            if self.metrics.connects > 1:
+                self.metrics.resubscribes += 1
+
+        if self._spill is not None and self._spill.pending \
+                and (self._replay_thread is None or not self._replay_thread.is_alive()):
+            self._replay_thread = threading.Thread(target=self._replay_spill, name='mqtt-replay', daemon=True)
+            self._replay_thread.start()
+
+    def _count_disconnect(self, _client, _user_data, _reason_code, _properties=None) -> None:
+        self.metrics.disconnects += 1
@@ -0,0 +1,83 @@
+import logging
+import os
+import threading
+
+from EosPayload.lib.mqtt.client import Client, ClientMetrics
+from EosPayload.lib.mqtt.local_transport import local_bus_from_environment
+from EosPayload.lib.mqtt.resilience import ResilienceConfig
+
+"""
+Process-wide MQTT connection sharing.  Every user in a process (the driver, its base classes, orchEOStrator) acquires
+the same Client for a given broker, so a process holds one TCP connection and one paho network thread no matter how
+many subscribers and publishers it has.  Subscribers registered on the shared Client are dispatched per topic with
+their own user data (see Client.register_subscriber), so users don't need to share user_data_set().
+If OrchEOStrator has started a local bus, shared clients carry its topics over the bus instead of mosquitto.
+"""
+
+_clients: dict[tuple[str, int], Client] = {}
+_clients_lock = threading.Lock()
+
+
+def acquire_client(host: str, port: int = 1883, resilience: ResilienceConfig | None = None) -> Client:
+    """ Returns the process's shared Client for the broker, connecting on first use (blocking, unless resilient).
+    Every call must be paired with a call to release_client().
+
+    :param host: the hostname of the MQTT server
+    :param port: the port of the MQTT server
+    :param resilience: reconnect and spill settings, used only if this call creates the client
+    :return: the shared client
+    """
+    with _clients_lock:
+        client = _clients.get((host, port))
+        if client is None:
+            client = Client(host, port, resilience)
+            _attach_local_bus(client)
+            _clients[(host, port)] = client
+        client.metrics.users += 1
+        return client
+
+
+def release_client(client: Client) -> None:
+    """ Releases a client returned by acquire_client().  The connection is closed when its last user releases it.
+
+    :param client: the shared client
+    """
+    with _clients_lock:
+        client.metrics.users -= 1
+        if client.metrics.users > 0:
+            return
+        _clients.pop((client.metrics.host, client.metrics.port), None)
+    client.loop_stop()  # blocking.  this will join the thread, no way around it sadly
+    client.disconnect()
+    client.__del__()  # explicitly closing sockets just in case
+
+
+def get_connection_metrics() -> list[ClientMetrics]:
+    """ :return: metrics for every shared connection in this process """
+    with _clients_lock:
+        return [client.get_metrics() for client in _clients.values()]
+
+
+def _attach_local_bus(client: Client) -> None:
+    local_bus = local_bus_from_environment()
+    if local_bus is None:
+        return
+    path, topics = local_bus
+    try:
+        client.attach_local_transport(path, topics)
+    except OSError as e:
+        logging.getLogger('mqtt').warning(f"failed to connect to the local bus at {path}, using MQTT for all topics:"
+                                          f" {e}")
+
+
+def _forget_clients_after_fork() -> None:
+    """ A forked child (eg a driver process) inherits the parent's clients, but not their network threads, and must
+    not share their sockets -- so it starts with no shared clients of its own.
+    """
+    global _clients_lock
+    _clients.clear()
+    _clients_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_clients_after_fork)
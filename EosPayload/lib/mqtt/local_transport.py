@@ -0,0 +1,291 @@
+import logging
+import os
+import selectors
+import socket
+import struct
+import tempfile
+import threading
+import traceback
+from dataclasses import dataclass, field
+from typing import Callable
+
+from EosPayload.lib.mqtt import Topic
+from EosPayload.lib.util import settings_section
+
+"""
+Zero-broker local transport for topics that never leave the payload.  OrchEOStrator runs a LocalBus, which listens on
+a Unix-domain SOCK_SEQPACKET socket and forwards each published record to the connections subscribed to its topic.
+Each process's shared Client (see connection_manager) connects a LocalTransport to the bus and uses it instead of
+mosquitto for the configured topics, keeping the same send()/register_subscriber() API.  Subscribers stay subscribed
+over MQTT too, so external tools can still publish to local topics.
+
+Record layout: uint8 op, uint16 little-endian topic length, utf8 topic, payload.  The bus forwards PUBLISH records
+verbatim and never decodes payloads.
+"""
+
+DEFAULT_LOCAL_TOPICS = [
+    Topic.POSITION_UPDATE.value,
+    Topic.HEALTH_HEARTBEAT.value,
+    Topic.PING_COMMAND.value,
+    Topic.CUTDOWN_COMMAND.value,
+    Topic.VALVE_COMMAND.value,
+]
+
+# larger records are published over MQTT instead
+MAX_RECORD_SIZE = 64 * 1024
+
+# the bus location is handed to driver processes through the environment, so it survives any process start method
+LOCAL_BUS_PATH_ENV = 'EOS_LOCAL_BUS_PATH'
+LOCAL_BUS_TOPICS_ENV = 'EOS_LOCAL_BUS_TOPICS'
+
+_OP_SUBSCRIBE = 1
+_OP_PUBLISH = 2
+_RECORD_HEADER = struct.Struct('<BH')
+
+# how often the bus thread checks whether it has been closed
+_SELECT_TIMEOUT = 0.5  # seconds
+
+
+@dataclass
+class LocalTransportConfig:
+    enabled: bool = False
+    topics: list[str] = field(default_factory=lambda: list(DEFAULT_LOCAL_TOPICS))
+    socket_path: str | None = None
+
+    @staticmethod
+    def from_settings(settings: dict | None) -> 'LocalTransportConfig':
+        """ Builds a config from the optional `local_transport` dict at the top level of the config file
+
+        :param settings: the top level config dict (may be None)
+        :return: the local transport config
+        """
+        local_settings = settings_section(settings, "local_transport")
+        try:
+            return LocalTransportConfig(
+                enabled=bool(local_settings.get("enabled", False)),
+                topics=[str(topic) for topic in local_settings.get("topics", DEFAULT_LOCAL_TOPICS)],
+                socket_path=local_settings.get("socket_path"),
+            )
+        except TypeError as e:
+            raise ValueError(f"invalid local_transport settings: {e}") from e
+
+
+@dataclass
+class LocalBusMetrics:
+    connections: int = 0
+    subscriptions: int = 0
+    published: int = 0
+    delivered: int = 0
+    dropped: int = 0
+
+
+def _pack_record(op: int, topic: str, payload: bytes = b'') -> bytes:
+    encoded_topic = topic.encode()
+    return _RECORD_HEADER.pack(op, len(encoded_topic)) + encoded_topic + payload
+
+
+def _unpack_record(record: bytes) -> tuple[int, str, bytes]:
+    op, topic_length = _RECORD_HEADER.unpack_from(record)
+    topic_end = _RECORD_HEADER.size + topic_length
+    return op, record[_RECORD_HEADER.size:topic_end].decode(), record[topic_end:]
+
+
+def export_local_bus(path: str, topics: list[str]) -> None:
+    """ Makes the bus available to Clients created by this process and any process it starts afterwards """
+    os.environ[LOCAL_BUS_PATH_ENV] = path
+    os.environ[LOCAL_BUS_TOPICS_ENV] = ','.join(topics)
+
+
+def local_bus_from_environment() -> tuple[str, list[str]] | None:
+    """ :return: the (socket path, topics) of the bus exported by OrchEOStrator, or None if there is none """
+    path = os.environ.get(LOCAL_BUS_PATH_ENV)
+    if not path:
+        return None
+    topics = [topic for topic in os.environ.get(LOCAL_BUS_TOPICS_ENV, '').split(',') if topic]
+    return path, topics
+
+
+class LocalBus:
+    """ The router for the local transport.  Runs a single thread in OrchEOStrator.
+
+    Subscribers are never allowed to stall the bus: a record that doesn't fit in a subscriber's socket buffer is
+    dropped for that subscriber (and counted), the same at-most-once delivery MQTT gives these topics.
+    """
+
+    def __init__(self, logger: logging.Logger, path: str | None = None):
+        """
+        :param logger: used to report connection errors
+        :param path: the socket path.  Defaults to a per-process path in the temp directory.
+        """
+        self.path = path or os.path.join(tempfile.gettempdir(), f"eospayload-{os.getpid()}.sock")
+        self.metrics = LocalBusMetrics()
+        self._logger = logger
+        self._selector = selectors.DefaultSelector()
+        self._server: socket.socket | None = None
+        self._subscriptions: dict[str, set[socket.socket]] = {}
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='local-bus', daemon=True)
+
+    def start(self) -> None:
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self._server.bind(self.path)
+        self._server.listen()
+        self._server.setblocking(False)
+        self._selector.register(self._server, selectors.EVENT_READ)
+        self.thread.start()
+
+    def close(self) -> None:
+        """ Stops the bus thread and disconnects every client """
+        self._stop.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        for key in list(self._selector.get_map().values()):
+            self._selector.unregister(key.fileobj)
+            key.fileobj.close()
+        self._subscriptions = {}
+        if self._server is not None and os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                for key, _ in self._selector.select(timeout=_SELECT_TIMEOUT):
+                    if key.fileobj is self._server:
+                        self._accept()
+                    else:
+                        self._read(key.fileobj)
+            except Exception as e:
+                self._logger.error(f"unhandled exception in local bus: {e}\n{traceback.format_exc()}")
+
+    def _accept(self) -> None:
+        try:
+            connection, _ = self._server.accept()
+        except BlockingIOError:
+            return
+        connection.setblocking(False)
+        self._selector.register(connection, selectors.EVENT_READ)
+        self.metrics.connections += 1
+
+    def _read(self, connection: socket.socket) -> None:
+        try:
+            record = connection.recv(MAX_RECORD_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            record = b''
+        if not record:
+            self._disconnect(connection)
+            return
+
+        op, topic, _ = _unpack_record(record)
+        if op == _OP_SUBSCRIBE:
+            self._subscriptions.setdefault(topic, set()).add(connection)
+            self.metrics.subscriptions = sum(len(subscribers) for subscribers in self._subscriptions.values())
+        elif op == _OP_PUBLISH:
+            self.metrics.published += 1
+            for subscriber in list(self._subscriptions.get(topic, ())):
+                try:
+                    subscriber.send(record)
+                    self.metrics.delivered += 1
+                except BlockingIOError:
+                    self.metrics.dropped += 1
+                except OSError:
+                    self._disconnect(subscriber)
+
+    def _disconnect(self, connection: socket.socket) -> None:
+        try:
+            self._selector.unregister(connection)
+        except (KeyError, ValueError):
+            return  # already disconnected
+        for subscribers in self._subscriptions.values():
+            subscribers.discard(connection)
+        self.metrics.subscriptions = sum(len(subscribers) for subscribers in self._subscriptions.values())
+        connection.close()
+        self.metrics.connections -= 1
+
+
+class LocalTransport:
+    """ A process's connection to the LocalBus.  publish() is thread safe; received records are passed to on_message
+    from a reader thread.
+    """
+
+    def __init__(self, path: str, topics: list[str], on_message: Callable[[str, bytes], None]):
+        """ Connects to the bus (blocking).
+
+        :param path: the bus socket path
+        :param topics: the topics to carry over the bus instead of MQTT
+        :param on_message: called with (topic, payload) for every record received
+        :raises OSError: if the bus can't be reached
+        """
+        self.topics = frozenset(topics)
+        self._on_message = on_message
+        self._send_lock = threading.Lock()
+        self._pid = os.getpid()
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self._socket.connect(path)
+        self._connected = True
+        self.thread = threading.Thread(target=self._run, name='local-transport', daemon=True)
+        self.thread.start()
+
+    def handles(self, topic: str) -> bool:
+        """ :return: True if the topic is carried over the bus and the bus is connected """
+        return self._connected and topic in self.topics
+
+    def subscribe(self, topic: str) -> bool:
+        """ :return: True if the subscription was sent to the bus """
+        return self._send(_pack_record(_OP_SUBSCRIBE, topic))
+
+    def publish(self, topic: str, payload: bytes) -> bool:
+        """ :return: True if the payload was handed to the bus, False if it must be sent some other way """
+        record = _pack_record(_OP_PUBLISH, topic, payload)
+        if len(record) > MAX_RECORD_SIZE:
+            return False
+        return self._send(record)
+
+    def close(self) -> None:
+        if not self._connected and self._socket.fileno() == -1:
+            return
+        self._connected = False
+        # a forked child only closes its copy of the descriptor; shutting the socket down would disconnect the parent
+        if os.getpid() == self._pid:
+            try:
+                self._socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join()
+        self._socket.close()
+
+    def _send(self, record: bytes) -> bool:
+        if not self._connected:
+            return False
+        try:
+            with self._send_lock:
+                self._socket.send(record)
+            return True
+        except OSError as e:
+            self._lost_connection(e)
+            return False
+
+    def _run(self) -> None:
+        while self._connected:
+            try:
+                record = self._socket.recv(MAX_RECORD_SIZE)
+            except OSError as e:
+                self._lost_connection(e)
+                return
+            if not record:
+                self._lost_connection(None)
+                return
+            op, topic, payload = _unpack_record(record)
+            if op == _OP_PUBLISH:
+                self._on_message(topic, payload)
+
+    def _lost_connection(self, error: Exception | None) -> None:
+        if self._connected:
+            self._connected = False
+            logging.getLogger('mqtt').warning(f"lost connection to the local bus, falling back to MQTT"
+                                              f"{f': {error}' if error else ''}")
@@ -0,0 +1,143 @@
+import os
+import struct
+import threading
+from dataclasses import dataclass
+
+from EosPayload.lib.util import settings_section
+
+"""
+Resilient MQTT mode.  The client connects in the background and paho reconnects with exponential backoff whenever the
+connection drops; subscriptions are re-established from the client's subscriber registry on every connect.  Publishes
+made while disconnected are appended to a bounded on-disk SpillQueue and replayed, in order and rate limited, once the
+connection is back, so a broker restart neither loses messages nor gets hit by every driver's backlog at once.
+"""
+
+DEFAULT_RECONNECT_MIN_DELAY = 1  # seconds
+DEFAULT_RECONNECT_MAX_DELAY = 60  # seconds
+DEFAULT_SPILL_MAX_BYTES = 16 * 1024 * 1024
+DEFAULT_REPLAY_RATE = 100.0  # messages per second
+
+# flags, topic length, payload length
+_RECORD_HEADER = struct.Struct('<BHI')
+_FLAG_BATCH = 0x01
+
+
+@dataclass
+class ResilienceConfig:
+    resilient: bool = False
+    reconnect_min_delay: int = DEFAULT_RECONNECT_MIN_DELAY
+    reconnect_max_delay: int = DEFAULT_RECONNECT_MAX_DELAY
+    spill_path: str | None = None  # None = publishes made while disconnected are dropped
+    spill_max_bytes: int = DEFAULT_SPILL_MAX_BYTES
+    replay_rate: float = DEFAULT_REPLAY_RATE
+
+    @staticmethod
+    def from_settings(settings: dict | None, spill_path: str | None = None) -> 'ResilienceConfig':
+        """ Builds a config from the optional `mqtt` dict in a device's `settings` (or the top level of the config file,
+        for orchEOStrator).
+
+        :param settings: the dict that may contain an `mqtt` dict (may be None)
+        :param spill_path: where to keep publishes made while disconnected
+        :return: the resilience config
+        """
+        mqtt_settings = settings_section(settings, "mqtt")
+        try:
+            config = ResilienceConfig(
+                resilient=bool(mqtt_settings.get("resilient", False)),
+                reconnect_min_delay=int(mqtt_settings.get("reconnect_min_delay", DEFAULT_RECONNECT_MIN_DELAY)),
+                reconnect_max_delay=int(mqtt_settings.get("reconnect_max_delay", DEFAULT_RECONNECT_MAX_DELAY)),
+                spill_path=spill_path,
+                spill_max_bytes=int(mqtt_settings.get("spill_max_bytes", DEFAULT_SPILL_MAX_BYTES)),
+                replay_rate=float(mqtt_settings.get("replay_rate", DEFAULT_REPLAY_RATE)),
+            )
+        except TypeError as e:
+            raise ValueError(f"invalid mqtt settings: {e}") from e
+        if config.reconnect_min_delay < 1 or config.reconnect_max_delay < config.reconnect_min_delay:
+            raise ValueError("mqtt reconnect_min_delay must be >= 1 and reconnect_max_delay >= reconnect_min_delay")
+        if config.replay_rate <= 0:
+            raise ValueError("mqtt replay_rate must be > 0")
+        if config.spill_max_bytes <= 0:
+            config.spill_path = None
+        return config
+
+
+class SpillQueue:
+    """ A bounded, append-only, on-disk FIFO of publishes.  Records survive a process restart and are replayed by the
+    next process that opens the same path.  When the file would grow past max_bytes, new records are dropped (and
+    counted) so the oldest data is kept.  The file is truncated once every record has been popped.
+
+    Not thread safe on its own: callers must hold `lock`, which they also use to keep direct publishes from
+    overtaking records still waiting to be replayed.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        """
+        :param path: the spill file.  Records left by a previous process are kept.
+        :param max_bytes: the maximum size of the spill file
+        """
+        self.lock = threading.RLock()
+        self.path = path
+        self.spilled = 0
+        self.replayed = 0
+        self.dropped = 0
+        self._max_bytes = max_bytes
+        self._file = open(path, 'a+b')
+        self._size = self._file.seek(0, os.SEEK_END)
+        self._read_offset = 0
+
+    @property
+    def pending(self) -> bool:
+        """ :return: True if there are records waiting to be replayed """
+        return self._read_offset < self._size
+
+    def put(self, topic: str, payload: bytes, batch: bool) -> bool:
+        """ Appends a publish to the queue
+
+        :param topic: the topic to publish to
+        :param payload: the message payload
+        :param batch: True if the payload is a packet batch (see batching)
+        :return: True if the record was stored, False if the queue is full
+        """
+        encoded_topic = topic.encode()
+        record = _RECORD_HEADER.pack(_FLAG_BATCH if batch else 0, len(encoded_topic), len(payload)) \
+            + encoded_topic + payload
+        if self._size + len(record) > self._max_bytes:
+            self.dropped += 1
+            return False
+        self._file.write(record)
+        self._file.flush()
+        self._size += len(record)
+        self.spilled += 1
+        return True
+
+    def pop(self) -> tuple[str, bytes, bool] | None:
+        """ :return: the oldest (topic, payload, batch) record, or None if the queue is empty """
+        if not self.pending:
+            return None
+
+        self._file.seek(self._read_offset)
+        header = self._file.read(_RECORD_HEADER.size)
+        record = None
+        if len(header) == _RECORD_HEADER.size:
+            flags, topic_length, payload_length = _RECORD_HEADER.unpack(header)
+            body = self._file.read(topic_length + payload_length)
+            if len(body) == topic_length + payload_length:
+                try:
+                    record = (body[:topic_length].decode(), body[topic_length:], bool(flags & _FLAG_BATCH))
+                    self._read_offset += _RECORD_HEADER.size + len(body)
+                except UnicodeDecodeError:
+                    pass
+
+        if record is None:
+            # a partial record left by a crash mid-write, or a corrupt one; nothing after it can be trusted
+            self._read_offset = self._size
+        else:
+            self.replayed += 1
+        if not self.pending:
+            self._file.truncate(0)
+            self._size = 0
+            self._read_offset = 0
+        return record
+
+    def close(self) -> None:
+        self._file.close()
@@ -0,0 +1,128 @@
+import ctypes
+import os
+import struct
+from dataclasses import dataclass
+
+from EosPayload.lib.orcheostrator.device_container import DeviceContainer
+from EosPayload.lib.util import settings_section
+
+"""
+Reloading config.json while the payload is running.  OrchEOStrator reloads on SIGHUP and, if `watch` is set, whenever
+the config file is written (watched with inotify).  The new config is parsed the same way as at boot and diffed against
+the running drivers, so only the drivers whose device config changed are stopped, started or restarted.
+"""
+
+# top level settings that are applied on reload.  Changes to any other top level setting need a full restart.
+RELOADABLE_GLOBAL_SETTINGS = ["restart", "shutdown"]
+
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_INOTIFY_EVENT = struct.Struct('iIII')  # wd, mask, cookie, name length
+
+
+@dataclass
+class ConfigReloadConfig:
+    watch: bool = False
+    debounce: float = 1.0  # seconds
+
+    @staticmethod
+    def from_settings(settings: dict | None) -> 'ConfigReloadConfig':
+        """ Builds a config from the optional `config_reload` dict at the top level of the config file
+
+        :param settings: the top level config dict (may be None)
+        :return: the config reload config
+        """
+        reload_settings = settings_section(settings, "config_reload")
+        try:
+            config = ConfigReloadConfig(
+                watch=bool(reload_settings.get("watch", False)),
+                debounce=float(reload_settings.get("debounce", 1.0)),
+            )
+        except TypeError as e:
+            raise ValueError(f"invalid config_reload settings: {e}") from e
+        if config.debounce < 0:
+            raise ValueError("config_reload debounce must be >= 0")
+        return config
+
+
+@dataclass
+class DeviceDiff:
+    added: list[DeviceContainer]
+    removed: list[DeviceContainer]
+    changed: list[tuple[DeviceContainer, DeviceContainer]]  # (running, new)
+    unchanged: list[tuple[DeviceContainer, DeviceContainer]]  # (running, new)
+
+
+def diff_devices(running: dict, new_devices: list[DeviceContainer]) -> DeviceDiff:
+    """ Compares the running drivers with a newly parsed config
+
+    :param running: the running drivers by device id (other keys, eg of invalid drivers, are ignored)
+    :param new_devices: the enabled devices of the new config
+    :return: which drivers to start, stop, restart and leave alone
+    """
+    new_by_id = {container.config.get("device_id"): container for container in new_devices}
+    running_by_id = {device_id: container for device_id, container in running.items()
+                     if container.config.get("device_id") == device_id}
+    diff = DeviceDiff([], [], [], [])
+    for device_id, container in running_by_id.items():
+        new_container = new_by_id.get(device_id)
+        if new_container is None:
+            diff.removed.append(container)
+        elif new_container.config != container.config:
+            diff.changed.append((container, new_container))
+        else:
+            diff.unchanged.append((container, new_container))
+    diff.added = [container for device_id, container in new_by_id.items() if device_id not in running_by_id]
+    return diff
+
+
+def changed_global_settings(old: dict, new: dict) -> list[str]:
+    """ :return: the top level settings whose value differs between two configs """
+    return sorted(key for key in set(old) | set(new) if old.get(key) != new.get(key))
+
+
+class ConfigWatcher:
+    """ Watches a file with inotify (Linux only).  Has a fileno(), so it can be waited on with
+    multiprocessing.connection.wait, and is readable when the file may have changed. """
+
+    def __init__(self, path: str):
+        """
+        :param path: the file to watch.  Its directory is watched, so editors that replace the file are noticed too.
+        """
+        self._name = os.path.basename(path)
+        libc = ctypes.CDLL(None, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError("inotify is not available")
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        directory = os.path.dirname(os.path.abspath(path))
+        if libc.inotify_add_watch(self._fd, directory.encode(), _IN_CLOSE_WRITE | _IN_MOVED_TO) < 0:
+            error = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(error, f"inotify_add_watch failed for {directory}")
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def changed(self) -> bool:
+        """ Reads the pending events
+
+        :return: True if any of them was for the watched file
+        """
+        changed = False
+        while True:
+            try:
+                events = os.read(self._fd, 4096)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(events):
+                _, _, _, name_length = _INOTIFY_EVENT.unpack_from(events, offset)
+                offset += _INOTIFY_EVENT.size
+                name = events[offset:offset + name_length].rstrip(b'\0').decode(errors='replace')
+                offset += name_length
+                changed = changed or name == self._name
+
+    def close(self) -> None:
+        os.close(self._fd)
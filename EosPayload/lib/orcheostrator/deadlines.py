@@ -0,0 +1,63 @@
+import heapq
+import itertools
+from typing import Hashable
+
+"""
+The deadlines OrchEOStrator's event loop sleeps until: each driver's next expected heartbeat, pending restarts and
+startup timeouts, and the next health report.  Rescheduling a key replaces its deadline; superseded heap entries are
+skipped when they reach the top instead of being searched for and removed.
+"""
+
+
+class DeadlineHeap:
+
+    def __init__(self):
+        self._heap: list[tuple[float, int, Hashable]] = []
+        self._deadlines: dict[Hashable, float] = {}
+        self._counter = itertools.count()  # breaks ties, so keys never have to be comparable
+
+    def schedule(self, key: Hashable, deadline: float) -> None:
+        """ Sets the key's deadline, replacing any it already had
+
+        :param key: what the deadline is for
+        :param deadline: the time.monotonic() it is due at
+        """
+        self._deadlines[key] = deadline
+        heapq.heappush(self._heap, (deadline, next(self._counter), key))
+
+    def cancel(self, key: Hashable) -> None:
+        self._deadlines.pop(key, None)
+
+    def clear(self) -> None:
+        self._heap.clear()
+        self._deadlines.clear()
+
+    def next_deadline(self) -> float | None:
+        """ :return: the earliest deadline, or None if nothing is scheduled """
+        self._drop_superseded()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float) -> list[Hashable]:
+        """ Removes and returns every key whose deadline has passed, earliest first
+
+        :param now: the current time.monotonic()
+        :return: the keys that are due
+        """
+        due = []
+        self._drop_superseded()
+        while self._heap and self._heap[0][0] <= now:
+            _, _, key = heapq.heappop(self._heap)
+            del self._deadlines[key]
+            due.append(key)
+            self._drop_superseded()
+        return due
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._deadlines
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def _drop_superseded(self) -> None:
+        while self._heap and self._deadlines.get(self._heap[0][2]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
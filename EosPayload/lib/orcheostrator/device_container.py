@@ -4,7 +4,10 @@ from multiprocessing import Process
 
 from EosLib.device import Device
 
-from EosPayload.lib.base_drivers.driver_base import DriverBase
+from EosPayload.lib.driver_registry import DriverInfo
+from EosPayload.lib.orcheostrator.resource_monitor import ResourceConfig
+from EosPayload.lib.orcheostrator.scheduling import SchedulingConfig
+from EosPayload.lib.orcheostrator.supervisor import RestartConfig, RestartTracker
 
 
 @unique
@@ -15,6 +18,7 @@ class Status(Enum):
     UNHEALTHY = 3
     TERMINATED = 4
     INITIALIZED = 5
+    CRASH_LOOP = 6
 
 
 class StatusUpdate:
@@ -28,7 +32,7 @@ class StatusUpdate:
 
 class DeviceContainer:
 
-    def __init__(self, driver: DriverBase, process: Process = None, config: dict = None):
+    def __init__(self, driver: DriverInfo, process: Process = None, config: dict = None):
         self.driver = driver
         self.process = process
         self.config = config
@@ -36,6 +40,9 @@ class DeviceContainer:
         self.thread_count = 0
         self.status_reporter = Device.NO_DEVICE
         self.status_since = datetime.now()
+        self.restart = RestartTracker(RestartConfig())
+        self.resource_limits: ResourceConfig | None = None
+        self.scheduling = SchedulingConfig()
 
     def update_status(self, status: Status, thread_count: int = 0, reporter: Device = Device.ORCHEOSTRATOR,
                       effective: datetime = None):
@@ -1,8 +1,10 @@
 from datetime import datetime, timedelta
-from multiprocessing import Process
+from multiprocessing.connection import Connection, wait
 from queue import Queue
 import logging
 import os
+import signal
+import socket
 import threading
 import time
 import traceback
@@ -12,11 +14,43 @@ from EosLib.format import Type
 from EosLib.format.formats.health.driver_health_report import DriverHealthReport
 from EosLib.packet.packet import Packet
 
-from EosPayload.lib.logger import init_logging
+from EosPayload.lib.base_drivers.driver_base import StartupStatus
+from EosPayload.lib.driver_registry import DriverInfo, load_driver_class
+from EosPayload.lib.health_table import HealthTable, HealthTableConfig, export_health_table
+from EosPayload.lib.logger import LoggingConfig, init_logging, shutdown_logging
 from EosPayload.lib.mqtt import MQTT_HOST
-from EosPayload.lib.mqtt.client import Client, Topic
+from EosPayload.lib.mqtt.client import Topic
+from EosPayload.lib.mqtt.connection_manager import acquire_client, get_connection_metrics
+from EosPayload.lib.mqtt.local_transport import LocalBus, LocalTransportConfig, export_local_bus
+from EosPayload.lib.mqtt.resilience import ResilienceConfig
+from EosPayload.lib.orcheostrator.config_reload import ConfigReloadConfig, ConfigWatcher, \
+    RELOADABLE_GLOBAL_SETTINGS, changed_global_settings, diff_devices
+from EosPayload.lib.orcheostrator.deadlines import DeadlineHeap
+from EosPayload.lib.orcheostrator.resource_monitor import ResourceConfig, ResourceMonitor
+from EosPayload.lib.orcheostrator.scheduling import SchedulingConfig, apply_scheduling, describe_scheduling
+from EosPayload.lib.orcheostrator.shutdown import ShutdownConfig, StopOutcome, StopResult, stop_processes
 from EosPayload.lib.orcheostrator.device_container import DeviceContainer, Status, StatusUpdate
-from EosPayload.lib.config import OrcheostratorConfigParser
+from EosPayload.lib.orcheostrator.spawn import SpawnConfig, get_spawn_context
+from EosPayload.lib.orcheostrator.supervisor import RestartConfig
+from EosPayload.lib.config import OrcheostratorConfig, OrcheostratorConfigParser
+
+# how long a driver may take to report that it is ready, unless its settings specify a startup_timeout
+DEFAULT_STARTUP_TIMEOUT = 30.0  # seconds
+# how often the health report is logged.  Exits and missed heartbeats are handled as they happen, not on this interval
+HEALTH_CHECK_INTERVAL = 10.0  # seconds
+# a driver is marked unhealthy if it hasn't reported its health for this long (or, with a health table, stale_after)
+HEARTBEAT_TIMEOUT = 30.0  # seconds
+
+# statuses of drivers whose process should be running
+RUNNING_STATUSES = [Status.INITIALIZED, Status.HEALTHY, Status.UNHEALTHY]
+
+# deadline kinds, see DeadlineHeap.  Keys are (kind, target)
+_STARTUP = 'startup'  # target is the driver's startup signal
+_HEARTBEAT = 'heartbeat'  # target is the driver's device id
+_RESTART = 'restart'  # target is the driver's device id
+_HEALTH_REPORT = ('report', None)
+_RESOURCE_SAMPLE = ('resources', None)
+_RELOAD_CONFIG = ('reload', None)
 
 
 class OrchEOStrator:
@@ -31,6 +65,22 @@ class OrchEOStrator:
         """ Constructor.  Initializes output location, logger, mqtt, and health monitoring. """
         self._logger: logging.Logger | None = None
         self._drivers = {}
+        self._local_bus: LocalBus | None = None
+        self._health_table: HealthTable | None = None
+        self._resource_monitor: ResourceMonitor | None = None
+        self._spawn_context = None
+        # startup signal -> (container, start time, deadline) for every driver that hasn't reported ready yet
+        self._starting: dict[Connection, tuple[DeviceContainer, float, float]] = {}
+        self._deadlines = DeadlineHeap()
+        self._config_filepath = config_filepath
+        self._config_watcher: ConfigWatcher | None = None
+        self._reload_config_settings = ConfigReloadConfig()
+        self._reload_requested = False
+        self._shutdown_config = ShutdownConfig()
+        # written to by the MQTT thread when a health update is queued, to wake the event loop up
+        self._wakeup_receiver, self._wakeup_sender = socket.socketpair()
+        self._wakeup_receiver.setblocking(False)
+        self._wakeup_sender.setblocking(False)
         self.output_directory = output_directory
         if not os.path.exists(self.output_directory):
             raise ValueError(f"output location '{output_directory}' does not exist")
@@ -38,7 +88,8 @@ class OrchEOStrator:
         self._output_mkdir('data')
         self._output_mkdir('logs')
 
-        init_logging(os.path.join(self.output_directory, 'logs', 'orchEOStrator.log'))
+        log_filename = os.path.join(self.output_directory, 'logs', 'orchEOStrator.log')
+        init_logging(log_filename)
         self._logger = logging.getLogger('orchEOStrator')
         self._logger.info("initialization complete")
         self._logger.info("beginning boot process in " + os.getcwd())
@@ -46,12 +97,78 @@ class OrchEOStrator:
         config_parser = OrcheostratorConfigParser(self._logger, config_filepath)
         self.orcheostrator_config = config_parser.parse_config()
 
+        # switch to the configured logging mode now that the config has been read
+        try:
+            init_logging(log_filename, LoggingConfig.from_settings(self.orcheostrator_config.global_config))
+        except Exception as e:
+            self._logger.error(f"invalid logging config, keeping default logging: {e}\n{traceback.format_exc()}")
+
         self._health_queue = Queue()
 
+        # start the local bus before connecting to MQTT, so this process and every driver use it for local topics
+        try:
+            local_transport_config = LocalTransportConfig.from_settings(self.orcheostrator_config.global_config)
+            if local_transport_config.enabled:
+                self._local_bus = LocalBus(logging.getLogger('orchEOStrator.local-bus'),
+                                           local_transport_config.socket_path)
+                self._local_bus.start()
+                export_local_bus(self._local_bus.path, local_transport_config.topics)
+                self._logger.info(f"local bus listening at {self._local_bus.path} for topics"
+                                  f" {', '.join(local_transport_config.topics)}")
+        except Exception as e:
+            self._logger.error(f"failed to start local bus, using MQTT for all topics: {e}\n{traceback.format_exc()}")
+            self._local_bus = None
+
+        # drivers find the health table through the environment, so it must exist before they are started
+        try:
+            health_table_config = HealthTableConfig.from_settings(self.orcheostrator_config.global_config)
+            if health_table_config.enabled:
+                self._health_table = HealthTable(health_table_config,
+                                                 [container.config.get("device_id")
+                                                  for container in self.orcheostrator_config.enabled_devices])
+                export_health_table(self._health_table.path)
+                self._logger.info(f"health table created at {self._health_table.path}")
+        except Exception as e:
+            self._logger.error(f"failed to create health table, drivers will publish heartbeats over MQTT: {e}"
+                               f"\n{traceback.format_exc()}")
+            self._health_table = None
+
+        try:
+            self._reload_config_settings = ConfigReloadConfig.from_settings(self.orcheostrator_config.global_config)
+            if self._reload_config_settings.watch:
+                self._config_watcher = ConfigWatcher(config_filepath)
+                self._logger.info(f"watching {config_filepath} for changes")
+        except Exception as e:
+            self._logger.error(f"failed to watch the config file, reload it with SIGHUP instead: {e}")
+
+        try:
+            self._shutdown_config = ShutdownConfig.from_settings(self.orcheostrator_config.global_config)
+        except ValueError as e:
+            self._logger.error(f"invalid shutdown config, using the default: {e}")
+
         try:
-            self._mqtt = Client(MQTT_HOST)
-            self._mqtt.user_data_set({'logger': self._logger, 'queue': self._health_queue})
-            self._mqtt.register_subscriber(Topic.HEALTH_HEARTBEAT, self.health_monitor)
+            resource_config = ResourceConfig.from_settings(None, self.orcheostrator_config.global_config)
+            if resource_config.enabled:
+                time_series_path = os.path.join(self.output_directory, 'data', 'orchEOStrator.resources.csv')
+                self._resource_monitor = ResourceMonitor(resource_config, time_series_path, self._logger)
+                self._logger.info(f"sampling driver resource usage every {resource_config.interval:g}s into"
+                                  f" {time_series_path}")
+        except Exception as e:
+            self._logger.error(f"failed to start resource monitoring: {e}\n{traceback.format_exc()}")
+            self._resource_monitor = None
+
+        try:
+            resilience = ResilienceConfig.from_settings(self.orcheostrator_config.global_config,
+                                                        os.path.join(self.output_directory, 'artifacts',
+                                                                     'orchEOStrator.mqtt-spill'))
+        except ValueError as e:
+            self._logger.error(f"invalid mqtt config, using non-resilient mqtt: {e}")
+            resilience = ResilienceConfig()
+        try:
+            self._mqtt = acquire_client(MQTT_HOST, resilience=resilience)
+            self._mqtt.register_subscriber(Topic.HEALTH_HEARTBEAT, self.health_monitor,
+                                           {'logger': self._logger, 'queue': self._health_queue,
+                                            'wakeup': self._wakeup})
         except Exception as e:
             self._logger.critical(f"Failed to setup MQTT: {e}\n{traceback.format_exc()}")
 
@@ -62,69 +179,463 @@ class OrchEOStrator:
         self.terminate()
         if self._logger:
             self._health_check()
-        logging.shutdown()
+        if self._local_bus is not None:
+            self._local_bus.close()
+        if self._health_table is not None:
+            self._health_table.close()
+        if self._resource_monitor is not None:
+            self._resource_monitor.close()
+        if self._config_watcher is not None:
+            self._config_watcher.close()
+        self._wakeup_receiver.close()
+        self._wakeup_sender.close()
+        shutdown_logging()
 
     #
     # PUBLIC METHODS
     #
 
     def run(self) -> None:
-        self._spawn_drivers()
-        while True:
-            self._health_check()
-            time.sleep(10)
-            # future: anything else OrchEOStrator is responsible for doing.  Perhaps handling "force terminate" commands
-            #         or MQTT things
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, self._request_reload)
+        signal.signal(signal.SIGTERM, self._request_shutdown)
+        try:
+            self._spawn_drivers()
+            self._deadlines.schedule(_HEALTH_REPORT, time.monotonic())
+            if self._resource_monitor is not None:
+                self._deadlines.schedule(_RESOURCE_SAMPLE, time.monotonic())
+            while True:
+                self._handle_events()
+                # future: anything else OrchEOStrator is responsible for doing.  Perhaps handling "force terminate"
+                #         commands or MQTT things
+        except KeyboardInterrupt:
+            self._logger.info("interrupted")
+        finally:
+            self.terminate()
 
     def terminate(self) -> None:
+        """ Stops every driver: all of them are sent SIGTERM at once so they run their cleanup in parallel, and any that
+        haven't exited within the shutdown timeout are killed.  Logs how long each one took and how it stopped.
+        Does nothing if no driver is running, so it is safe to call more than once.
+        """
+        if threading.current_thread() is threading.main_thread():
+            # another SIGTERM mustn't interrupt stopping the drivers, skipping the SIGKILL escalation
+            signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        for signal_receiver in self._starting:
+            signal_receiver.close()
+        self._starting.clear()
+        self._deadlines.clear()
+        running = {}
+        for device_container in self._drivers.values():
+            device_container.restart.cancel()
+            if device_container.process is not None:
+                running[device_container.config.get("pretty_id")] = device_container
+        if not running:
+            return
+
+        if self._logger:
+            self._logger.info(f"stopping {len(running)} drivers, waiting up to {self._shutdown_config.timeout:g}s for"
+                              f" them to clean up")
+        start = time.monotonic()
+        results = stop_processes({name: container.process for name, container in running.items()},
+                                 self._shutdown_config)
+        for result in results:
+            self._driver_stopped(running[result.name], result)
         if self._logger:
-            self._logger.info("terminating processes")
-        for device_id, device_container in self._drivers.items():
-            if device_container.status in [Status.INITIALIZED, Status.HEALTHY, Status.UNHEALTHY]:
-                if self._logger:
-                    self._logger.info(f"terminating process for device id {device_id}")
-                device_container.process.terminate()
-                device_container.process.close()
-                device_container.update_status(Status.TERMINATED)
+            self._logger.info(f"Shutdown Report: all drivers stopped in {time.monotonic() - start:.2f}s\n\t"
+                              + "\n\t".join(str(result) for result in results))
 
     #
     # PROTECTED HELPER METHODS
     #
 
     def _spawn_drivers(self) -> None:
-        """ Enumerates over all the classes in the drivers dir and spins them up """
+        """ Starts a process for every enabled driver at once, then waits for each one to report that it is ready (or
+        that it failed), up to its startup timeout.  Boot takes about as long as the slowest driver's setup.
+        """
         self._logger.info("Spawning Drivers")
+        boot_start = time.monotonic()
         driver_list = self.orcheostrator_config.enabled_devices
 
+        try:
+            spawn_config = SpawnConfig.from_settings(self.orcheostrator_config.global_config)
+        except ValueError as e:
+            self._logger.error(f"invalid spawn config, forking drivers from orchEOStrator: {e}")
+            spawn_config = SpawnConfig()
+        self._spawn_context = get_spawn_context(spawn_config, [container.driver.module for container in driver_list])
+        self._logger.info(f"starting drivers with the '{spawn_config.mode.value}' start method")
+
         for container in driver_list:
-            driver = container.driver
-            driver_config = container.config
+            self._add_driver(container)
+
+        outcomes = []
+        while self._starting:
+            outcomes += self._handle_events()
+
+        self._logger.info(f"Done Spawning Drivers in {time.monotonic() - boot_start:.2f}s"
+                          f" ({outcomes.count(StartupStatus.READY)} ready, {outcomes.count(StartupStatus.FAILED)}"
+                          f" failed, {outcomes.count(None)} timed out)")
+
+    def _add_driver(self, container: DeviceContainer) -> None:
+        """ Applies a driver's settings and starts its process.  Its startup signal is handled by the event loop. """
+        driver_config = container.config
+        try:
+            self._apply_driver_settings(container)
+            self._logger.info(f"spawning process for device '{driver_config.get('pretty_id')}' from"
+                              f" class '{container.driver.name}'")
+            self._start_driver(container)
+            self._drivers[driver_config.get("device_id")] = container
+        except Exception as e:
+            self._spawn_failed(container, f"{e}\n{traceback.format_exc()}")
+
+    def _apply_driver_settings(self, container: DeviceContainer) -> None:
+        """ Applies the restart, resource monitor and scheduling settings in a driver's config (keeping its restart
+        history).  Scheduling takes effect the next time the driver's process is started.
+        """
+        driver_config = container.config
+        try:
+            container.restart.config = RestartConfig.from_settings(driver_config.get("settings"),
+                                                                   self.orcheostrator_config.global_config)
+        except ValueError as e:
+            self._logger.error(f"invalid restart config for device '{driver_config.get('pretty_id')}', it won't"
+                               f" be restarted: {e}")
+            container.restart.config = RestartConfig()
+        if self._resource_monitor is not None:
             try:
-                self._logger.info(f"spawning process for device '{driver_config.get('pretty_id')}' from"
-                                  f" class '{driver.__name__}'")
-                proc = Process(target=self._driver_runner, args=(driver, self.output_directory, driver_config), daemon=True)
-                container.process = proc
-                proc.start()
-                time.sleep(0.5)
-                if not proc.is_alive():
-                    proc.close()
-                    raise Exception("process is not alive after start")
-                self._drivers[driver_config.get("device_id")] = container
-            except Exception as e:
-                self._logger.critical("A fatal exception occurred when attempting to load driver from"
-                                      f" class '{driver.__name__}': {e}\n{traceback.format_exc()}")
-                container.update_status(Status.INVALID)
-                self._drivers['<' + driver.__name__ + '>'] = container
-        self._logger.info("Done Spawning Drivers")
+                container.resource_limits = ResourceConfig.from_settings(driver_config.get("settings"),
+                                                                         self.orcheostrator_config.global_config)
+            except ValueError as e:
+                self._logger.error(f"invalid resource_monitor config for device '{driver_config.get('pretty_id')}',"
+                                   f" using the global thresholds: {e}")
+                container.resource_limits = None
+        try:
+            container.scheduling = SchedulingConfig.from_settings(driver_config.get("settings"))
+        except ValueError as e:
+            self._logger.error(f"invalid scheduling config for device '{driver_config.get('pretty_id')}', using the"
+                               f" default scheduling: {e}")
+            container.scheduling = SchedulingConfig()
+
+    def _handle_events(self) -> list[StartupStatus | None]:
+        """ Sleeps until a driver process exits, a driver reports its startup, a health update arrives or the next
+        deadline is due, then handles everything that happened.  Does no work while nothing happens.
+
+        :return: the startup outcome of each driver that finished starting: READY, FAILED (including dying), or None if
+                 it timed out
+        """
+        outcomes = []
+        # a process's sentinel becomes readable when it exits.  Starting drivers are watched through their startup
+        # signal instead, which reads EOF when they exit
+        starting = [container for container, _, _ in self._starting.values()]
+        running = {driver.process.sentinel: driver for driver in self._drivers.values()
+                   if driver.status in RUNNING_STATUSES and driver.process is not None and driver not in starting}
+        next_deadline = self._deadlines.next_deadline()
+        timeout = None if next_deadline is None else max(0.0, next_deadline - time.monotonic())
+
+        watched = list(running) + list(self._starting) + [self._wakeup_receiver]
+        if self._config_watcher is not None:
+            watched.append(self._config_watcher)
+        for ready in wait(watched, timeout):
+            if ready is self._wakeup_receiver:
+                self._drain_wakeups()
+                self._apply_status_updates()
+            elif ready is self._config_watcher:
+                if self._config_watcher.changed():
+                    # editors often write a file more than once, so wait for the writes to settle
+                    self._deadlines.schedule(_RELOAD_CONFIG,
+                                             time.monotonic() + self._reload_config_settings.debounce)
+            elif ready in self._starting:
+                outcomes.append(self._handle_startup_signal(ready))
+            elif running[ready].status in RUNNING_STATUSES:
+                self._process_exited(running[ready])
+
+        if self._reload_requested:
+            self._reload_requested = False
+            self._deadlines.schedule(_RELOAD_CONFIG, time.monotonic())
+
+        for kind, target in self._deadlines.pop_due(time.monotonic()):
+            if kind == _STARTUP and target in self._starting:
+                outcomes.append(self._startup_timed_out(target))
+            elif kind == _HEARTBEAT and target in self._drivers:
+                self._heartbeat_expired(self._drivers[target])
+            elif kind == _RESTART and target in self._drivers:
+                self._restart_driver(self._drivers[target])
+            elif (kind, target) == _HEALTH_REPORT:
+                self._health_check()
+                self._deadlines.schedule(_HEALTH_REPORT, time.monotonic() + HEALTH_CHECK_INTERVAL)
+            elif (kind, target) == _RELOAD_CONFIG:
+                self._reload_config()
+            elif (kind, target) == _RESOURCE_SAMPLE and self._resource_monitor is not None:
+                self._sample_resources()
+                self._deadlines.schedule(_RESOURCE_SAMPLE, time.monotonic() + self._resource_monitor.config.interval)
+        return outcomes
+
+    def _start_driver(self, container: DeviceContainer) -> None:
+        """ Starts the driver's process.  Its startup signal is handled by _handle_startup_signal(). """
+        driver_config = container.config
+        startup_timeout = float((driver_config.get("settings") or {}).get("startup_timeout", DEFAULT_STARTUP_TIMEOUT))
+        container.process = None
+        signal_receiver, signal_sender = self._spawn_context.Pipe(duplex=False)
+        try:
+            proc = self._spawn_context.Process(target=self._driver_runner,
+                                               args=(container.driver, self.output_directory, driver_config,
+                                                     signal_sender), daemon=True)
+            proc.start()
+        except Exception:
+            signal_receiver.close()
+            signal_sender.close()
+            raise
+        container.process = proc
+        if container.scheduling.configured:
+            self._apply_scheduling(container)
+        # only the driver may hold the sending end, so the signal reads EOF if the driver dies
+        signal_sender.close()
+        start = time.monotonic()
+        self._starting[signal_receiver] = (container, start, start + startup_timeout)
+        self._deadlines.schedule((_STARTUP, signal_receiver), start + startup_timeout)
+
+    def _apply_scheduling(self, container: DeviceContainer) -> None:
+        """ Applies a driver's scheduling settings to its just-started process """
+        pretty_id = container.config.get("pretty_id")
+        for error in apply_scheduling(container.process.pid, container.scheduling):
+            self._logger.error(f"failed to set scheduling of device '{pretty_id}': {error}")
+        try:
+            self._logger.info(f"device '{pretty_id}' scheduling: {describe_scheduling(container.process.pid)}")
+        except OSError:
+            pass  # it already exited, which is handled by the event loop
+
+    def _handle_startup_signal(self, signal_receiver: Connection) -> StartupStatus:
+        """ Handles a driver reporting that it is ready or that it failed, or its process exiting during startup
+
+        :param signal_receiver: the driver's startup signal, which is ready to read
+        :return: READY or FAILED
+        """
+        container, start, _ = self._starting.pop(signal_receiver)
+        self._deadlines.cancel((_STARTUP, signal_receiver))
+        elapsed = time.monotonic() - start
+        try:
+            status, message = signal_receiver.recv()
+        except (EOFError, OSError):
+            status, message = None, None
+        signal_receiver.close()
+        pretty_id = container.config.get('pretty_id')
+
+        if status == StartupStatus.READY:
+            self._logger.info(f"device '{pretty_id}' ready in {elapsed:.2f}s")
+            # the heartbeat timeout starts now, not when the config was parsed
+            container.update_status(Status.INITIALIZED)
+            self._schedule_heartbeat_deadline(container)
+        elif status == StartupStatus.FAILED:
+            self._logger.critical(f"device '{pretty_id}' failed to start after {elapsed:.2f}s: {message}")
+            container.update_status(Status.UNHEALTHY)
+            self._schedule_heartbeat_deadline(container)
+        else:
+            status = StartupStatus.FAILED
+            container.process.join(1)
+            message = f"process exited during startup after {elapsed:.2f}s (exit code {container.process.exitcode})"
+            if not self._driver_exited(container, message):
+                self._spawn_failed(container, message)
+        return status
+
+    def _startup_timed_out(self, signal_receiver: Connection) -> None:
+        """ Gives up waiting for a driver to report that it is ready.  Its process is left running. """
+        container, start, deadline = self._starting.pop(signal_receiver)
+        self._logger.critical(f"device '{container.config.get('pretty_id')}' did not report ready within"
+                              f" {deadline - start:.1f}s -- leaving it running, marking unhealthy")
+        container.update_status(Status.UNHEALTHY)
+        self._schedule_heartbeat_deadline(container)
+        signal_receiver.close()
+        return None
+
+    def _process_exited(self, driver: DeviceContainer) -> None:
+        """ Restarts or marks terminated a running driver whose process is no longer alive """
+        if driver.process is not None:
+            # its sentinel is ready as soon as it exits, but its exit code is only set once it has been reaped
+            driver.process.join(1)
+        if not self._driver_exited(driver, "process is no longer running"):
+            self._logger.critical(f"process for driver {driver.config.get('device_id')} is no longer running"
+                                  f" -- marking terminated")
+            if driver.process is not None:
+                driver.process.close()
+                driver.process = None
+            driver.update_status(Status.TERMINATED)
+
+    def _driver_exited(self, container: DeviceContainer, message: str) -> bool:
+        """ Schedules the restart of a driver whose process exited, if its restart config allows it
+
+        :param container: the driver
+        :param message: what happened, for the log
+        :return: True if the driver is being restarted or is crash-looping, False if restarts are disabled (the
+                 caller decides what happens to the driver)
+        """
+        restart = container.restart
+        process = container.process
+        delay = restart.on_exit(process.exitcode if process is not None else None, time.monotonic())
+        if delay is None and not restart.crash_looping:
+            return False
+
+        if process is not None:
+            process.close()
+        container.process = None
+        pretty_id = container.config.get('pretty_id')
+        if delay is not None:
+            self._logger.critical(f"device '{pretty_id}' {message} -- restarting in {delay:.1f}s")
+            container.update_status(Status.TERMINATED)
+            self._deadlines.schedule((_RESTART, container.config.get("device_id")), restart.restart_at)
+        else:
+            self._logger.critical(f"device '{pretty_id}' {message} -- restarted {restart.config.max_restarts} times"
+                                  f" in the last {restart.config.window:.0f}s, leaving it down")
+            container.update_status(Status.CRASH_LOOP)
+        return True
+
+    def _restart_driver(self, container: DeviceContainer) -> None:
+        """ Restarts a driver whose restart backoff has elapsed """
+        now = time.monotonic()
+        if not container.restart.due(now):
+            return
+        container.restart.on_restart(now)
+        pretty_id = container.config.get('pretty_id')
+        self._logger.info(f"restarting device '{pretty_id}' (restart {container.restart.restarts})")
+        try:
+            self._start_driver(container)
+        except Exception as e:
+            self._driver_exited(container, f"could not be restarted: {e}\n{traceback.format_exc()}")
+
+    def _request_shutdown(self, _signum, _frame) -> None:
+        """ SIGTERM handler.  Unwinds run(), which stops the drivers on its way out.  Only the first SIGTERM does:
+        docker and systemd often send another, which must not abort the shutdown partway through.
+        """
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        raise SystemExit(0)
+
+    def _request_reload(self, _signum, _frame) -> None:
+        """ SIGHUP handler.  Only sets a flag, the reload itself happens in the event loop. """
+        self._reload_requested = True
+        self._wakeup()
+
+    def _reload_config(self) -> None:
+        """ Re-parses the config file and stops, starts or restarts only the drivers whose device config changed """
+        self._logger.info(f"reloading config from {self._config_filepath}")
+        try:
+            new_config = OrcheostratorConfigParser(self._logger, self._config_filepath).parse_config()
+        except Exception as e:
+            self._logger.error(f"failed to reload config, keeping the running config: {e}\n{traceback.format_exc()}")
+            return
+        try:
+            self._apply_config(new_config)
+        except Exception as e:
+            # a bad setting must not unwind run(), which would stop every driver
+            self._logger.error(f"failed to apply the reloaded config, keeping the running config of the drivers it"
+                               f" didn't reach: {e}\n{traceback.format_exc()}")
+
+    def _apply_config(self, new_config: OrcheostratorConfig) -> None:
+        """ Applies a reloaded config: its reloadable top level settings, and the drivers that were added, removed or
+        changed
+        """
+        global_config = dict(self.orcheostrator_config.global_config)
+        for key in changed_global_settings(global_config, new_config.global_config):
+            if key in RELOADABLE_GLOBAL_SETTINGS:
+                global_config[key] = new_config.global_config.get(key)
+            else:
+                self._logger.warning(f"top level setting '{key}' changed, it takes effect when EosPayload is"
+                                     f" restarted")
+        self.orcheostrator_config.global_config = global_config
+        try:
+            self._shutdown_config = ShutdownConfig.from_settings(global_config)
+        except ValueError as e:
+            self._logger.error(f"invalid shutdown config, keeping the previous one: {e}")
+
+        # forget drivers that failed to start, they are retried if they are still configured
+        for key in [key for key, container in self._drivers.items() if container.status == Status.INVALID]:
+            del self._drivers[key]
+
+        diff = diff_devices(self._drivers, new_config.enabled_devices)
+        for container in diff.removed:
+            self._logger.info(f"device '{container.config.get('pretty_id')}' was removed from the config, stopping it")
+        for container, _ in diff.changed:
+            self._logger.info(f"config of device '{container.config.get('pretty_id')}' changed, restarting it")
+        # every removed and changed driver is stopped at once, so they clean up in parallel
+        self._stop_drivers(diff.removed + [container for container, _ in diff.changed])
+        for container in diff.removed:
+            del self._drivers[container.config.get("device_id")]
+        for container, new_container in diff.changed:
+            del self._drivers[container.config.get("device_id")]
+            self._add_driver(new_container)
+        for container in diff.added:
+            self._logger.info(f"device '{container.config.get('pretty_id')}' was added to the config, starting it")
+            self._add_driver(container)
+        for container, _ in diff.unchanged:
+            # top level restart settings may have changed
+            self._apply_driver_settings(container)
+        self.orcheostrator_config.enabled_devices = [container for container in self._drivers.values()
+                                                     if container.status != Status.INVALID]
+
+        self._logger.info(f"config reloaded: {len(diff.added)} started, {len(diff.removed)} stopped,"
+                          f" {len(diff.changed)} restarted, {len(diff.unchanged)} unchanged")
+
+    def _stop_drivers(self, containers: list[DeviceContainer]) -> None:
+        """ Stops drivers' processes and drops their deadlines.  They are all sent SIGTERM at once, so stopping several
+        takes no longer than stopping one: at most the shutdown timeout plus the kill timeout.
+        """
+        running = {}
+        for container in containers:
+            device_id = container.config.get("device_id")
+            self._deadlines.cancel((_HEARTBEAT, device_id))
+            self._deadlines.cancel((_RESTART, device_id))
+            container.restart.cancel()
+            for signal_receiver, (starting_container, _, _) in list(self._starting.items()):
+                if starting_container is container:
+                    del self._starting[signal_receiver]
+                    self._deadlines.cancel((_STARTUP, signal_receiver))
+                    signal_receiver.close()
+            if container.process is None:
+                container.update_status(Status.TERMINATED)
+            else:
+                running[container.config.get("pretty_id")] = container
+        if not running:
+            return
+        results = stop_processes({name: container.process for name, container in running.items()},
+                                 self._shutdown_config)
+        for result in results:
+            self._driver_stopped(running[result.name], result)
+            self._logger.info(f"stopped {result}")
+
+    def _driver_stopped(self, container: DeviceContainer, result: StopResult) -> None:
+        """ Releases the process of a driver that was stopped and marks it terminated """
+        if result.outcome in (StopOutcome.KILLED, StopOutcome.UNKILLABLE) and self._logger:
+            self._logger.warning(f"device '{result.name}' didn't exit within {self._shutdown_config.timeout:g}s of"
+                                 f" SIGTERM and was killed" + (", but is still running"
+                                                               if result.outcome == StopOutcome.UNKILLABLE else ""))
+        if result.outcome != StopOutcome.UNKILLABLE:
+            container.process.close()
+        container.process = None
+        container.update_status(Status.TERMINATED)
+        if self._resource_monitor is not None:
+            self._resource_monitor.forget(result.name)
+
+    def _spawn_failed(self, container: DeviceContainer, message: str) -> None:
+        """ Marks a driver whose process could not be started, or which died during startup, invalid """
+        driver = container.driver
+        self._logger.critical("A fatal exception occurred when attempting to load driver from"
+                              f" class '{driver.name}': {message}")
+        if container.process is not None and not container.process.is_alive():
+            container.process.close()
+            container.process = None
+        container.update_status(Status.INVALID)
+        self._drivers.pop(container.config.get("device_id"), None)
+        self._drivers['<' + driver.name + '>'] = container
 
     @staticmethod
-    def _driver_runner(cls, output_directory: str, config: dict) -> None:
-        """ Wrapper to execute driver run() method.
+    def _driver_runner(driver: DriverInfo, output_directory: str, config: dict,
+                       startup_signal: Connection | None = None) -> None:
+        """ Wrapper to execute driver run() method.  The driver's module is imported here, in the driver's process.
 
-        :param cls: the driver class.  Must have a run() method
+        :param driver: the driver class to load.  Must have a run() method
         :param output_directory: the location to store output (logs, data, etc.)
+        :param config: the device's config
+        :param startup_signal: the connection the driver reports ready or failed on (see DriverBase.run).  If the
+                               constructor raises, the process exits without reporting and is marked invalid.
         """
-        cls(output_directory, config).run()
+        load_driver_class(driver)(output_directory, config).run(startup_signal)
 
     @staticmethod
     def health_monitor(_client, user_data, message):
@@ -149,53 +660,145 @@ class OrchEOStrator:
             )
 
             user_data['queue'].put(status_update)
+            user_data['wakeup']()
         except Exception as e:
             # this is needed b/c apparently an exception in a callback kills the mqtt thread
             user_data['logger'].error(f"an unhandled exception occurred while processing health_monitor: {e}"
                                       f"\n{traceback.format_exc()}")
 
+    def _wakeup(self) -> None:
+        """ Wakes the event loop up.  Thread safe. """
+        try:
+            self._wakeup_sender.send(b'\0')
+        except OSError:
+            pass  # the socket buffer is full, so a wakeup is already pending
+
+    def _drain_wakeups(self) -> None:
+        try:
+            while self._wakeup_receiver.recv(4096):
+                pass
+        except OSError:
+            pass
+
+    def _apply_status_updates(self) -> None:
+        """ Applies the health updates received over MQTT """
+        while not self._health_queue.empty():
+            status_update = self._health_queue.get()
+            driver = self._drivers.get(status_update.driver_id)
+            if driver is None:
+                continue
+            driver.update_status(
+                status_update.status,
+                status_update.thread_count,
+                status_update.reporter,
+                status_update.effective,
+            )
+            self._schedule_heartbeat_deadline(driver)
+
+    def _heartbeat_timeout(self, driver: DeviceContainer) -> float:
+        """ :return: how long the driver may go without reporting its health.  Drivers with a slot in the health
+                     table report far more often than drivers that publish heartbeats (eg ones added by a reload). """
+        if self._health_table is not None and self._health_table.has_slot(driver.config.get("device_id")):
+            return self._health_table.config.stale_after
+        return HEARTBEAT_TIMEOUT
+
+    def _schedule_heartbeat_deadline(self, driver: DeviceContainer) -> None:
+        """ Schedules the check that the driver's next health update arrives within the heartbeat timeout """
+        if driver.status not in RUNNING_STATUSES:
+            return
+        now = time.monotonic()
+        heartbeat_timeout = self._heartbeat_timeout(driver)
+        deadline = now + heartbeat_timeout - (datetime.now() - driver.status_since).total_seconds()
+        if deadline <= now:
+            # already overdue (eg it was marked unhealthy and hasn't reported since): check again after another timeout
+            deadline = now + heartbeat_timeout
+        self._deadlines.schedule((_HEARTBEAT, driver.config.get("device_id")), deadline)
+
+    def _heartbeat_expired(self, driver: DeviceContainer) -> None:
+        """ Marks a driver unhealthy if it hasn't reported its health within the heartbeat timeout """
+        if driver.status not in RUNNING_STATUSES:
+            return
+        if self._health_table is not None:
+            self._read_health_slot(driver)
+        heartbeat_timeout = self._heartbeat_timeout(driver)
+        if driver.status in [Status.INITIALIZED, Status.HEALTHY] \
+                and driver.status_since < (datetime.now() - timedelta(seconds=heartbeat_timeout)):
+            self._logger.critical(f"haven't received a health ping from driver {driver.config.get('device_id')} in"
+                                  f" {heartbeat_timeout:g}s -- marking unhealthy")
+            driver.update_status(Status.UNHEALTHY)
+        self._schedule_heartbeat_deadline(driver)
+
     def _health_check(self) -> None:
         try:
             self._logger.info("Starting Health Check")
-            while not self._health_queue.empty():
-                status_update = self._health_queue.get()
-                self._drivers[status_update.driver_id].update_status(
-                    status_update.status,
-                    status_update.thread_count,
-                    status_update.reporter,
-                    status_update.effective,
-                )
+            self._apply_status_updates()
 
             num_threads = threading.active_count()
+            total_restarts = 0
             report = {}
             for status in Status:
                 report[status] = []
             for key, driver in self._drivers.items():
-                # auto set terminated if it died
-                if driver.status in [Status.HEALTHY, Status.UNHEALTHY, Status.INITIALIZED] and (driver.process is None or not driver.process.is_alive()):
-                    self._logger.critical(f"process for driver {key} is no longer running -- marking terminated")
-                    if driver.process is not None:
-                        driver.process.close()
-                    driver.update_status(Status.TERMINATED)
-
-                # auto set unhealthy if we haven't had a ping in the last 30s from this device
-                if driver.status in [Status.INITIALIZED, Status.HEALTHY] \
-                        and driver.status_since < (datetime.now() - timedelta(seconds=30)):
-                    self._logger.critical(f"haven't received a health ping from driver {key} in 30s -- marking unhealthy")
-                    driver.update_status(Status.UNHEALTHY)
+                # the event loop notices exits and missed heartbeats as they happen; this catches anything it missed
+                if driver.status in RUNNING_STATUSES and (driver.process is None or not driver.process.is_alive()):
+                    self._process_exited(driver)
+                self._heartbeat_expired(driver)
 
                 the_key = key if driver.status in [Status.NONE, Status.INVALID] else driver.config.get("pretty_id")
+                restart = driver.restart
+                restart_report = ""
+                if restart.config.enabled or restart.restarts:
+                    restart_report = f", {restart.restarts} restarts ({restart.recent_restarts(time.monotonic())} in" \
+                                     f" the last {restart.config.window:.0f}s)"
+                    if restart.last_exit_code is not None:
+                        restart_report += f", last exit code {restart.last_exit_code}"
+                    if restart.restart_at is not None:
+                        restart_report += f", restarting in {max(0.0, restart.restart_at - time.monotonic()):.0f}s"
+                usage_report = ""
+                if self._resource_monitor is not None and driver.status in RUNNING_STATUSES:
+                    usage = self._resource_monitor.usage.get(driver.config.get("pretty_id"))
+                    if usage is not None:
+                        usage_report = f", {usage}"
+                scheduling_report = ""
+                if driver.scheduling.configured and driver.status in RUNNING_STATUSES and driver.process is not None:
+                    try:
+                        scheduling_report = f", scheduling: {describe_scheduling(driver.process.pid)}"
+                    except OSError:
+                        pass
                 report[driver.status].append(f"{the_key} ({driver.thread_count} threads)"
                                              f" as of {driver.status_since} (reported by {driver.status_reporter}"
-                                             f" [{Device(driver.status_reporter).name}])")
+                                             f" [{Device(driver.status_reporter).name}]){restart_report}{usage_report}"
+                                             f"{scheduling_report}")
                 num_threads += int(driver.thread_count)
+                total_restarts += restart.restarts
 
             report_string = f"Health Report: \n{len(report[Status.HEALTHY])} drivers running"
             report_string += f"\n{num_threads} total threads in use ({threading.active_count()} by OrchEOStrator)"
+            report_string += f"\n{total_restarts} driver restarts"
+            if self._resource_monitor is not None and 'orchEOStrator' in self._resource_monitor.usage:
+                report_string += f"\nOrchEOStrator: {self._resource_monitor.usage['orchEOStrator']}"
             for status, reports in report.items():
                 report_string += f"\n\t{status}:"
                 for item in reports:
                     report_string += f"\n\t\t{item}"
+            for metrics in get_connection_metrics():
+                report_string += f"\nMQTT connection {metrics.host}:{metrics.port}: {metrics.connects} connects," \
+                                 f" {metrics.disconnects} disconnects, {metrics.threads} threads, {metrics.users}" \
+                                 f" users, {metrics.subscriptions} topics, {metrics.messages_sent} sent," \
+                                 f" {metrics.messages_received} received, {metrics.batches_sent} batches sent," \
+                                 f" {metrics.local_messages_sent} sent locally, {metrics.local_messages_received}" \
+                                 f" received locally, {metrics.resubscribes} resubscribes, {metrics.spilled} spilled," \
+                                 f" {metrics.spill_dropped} spill drops, {metrics.replayed} replayed"
+            if self._local_bus is not None:
+                bus_metrics = self._local_bus.metrics
+                report_string += f"\nLocal bus: {bus_metrics.connections} connections, {bus_metrics.subscriptions}" \
+                                 f" subscriptions, {bus_metrics.published} published, {bus_metrics.delivered}" \
+                                 f" delivered, {bus_metrics.dropped} dropped"
+            if self._health_table is not None:
+                report_string += f"\nHealth table {self._health_table.path}: updated every" \
+                                 f" {self._health_table.config.update_interval:g}s, stale after" \
+                                 f" {self._health_table.config.stale_after:g}s, MQTT export every" \
+                                 f" {self._health_table.config.mqtt_export_interval:g}s"
             self._logger.info(report_string)
 
             self._logger.info("Done Checking Health")
@@ -203,6 +806,33 @@ class OrchEOStrator:
             self._logger.critical("An exception occurred when attempting to perform health check:"
                                   f" {e}\n{traceback.format_exc()}")
 
+    def _sample_resources(self) -> None:
+        """ Samples the CPU, memory and I/O use of OrchEOStrator and every running driver """
+        now = time.monotonic()
+        self._resource_monitor.sample('orchEOStrator', os.getpid(), now)
+        for driver in self._drivers.values():
+            pretty_id = driver.config.get("pretty_id")
+            if driver.status in RUNNING_STATUSES and driver.process is not None:
+                self._resource_monitor.sample(pretty_id, driver.process.pid, now, driver.resource_limits)
+            else:
+                self._resource_monitor.forget(pretty_id)
+        self._resource_monitor.flush()
+
+    def _read_health_slot(self, driver: DeviceContainer) -> None:
+        """ Updates the status of a running driver from its slot in the shared-memory health table """
+        if driver.status not in RUNNING_STATUSES or driver.process is None:
+            return
+        record = self._health_table.read(driver.config.get("device_id"))
+        # ignore a slot last written by a previous process of a restarted driver
+        if record is None or record.pid != driver.process.pid:
+            return
+        driver.update_status(
+            Status.HEALTHY if record.is_healthy else Status.UNHEALTHY,
+            record.thread_count,
+            record.device_id,
+            datetime.now() - timedelta(seconds=time.monotonic() - record.updated),
+        )
+
     def _output_mkdir(self, subdirectory: str) -> None:
         """ Make a subdirectory of the output location (if it doesn't already exist)
 
@@ -0,0 +1,248 @@
+import logging
+import os
+import time
+from dataclasses import dataclass
+
+from EosPayload.lib.util import settings_section
+
+"""
+Per-process CPU, memory and I/O accounting from /proc (Linux only).  OrchEOStrator samples every driver process on an
+interval, logs the latest usage in its health report, appends every sample to a CSV time series, and raises an alert
+when a driver stays over its CPU or memory threshold for several samples in a row.
+
+Sources:
+    /proc/<pid>/stat    utime and stime (CPU time, in clock ticks) and the thread count
+    /proc/<pid>/statm   resident set size (in pages)
+    /proc/<pid>/io      bytes read from and written to storage (needs the same user, which drivers are)
+    /proc/<pid>/task/<tid>/status  voluntary and involuntary context switches, summed over every thread (the process's
+                                   own status only counts its main thread, and drivers work in other threads).  An
+                                   exited thread's switches drop out of the sum, so a rate is never less than 0.
+
+The time series' time column is wall-clock time (seconds since the epoch), so it lines up with data files and logs.
+"""
+
+TIME_SERIES_HEADER = "time,device,pid,cpu_percent,rss_kb,read_bytes,write_bytes,voluntary_ctxt_switches," \
+                     "nonvoluntary_ctxt_switches,threads\n"
+
+
+@dataclass
+class ResourceConfig:
+    enabled: bool = False
+    interval: float = 10.0  # seconds
+    cpu_alert_percent: float | None = None
+    rss_alert_mb: float | None = None
+    alert_after: int = 3  # consecutive samples over a threshold before alerting
+
+    @staticmethod
+    def from_settings(settings: dict | None, global_settings: dict | None = None) -> 'ResourceConfig':
+        """ Builds a config from the optional `resource_monitor` dict at the top level of the config file, with the
+        alert thresholds optionally overridden by a `resource_monitor` dict in a device's settings
+
+        :param settings: the device's settings (may be None)
+        :param global_settings: the top level config dict (may be None)
+        :return: the resource monitor config
+        """
+        monitor_settings = dict(settings_section(global_settings, "resource_monitor"))
+        device_settings = settings_section(settings, "resource_monitor")
+        monitor_settings.update({key: value for key, value in device_settings.items()
+                                 if key in ("cpu_alert_percent", "rss_alert_mb")})
+        cpu_alert_percent = monitor_settings.get("cpu_alert_percent")
+        rss_alert_mb = monitor_settings.get("rss_alert_mb")
+        try:
+            config = ResourceConfig(
+                enabled=bool(monitor_settings.get("enabled", False)),
+                interval=float(monitor_settings.get("interval", 10.0)),
+                cpu_alert_percent=float(cpu_alert_percent) if cpu_alert_percent is not None else None,
+                rss_alert_mb=float(rss_alert_mb) if rss_alert_mb is not None else None,
+                alert_after=int(monitor_settings.get("alert_after", 3)),
+            )
+        except TypeError as e:
+            raise ValueError(f"invalid resource_monitor settings: {e}") from e
+        if config.interval <= 0 or config.alert_after < 1:
+            raise ValueError("resource_monitor interval must be > 0 and alert_after must be >= 1")
+        return config
+
+
+@dataclass
+class ProcessSample:
+    time: float  # time.monotonic()
+    cpu_ticks: int
+    threads: int
+    rss: int  # bytes
+    read_bytes: int
+    write_bytes: int
+    voluntary_ctxt_switches: int
+    nonvoluntary_ctxt_switches: int
+
+
+@dataclass
+class ResourceUsage:
+    """ A process's usage between two samples (rates) and as of the latest sample (totals) """
+    pid: int
+    cpu_percent: float
+    rss: int  # bytes
+    threads: int
+    read_rate: float  # bytes/s
+    write_rate: float  # bytes/s
+    context_switch_rate: float  # per second, voluntary and involuntary
+    read_bytes: int
+    write_bytes: int
+    voluntary_ctxt_switches: int
+    nonvoluntary_ctxt_switches: int
+
+    def __str__(self) -> str:
+        return f"cpu {self.cpu_percent:.1f}%, rss {self.rss / 2 ** 20:.1f} MiB, io read {self.read_rate / 1024:.1f}" \
+               f" KiB/s write {self.write_rate / 1024:.1f} KiB/s, {self.context_switch_rate:.0f} ctx switches/s"
+
+
+def read_process_sample(pid: int, now: float) -> ProcessSample:
+    """ Reads a process's counters from /proc
+
+    :param pid: the process
+    :param now: the current time.monotonic()
+    :return: the sample
+    :raises OSError: if the process is gone (or /proc isn't available)
+    """
+    with open(f"/proc/{pid}/stat") as stat_file:
+        # the command name may contain spaces and parentheses, so split after its closing parenthesis.  fields[0] is
+        # the state, the 3rd field of the file
+        fields = stat_file.read().rsplit(')', 1)[1].split()
+    with open(f"/proc/{pid}/statm") as statm_file:
+        resident_pages = int(statm_file.read().split()[1])
+    read_bytes = write_bytes = 0
+    try:
+        with open(f"/proc/{pid}/io") as io_file:
+            for line in io_file:
+                name, _, value = line.partition(':')
+                if name == 'read_bytes':
+                    read_bytes = int(value)
+                elif name == 'write_bytes':
+                    write_bytes = int(value)
+    except PermissionError:
+        pass
+    voluntary = nonvoluntary = 0
+    for tid in os.listdir(f"/proc/{pid}/task"):
+        try:
+            with open(f"/proc/{pid}/task/{tid}/status") as status_file:
+                for line in status_file:
+                    name, _, value = line.partition(':')
+                    if name == 'voluntary_ctxt_switches':
+                        voluntary += int(value)
+                    elif name == 'nonvoluntary_ctxt_switches':
+                        nonvoluntary += int(value)
+        except FileNotFoundError:
+            pass  # the thread exited
+    return ProcessSample(
+        time=now,
+        cpu_ticks=int(fields[11]) + int(fields[12]),  # utime + stime
+        threads=int(fields[17]),
+        rss=resident_pages * os.sysconf('SC_PAGE_SIZE'),
+        read_bytes=read_bytes,
+        write_bytes=write_bytes,
+        voluntary_ctxt_switches=voluntary,
+        nonvoluntary_ctxt_switches=nonvoluntary,
+    )
+
+
+def compute_usage(pid: int, previous: ProcessSample, current: ProcessSample) -> ResourceUsage:
+    """ :return: the process's usage between two of its samples """
+    elapsed = max(current.time - previous.time, 1e-9)
+    context_switches = current.voluntary_ctxt_switches + current.nonvoluntary_ctxt_switches \
+        - previous.voluntary_ctxt_switches - previous.nonvoluntary_ctxt_switches
+    return ResourceUsage(
+        pid=pid,
+        cpu_percent=(current.cpu_ticks - previous.cpu_ticks) / os.sysconf('SC_CLK_TCK') / elapsed * 100,
+        rss=current.rss,
+        threads=current.threads,
+        read_rate=(current.read_bytes - previous.read_bytes) / elapsed,
+        write_rate=(current.write_bytes - previous.write_bytes) / elapsed,
+        context_switch_rate=max(0, context_switches) / elapsed,
+        read_bytes=current.read_bytes,
+        write_bytes=current.write_bytes,
+        voluntary_ctxt_switches=current.voluntary_ctxt_switches,
+        nonvoluntary_ctxt_switches=current.nonvoluntary_ctxt_switches,
+    )
+
+
+class ResourceMonitor:
+    """ Samples processes, keeps each one's latest usage, writes the time series and raises threshold alerts """
+
+    def __init__(self, config: ResourceConfig, time_series_path: str, logger: logging.Logger):
+        """
+        :param config: the global resource monitor config (its thresholds are the defaults for every process)
+        :param time_series_path: the CSV file every sample is appended to
+        :param logger: alerts are logged here
+        """
+        if not os.path.exists('/proc/self/stat'):
+            raise OSError("/proc is not available, resource monitoring needs Linux")
+        self.config = config
+        self.usage: dict[str, ResourceUsage] = {}
+        self._logger = logger
+        self._previous: dict[str, tuple[int, ProcessSample]] = {}
+        self._over_threshold: dict[tuple[str, str], int] = {}
+        new_file = not os.path.exists(time_series_path)
+        self._time_series = open(time_series_path, 'a')
+        if new_file:
+            self._time_series.write(TIME_SERIES_HEADER)
+
+    def sample(self, name: str, pid: int, now: float, limits: ResourceConfig | None = None) -> ResourceUsage | None:
+        """ Samples a process, records its usage and checks it against the thresholds
+
+        :param name: what the process is, eg the driver's pretty id
+        :param pid: the process
+        :param now: the current time.monotonic()
+        :param limits: the process's thresholds, if they differ from the global ones
+        :return: the process's usage since it was last sampled, or None if this is its first sample (or it is gone)
+        """
+        try:
+            current = read_process_sample(pid, now)
+        except (OSError, ValueError, IndexError):
+            self.forget(name)
+            return None
+        previous_pid, previous = self._previous.get(name, (None, None))
+        self._previous[name] = (pid, current)
+        if previous is None or previous_pid != pid:
+            # a new (eg restarted) process: usage is only known from the next sample
+            self.usage.pop(name, None)
+            return None
+
+        usage = compute_usage(pid, previous, current)
+        self.usage[name] = usage
+        self._time_series.write(f"{time.time():.3f},{name},{pid},{usage.cpu_percent:.1f},{usage.rss // 1024},"
+                                f"{usage.read_bytes},{usage.write_bytes},{usage.voluntary_ctxt_switches},"
+                                f"{usage.nonvoluntary_ctxt_switches},{usage.threads}\n")
+        limits = limits or self.config
+        self._check(name, 'cpu', usage.cpu_percent, limits.cpu_alert_percent, '%')
+        self._check(name, 'rss', usage.rss / 2 ** 20, limits.rss_alert_mb, ' MiB')
+        return usage
+
+    def flush(self) -> None:
+        """ Flushes the time series, once per round of samples """
+        self._time_series.flush()
+
+    def forget(self, name: str) -> None:
+        """ Drops a process that is gone """
+        self._previous.pop(name, None)
+        self.usage.pop(name, None)
+        for key in [key for key in self._over_threshold if key[0] == name]:
+            del self._over_threshold[key]
+
+    def close(self) -> None:
+        self._time_series.close()
+
+    def _check(self, name: str, resource: str, value: float, threshold: float | None, unit: str) -> None:
+        """ Alerts once a process has been over a threshold for alert_after samples in a row, and when it recovers """
+        if threshold is None:
+            return
+        key = (name, resource)
+        count = self._over_threshold.get(key, 0)
+        if value > threshold:
+            count += 1
+            self._over_threshold[key] = count
+            if count == self.config.alert_after:
+                self._logger.critical(f"resource alert: {name} {resource} at {value:.1f}{unit}, over its threshold"
+                                      f" of {threshold:g}{unit} for {count} samples in a row")
+        elif count:
+            if count >= self.config.alert_after:
+                self._logger.warning(f"resource alert cleared: {name} {resource} back to {value:.1f}{unit}")
+            del self._over_threshold[key]
@@ -0,0 +1,181 @@
+import ctypes
+import os
+import platform
+from dataclasses import dataclass
+from enum import Enum, unique
+
+from EosPayload.lib.util import settings_section
+
+"""
+CPU and I/O scheduling of driver processes (Linux only).  OrchEOStrator applies a device's `scheduling` settings as soon
+as its process is started: CPU affinity, nice level, SCHED_FIFO real-time priority and I/O priority class.  Linux keeps
+all of them per thread, so they are applied to the driver's main thread first, which every thread it creates afterwards
+inherits, and then to any thread it had already created.
+"""
+
+
+@unique
+class IoClass(str, Enum):
+    REALTIME = 'realtime'
+    BEST_EFFORT = 'best-effort'
+    IDLE = 'idle'
+
+
+_IO_CLASS_VALUES = {IoClass.REALTIME: 1, IoClass.BEST_EFFORT: 2, IoClass.IDLE: 3}
+_IO_CLASS_NAMES = {0: 'none', 1: IoClass.REALTIME.value, 2: IoClass.BEST_EFFORT.value, 3: IoClass.IDLE.value}
+_IOPRIO_CLASS_SHIFT = 13
+_IOPRIO_WHO_PROCESS = 1
+# (ioprio_set, ioprio_get) syscall numbers.  Neither libc nor os wraps them
+_IOPRIO_SYSCALLS = {
+    'x86_64': (251, 252),
+    'i386': (289, 290),
+    'i686': (289, 290),
+    'armv6l': (314, 315),
+    'armv7l': (314, 315),
+    'aarch64': (30, 31),
+    'riscv64': (30, 31),
+}
+
+
+@dataclass
+class SchedulingConfig:
+    cpus: list[int] | None = None  # CPUs the driver may run on
+    nice: int | None = None  # -20 (highest priority) to 19
+    realtime_priority: int | None = None  # SCHED_FIFO priority, 1 to 99
+    io_class: IoClass | None = None
+    io_priority: int | None = None  # 0 (highest) to 7, for the realtime and best-effort I/O classes
+
+    @property
+    def configured(self) -> bool:
+        return any(value is not None for value in (self.cpus, self.nice, self.realtime_priority, self.io_class))
+
+    @staticmethod
+    def from_settings(settings: dict | None) -> 'SchedulingConfig':
+        """ Builds a config from the optional `scheduling` dict in a device's settings
+
+        :param settings: the device's settings (may be None)
+        :return: the scheduling config
+        """
+        scheduling_settings = settings_section(settings, "scheduling")
+        try:
+            cpus = scheduling_settings.get("cpus")
+            nice = scheduling_settings.get("nice")
+            realtime_priority = scheduling_settings.get("realtime_priority")
+            io_class = scheduling_settings.get("io_class")
+            io_priority = scheduling_settings.get("io_priority")
+            config = SchedulingConfig(
+                cpus=[int(cpu) for cpu in cpus] if cpus is not None else None,
+                nice=int(nice) if nice is not None else None,
+                realtime_priority=int(realtime_priority) if realtime_priority is not None else None,
+                io_class=IoClass(io_class) if io_class is not None else None,
+                io_priority=int(io_priority) if io_priority is not None else None,
+            )
+        except TypeError as e:
+            raise ValueError(f"invalid scheduling settings: {e}") from e
+        if config.cpus is not None and (not config.cpus or min(config.cpus) < 0):
+            raise ValueError("scheduling cpus must be a non-empty list of CPU numbers")
+        if config.nice is not None and not -20 <= config.nice <= 19:
+            raise ValueError("scheduling nice must be between -20 and 19")
+        if config.realtime_priority is not None and not 1 <= config.realtime_priority <= 99:
+            raise ValueError("scheduling realtime_priority must be between 1 and 99")
+        if config.io_priority is not None and (config.io_class is None or config.io_class == IoClass.IDLE
+                                               or not 0 <= config.io_priority <= 7):
+            raise ValueError("scheduling io_priority must be between 0 and 7, with the realtime or best-effort"
+                             " io_class")
+        return config
+
+
+def apply_scheduling(pid: int, config: SchedulingConfig) -> list[str]:
+    """ Applies a scheduling config to every thread of a process
+
+    :param pid: the process
+    :param config: the scheduling config
+    :return: a message for each setting that couldn't be applied, eg raising priority without CAP_SYS_NICE
+    """
+    if not hasattr(os, 'sched_setaffinity'):
+        return ["CPU and I/O scheduling needs Linux"]
+    settings = []
+    if config.cpus is not None:
+        settings.append(("cpus", lambda tid: os.sched_setaffinity(tid, config.cpus)))
+    if config.nice is not None:
+        settings.append(("nice", lambda tid: os.setpriority(os.PRIO_PROCESS, tid, config.nice)))
+    if config.realtime_priority is not None:
+        settings.append(("realtime_priority", lambda tid: os.sched_setscheduler(
+            tid, os.SCHED_FIFO, os.sched_param(config.realtime_priority))))
+    if config.io_class is not None:
+        io_priority = _IO_CLASS_VALUES[config.io_class] << _IOPRIO_CLASS_SHIFT | (config.io_priority or 0)
+        settings.append(("io_class", lambda tid: _ioprio_set(tid, io_priority)))
+
+    errors = []
+    applied = []
+    for name, apply in settings:
+        try:
+            apply(pid)
+            applied.append(apply)
+        except OSError as e:
+            errors.append(f"{name}: {e}")
+    for tid in _threads(pid):
+        for apply in applied:
+            try:
+                apply(tid)
+            except ProcessLookupError:
+                break  # the thread exited
+            except OSError:
+                pass  # it worked for the main thread, so this is a thread that is exiting
+    return errors
+
+
+def describe_scheduling(pid: int) -> str:
+    """ :return: the scheduling a process's main thread actually has, eg "cpus 0-1, nice -5, SCHED_FIFO 50, io
+             realtime 0"
+    :raises OSError: if the process is gone
+    """
+    description = f"cpus {_format_cpus(os.sched_getaffinity(pid))}, nice {os.getpriority(os.PRIO_PROCESS, pid)}"
+    if os.sched_getscheduler(pid) == os.SCHED_FIFO:
+        description += f", SCHED_FIFO {os.sched_getparam(pid).sched_priority}"
+    try:
+        io_priority = _ioprio_get(pid)
+        io_class = _IO_CLASS_NAMES.get(io_priority >> _IOPRIO_CLASS_SHIFT, 'unknown')
+        description += f", io {io_class}" + (f" {io_priority & 0x7}" if io_class in ('realtime', 'best-effort') else "")
+    except OSError:
+        pass  # no ioprio syscall on this architecture
+    return description
+
+
+def _threads(pid: int) -> list[int]:
+    """ :return: the ids of a process's threads other than its main thread """
+    try:
+        return [int(tid) for tid in os.listdir(f"/proc/{pid}/task") if int(tid) != pid]
+    except OSError:
+        return []
+
+
+def _format_cpus(cpus: set[int]) -> str:
+    """ :return: a CPU set in taskset's list format, eg "0-2,4" """
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(str(first) if first == last else f"{first}-{last}" for first, last in ranges)
+
+
+def _ioprio_syscall(index: int, *args: int) -> int:
+    numbers = _IOPRIO_SYSCALLS.get(platform.machine())
+    if numbers is None:
+        raise OSError(f"ioprio is not supported on {platform.machine()}")
+    libc = ctypes.CDLL(None, use_errno=True)
+    result = libc.syscall(numbers[index], *args)
+    if result < 0:
+        error = ctypes.get_errno()
+        raise OSError(error, os.strerror(error))
+    return result
+
+
+def _ioprio_set(tid: int, io_priority: int) -> None:
+    _ioprio_syscall(0, _IOPRIO_WHO_PROCESS, tid, io_priority)
+
+
+def _ioprio_get(tid: int) -> int:
+    return _ioprio_syscall(1, _IOPRIO_WHO_PROCESS, tid)
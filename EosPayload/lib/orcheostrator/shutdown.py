@@ -0,0 +1,105 @@
+import time
+from dataclasses import dataclass
+from enum import Enum, unique
+from multiprocessing.connection import wait
+from multiprocessing.process import BaseProcess
+
+from EosPayload.lib.util import settings_section
+
+"""
+Stopping driver processes.  Every process is sent SIGTERM at once, which drivers handle by running their cleanup()
+(flushing data files, releasing GPIO, closing serial ports) and exiting.  They are waited for in parallel on their
+sentinels until a shared deadline, and any that are still running then are sent SIGKILL.
+"""
+
+
+@dataclass
+class ShutdownConfig:
+    timeout: float = 10.0  # seconds every driver has to clean up and exit after SIGTERM
+    kill_timeout: float = 2.0  # seconds to wait for killed drivers to be reaped
+
+    @staticmethod
+    def from_settings(settings: dict | None) -> 'ShutdownConfig':
+        """ Builds a config from the optional `shutdown` dict at the top level of the config file
+
+        :param settings: the top level config dict (may be None)
+        :return: the shutdown config
+        """
+        shutdown_settings = settings_section(settings, "shutdown")
+        try:
+            config = ShutdownConfig(
+                timeout=float(shutdown_settings.get("timeout", 10.0)),
+                kill_timeout=float(shutdown_settings.get("kill_timeout", 2.0)),
+            )
+        except TypeError as e:
+            raise ValueError(f"invalid shutdown settings: {e}") from e
+        if config.timeout < 0 or config.kill_timeout < 0:
+            raise ValueError("shutdown timeout and kill_timeout must be >= 0")
+        return config
+
+
+@unique
+class StopOutcome(str, Enum):
+    EXITED = 'exited'  # exited with code 0 after SIGTERM
+    FAILED = 'failed'  # exited with a non-zero code after SIGTERM
+    KILLED = 'killed'  # didn't exit by the deadline and was killed
+    UNKILLABLE = 'unkillable'  # didn't exit even after SIGKILL (eg stuck in the kernel)
+    NOT_RUNNING = 'not running'  # had already exited
+
+
+@dataclass
+class StopResult:
+    name: str
+    pid: int | None
+    outcome: StopOutcome
+    exit_code: int | None
+    duration: float  # seconds from SIGTERM until the process was reaped (or given up on)
+
+    def __str__(self) -> str:
+        exit_code = f", exit code {self.exit_code}" if self.exit_code is not None else ""
+        return f"{self.name} (pid {self.pid}): {self.outcome.value} after {self.duration:.2f}s{exit_code}"
+
+
+def stop_processes(processes: dict[str, BaseProcess], config: ShutdownConfig) -> list[StopResult]:
+    """ Sends SIGTERM to every process at once, waits for all of them up to config.timeout, then kills the rest
+
+    :param processes: the processes to stop, by name
+    :param config: the shutdown config
+    :return: how each process stopped, in the order they were given.  The processes are reaped but not closed.
+    """
+    start = time.monotonic()
+    results: dict[str, StopResult] = {}
+    pending: dict[int, tuple[str, BaseProcess]] = {}
+    for name, process in processes.items():
+        if process.exitcode is not None:
+            results[name] = StopResult(name, process.pid, StopOutcome.NOT_RUNNING, process.exitcode, 0.0)
+            continue
+        process.terminate()
+        pending[process.sentinel] = (name, process)
+
+    _reap(pending, results, start, start + config.timeout, killed=False)
+    if pending:
+        for _, process in pending.values():
+            process.kill()
+        _reap(pending, results, start, time.monotonic() + config.kill_timeout, killed=True)
+    for name, process in pending.values():
+        results[name] = StopResult(name, process.pid, StopOutcome.UNKILLABLE, None, time.monotonic() - start)
+    return [results[name] for name in processes]
+
+
+def _reap(pending: dict[int, tuple[str, BaseProcess]], results: dict[str, StopResult], start: float,
+          deadline: float, killed: bool) -> None:
+    """ Records every pending process that exits before the deadline, and removes it from pending """
+    while pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        for sentinel in wait(list(pending), remaining):
+            name, process = pending.pop(sentinel)
+            # its sentinel is ready as soon as it exits, but its exit code is only set once it has been reaped
+            process.join()
+            if killed:
+                outcome = StopOutcome.KILLED
+            else:
+                outcome = StopOutcome.EXITED if process.exitcode == 0 else StopOutcome.FAILED
+            results[name] = StopResult(name, process.pid, outcome, process.exitcode, time.monotonic() - start)
@@ -0,0 +1,74 @@
+import multiprocessing
+from dataclasses import dataclass, field
+from enum import Enum, unique
+from multiprocessing.context import BaseContext
+
+from EosPayload.lib.util import settings_section
+
+"""
+How OrchEOStrator starts driver processes.
+
+fork        each driver is forked from OrchEOStrator itself, inheriting everything it has imported and every thread,
+            socket and file it has open (the historical behaviour)
+forkserver  a small server process is started once, imports the preload modules, and forks every driver from that
+            clean, already-warm state.  Drivers share the preloaded modules' memory copy-on-write and skip importing
+            them again
+spawn       every driver starts a fresh interpreter and imports everything itself (slowest, most isolated)
+"""
+
+# modules every driver needs, imported once by the forkserver
+DEFAULT_PRELOAD_MODULES = [
+    'EosLib.packet',
+    'EosLib.format',
+    'paho.mqtt.client',
+    'EosPayload.lib.base_drivers.driver_base',
+]
+
+
+@unique
+class SpawnMode(str, Enum):
+    FORK = 'fork'
+    FORKSERVER = 'forkserver'
+    SPAWN = 'spawn'
+
+
+@dataclass
+class SpawnConfig:
+    mode: SpawnMode = SpawnMode.FORK
+    preload: list[str] = field(default_factory=lambda: list(DEFAULT_PRELOAD_MODULES))
+    preload_drivers: bool = True
+
+    @staticmethod
+    def from_settings(settings: dict | None) -> 'SpawnConfig':
+        """ Builds a config from the optional `spawn` dict at the top level of the config file
+
+        :param settings: the top level config dict (may be None)
+        :return: the spawn config
+        """
+        spawn_settings = settings_section(settings, "spawn")
+        try:
+            return SpawnConfig(
+                mode=SpawnMode(spawn_settings.get("mode", SpawnMode.FORK.value)),
+                preload=list(spawn_settings.get("preload", DEFAULT_PRELOAD_MODULES)),
+                preload_drivers=bool(spawn_settings.get("preload_drivers", True)),
+            )
+        except TypeError as e:
+            raise ValueError(f"invalid spawn settings: {e}") from e
+
+
+def get_spawn_context(config: SpawnConfig, driver_modules: list[str]) -> BaseContext:
+    """ Returns the multiprocessing context to create driver processes (and their pipes) with.  Must be called before
+    the first driver is started, so the forkserver picks up the preload list.
+
+    :param config: the spawn config
+    :param driver_modules: the modules of the enabled drivers, preloaded too if preload_drivers is set
+    :return: the multiprocessing context
+    """
+    context = multiprocessing.get_context(config.mode.value)
+    if config.mode == SpawnMode.FORKSERVER:
+        preload = list(config.preload)
+        if config.preload_drivers:
+            preload += [module for module in driver_modules if module not in preload]
+        # modules that fail to import are skipped by the forkserver and imported by the drivers that need them
+        context.set_forkserver_preload(preload)
+    return context
@@ -0,0 +1,109 @@
+from collections import deque
+from dataclasses import dataclass
+
+from EosPayload.lib.util import settings_section
+
+"""
+Restarting drivers whose process exited.
+
+A driver process never exits on its own while it is healthy, so OrchEOStrator treats every exit it didn't ask for as a
+crash.  With restarts enabled, the driver is restarted after a backoff that doubles with every restart in the last
+`window` seconds (so it falls back to `backoff_initial` once the driver has stayed up for a while).  If the driver has
+already been restarted `max_restarts` times within the window it is crash-looping, and it is left down.
+"""
+
+
+@dataclass
+class RestartConfig:
+    enabled: bool = False
+    backoff_initial: float = 1.0  # seconds
+    backoff_max: float = 300.0  # seconds
+    backoff_multiplier: float = 2.0
+    max_restarts: int = 5
+    window: float = 600.0  # seconds
+
+    @staticmethod
+    def from_settings(settings: dict | None, global_settings: dict | None = None) -> 'RestartConfig':
+        """ Builds a config from the optional `restart` dict in a device's settings, on top of the optional `restart`
+        dict at the top level of the config file
+
+        :param settings: the device's settings (may be None)
+        :param global_settings: the top level config dict (may be None)
+        :return: the restart config
+        """
+        restart_settings = dict(settings_section(global_settings, "restart"))
+        restart_settings.update(settings_section(settings, "restart"))
+        try:
+            config = RestartConfig(
+                enabled=bool(restart_settings.get("enabled", False)),
+                backoff_initial=float(restart_settings.get("backoff_initial", 1.0)),
+                backoff_max=float(restart_settings.get("backoff_max", 300.0)),
+                backoff_multiplier=float(restart_settings.get("backoff_multiplier", 2.0)),
+                max_restarts=int(restart_settings.get("max_restarts", 5)),
+                window=float(restart_settings.get("window", 600.0)),
+            )
+        except TypeError as e:
+            raise ValueError(f"invalid restart settings: {e}") from e
+        if config.backoff_initial < 0 or config.backoff_max < config.backoff_initial:
+            raise ValueError("restart backoff_initial must be >= 0 and <= backoff_max")
+        if config.backoff_multiplier < 1:
+            raise ValueError("restart backoff_multiplier must be >= 1")
+        if config.max_restarts < 0 or config.window <= 0:
+            raise ValueError("restart max_restarts must be >= 0 and window must be > 0")
+        return config
+
+
+class RestartTracker:
+    """ Decides when (and whether) a driver is restarted after it exits, and counts its restarts """
+
+    def __init__(self, config: RestartConfig):
+        self.config = config
+        self.restarts = 0
+        self.crash_looping = False
+        self.restart_at: float | None = None  # time.monotonic() the pending restart is due, if one is pending
+        self.last_exit_code: int | None = None
+        self._recent: deque[float] = deque()  # when each restart within the window happened
+
+    def on_exit(self, exit_code: int | None, now: float) -> float | None:
+        """ Records that the driver's process exited and schedules its restart
+
+        :param exit_code: the process's exit code
+        :param now: the current time.monotonic()
+        :return: the delay until the restart in seconds, or None if the driver won't be restarted
+        """
+        self.last_exit_code = exit_code
+        self.restart_at = None
+        if not self.config.enabled:
+            return None
+        self._forget_old(now)
+        if len(self._recent) >= self.config.max_restarts:
+            self.crash_looping = True
+            return None
+        self.crash_looping = False
+        delay = min(self.config.backoff_max,
+                    self.config.backoff_initial * self.config.backoff_multiplier ** len(self._recent))
+        self.restart_at = now + delay
+        return delay
+
+    def due(self, now: float) -> bool:
+        """ :return: True if a restart is pending and its backoff has elapsed """
+        return self.restart_at is not None and now >= self.restart_at
+
+    def on_restart(self, now: float) -> None:
+        """ Records that the driver was restarted """
+        self.restart_at = None
+        self.restarts += 1
+        self._recent.append(now)
+
+    def cancel(self) -> None:
+        """ Drops a pending restart, eg when OrchEOStrator is shutting down """
+        self.restart_at = None
+
+    def recent_restarts(self, now: float) -> int:
+        """ :return: the number of restarts within the window """
+        self._forget_old(now)
+        return len(self._recent)
+
+    def _forget_old(self, now: float) -> None:
+        while self._recent and self._recent[0] <= now - self.config.window:
+            self._recent.popleft()
@@ -0,0 +1,86 @@
+from dataclasses import dataclass
+
+from EosPayload.lib.util import settings_section
+
+"""
+Packet aggregation.  Several encoded packets for the same remote can be sent as a single XBee frame, so short packets
+don't each pay the per-frame API and RF overhead.  An aggregate frame is AGGREGATE_MAGIC followed by a sequence of
+(uint8 length, encoded packet) sub-frames; a frame holding a single packet is sent as the plain packet.  The receiving
+side passes every frame through split_frame(), which returns one encoded packet per sub-frame, or the frame itself if
+it isn't an aggregate.
+"""
+
+AGGREGATE_MAGIC = b'\xa9\xe0'
+SUBFRAME_OVERHEAD = 1  # the length byte
+
+DEFAULT_MAX_FRAME = 256  # bytes, the XBee-PRO 900HP's maximum RF payload (its NP parameter)
+DEFAULT_WINDOW = 0.05  # seconds
+
+
+@dataclass
+class AggregationConfig:
+    enabled: bool = False
+    max_frame: int = DEFAULT_MAX_FRAME
+    window: float = DEFAULT_WINDOW  # the longest a packet is held back waiting for more packets to share its frame
+
+    @staticmethod
+    def from_settings(settings: dict | None) -> 'AggregationConfig':
+        """ Builds a config from the optional `aggregation` dict in the radio driver's settings
+
+        :param settings: the device's settings (may be None)
+        :return: the aggregation config
+        """
+        aggregation_settings = settings_section(settings, "aggregation")
+        try:
+            config = AggregationConfig(
+                enabled=bool(aggregation_settings.get("enabled", False)),
+                max_frame=int(aggregation_settings.get("max_frame", DEFAULT_MAX_FRAME)),
+                window=float(aggregation_settings.get("window", DEFAULT_WINDOW)),
+            )
+        except TypeError as e:
+            raise ValueError(f"invalid aggregation settings: {e}") from e
+        if config.window < 0:
+            raise ValueError("aggregation window must be >= 0")
+        if config.max_frame < len(AGGREGATE_MAGIC) + 2 * (SUBFRAME_OVERHEAD + 1):
+            raise ValueError("aggregation max_frame is too small to hold two packets")
+        return config
+
+
+def max_subframe_payload(max_frame: int) -> int:
+    """ :return: the largest packet that can be aggregated into a frame of at most max_frame bytes """
+    return min(max_frame - len(AGGREGATE_MAGIC) - SUBFRAME_OVERHEAD, 255)
+
+
+def aggregate_size(payloads: list[bytes]) -> int:
+    """ :return: the size of the frame encode_frame() makes of the packets, if they are aggregated """
+    return len(AGGREGATE_MAGIC) + sum(SUBFRAME_OVERHEAD + len(payload) for payload in payloads)
+
+
+def encode_frame(payloads: list[bytes]) -> bytes:
+    """ :return: the frame for one or more encoded packets.  A single packet is returned as is. """
+    if len(payloads) == 1:
+        return payloads[0]
+    if any(len(payload) > 255 for payload in payloads):
+        raise ValueError("only packets of up to 255 bytes can be aggregated")
+    return AGGREGATE_MAGIC + b''.join(bytes([len(payload)]) + payload for payload in payloads)
+
+
+def split_frame(frame: bytes) -> list[bytes]:
+    """ Receiver-side decoder.  Splits a received frame into the encoded packets it holds.
+
+    :param frame: the frame's data, as received
+    :return: the encoded packets, in the order they were sent.  A frame that isn't a well-formed aggregate is returned
+             as the only packet, so plain packets pass through untouched.
+    """
+    if not frame.startswith(AGGREGATE_MAGIC):
+        return [frame]
+    payloads = []
+    offset = len(AGGREGATE_MAGIC)
+    while offset < len(frame):
+        length = frame[offset]
+        offset += SUBFRAME_OVERHEAD
+        if length == 0 or offset + length > len(frame):
+            return [frame]
+        payloads.append(frame[offset:offset + length])
+        offset += length
+    return payloads if len(payloads) > 1 else [frame]
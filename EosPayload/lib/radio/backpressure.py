@@ -0,0 +1,29 @@
+import json
+from dataclasses import dataclass
+
+"""
+Radio backpressure.  The radio driver publishes its transmit queue's state on Topic.RADIO_BACKPRESSURE whenever it
+changes, as a retained message so drivers that start later get the current state too.  It becomes active when the
+queue fills past its high water mark (eg during a link outage) and inactive again once it drains below its low water
+mark.  Producers should transmit less while it is active: the queue drops their oldest packets once it is full.
+
+The message is JSON: {"active": true, "fill": 0.82}
+"""
+
+
+@dataclass
+class Backpressure:
+    active: bool = False
+    fill: float = 0.0  # how full the queue is: 0 to 1, or more if it holds packets that are never dropped
+
+    def encode(self) -> bytes:
+        return json.dumps({"active": self.active, "fill": round(self.fill, 3)}).encode()
+
+    @staticmethod
+    def decode(payload: bytes) -> 'Backpressure':
+        """ :raises ValueError: if the payload isn't a backpressure message """
+        try:
+            message = json.loads(payload)
+            return Backpressure(active=bool(message["active"]), fill=float(message["fill"]))
+        except (UnicodeDecodeError, json.JSONDecodeError, KeyError, TypeError) as e:
+            raise ValueError(f"invalid backpressure message: {e}") from e
@@ -0,0 +1,247 @@
+import struct
+import zlib
+from dataclasses import dataclass, field
+
+from EosLib.format.definitions import Type
+
+from EosPayload.lib.util import settings_section
+
+"""
+Delta encoding and compression of downlinked packets.  Consecutive positions, science data and telemetry readings from
+the same sender differ only slightly, so most packets of an encoded type are sent as a delta against the last keyframe
+of the same (sender, data type): the packet XORed with the keyframe, which is mostly zero bytes, then deflated.  Every
+frame is deflated with an optional preset dictionary (see build_dictionary), which lets even a single small packet
+compress.
+
+There are no link-level acks on the downlink, so deltas are taken against the last keyframe sent, and a lost keyframe
+is bounded by sending a new one every keyframe_interval packets or keyframe_max_age seconds: the receiver drops deltas
+whose keyframe it doesn't have until the next keyframe arrives.
+
+An encoded frame is ENCODED_MAGIC, a flags byte, the sender, the data type and the keyframe id (one byte each), then the
+body.  Keyframes are always sent encoded, even when that makes them up to MAX_EXPANSION bytes longer, since the deltas
+against them are what saves space (with a keyframe_interval of 1 there are no deltas, and packets are only compressed).
+Any other packet that encoding doesn't make smaller is sent unchanged, and the receiver passes anything that doesn't
+start with ENCODED_MAGIC through untouched, so both ends can run with encoding off or on.
+"""
+
+ENCODED_MAGIC = b'\xa9\xe1'
+DEFAULT_TYPES = ['POSITION', 'SCIENCE_DATA', 'TELEMETRY_DATA']
+DEFAULT_KEYFRAME_INTERVAL = 10  # packets
+DEFAULT_KEYFRAME_MAX_AGE = 30.0  # seconds
+DEFAULT_DICTIONARY_SIZE = 1024  # bytes
+
+_HEADER = struct.Struct('<2sBBBB')  # magic, flags, sender, data type, keyframe id
+MAX_EXPANSION = _HEADER.size  # the most encoding adds to a packet
+_KEYFRAME = 0x01
+_DEFLATED = 0x02
+_WBITS = -15  # raw deflate: no zlib header or checksum
+
+
+@dataclass
+class EncodingConfig:
+    enabled: bool = False
+    types: list[Type] = field(default_factory=lambda: [Type[name] for name in DEFAULT_TYPES])
+    keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL
+    keyframe_max_age: float = DEFAULT_KEYFRAME_MAX_AGE
+    dictionary: str | None = None  # path of the preset dictionary file, which the receiver must use too
+
+    @staticmethod
+    def from_settings(settings: dict | None) -> 'EncodingConfig':
+        """ Builds a config from the optional `encoding` dict in the radio driver's settings
+
+        :param settings: the device's settings (may be None)
+        :return: the encoding config
+        """
+        encoding_settings = settings_section(settings, "encoding")
+        try:
+            try:
+                types = [Type[name] for name in encoding_settings.get("types", DEFAULT_TYPES)]
+            except KeyError as e:
+                raise ValueError(f"encoding type {e} is not a Type") from e
+            config = EncodingConfig(
+                enabled=bool(encoding_settings.get("enabled", False)),
+                types=types,
+                keyframe_interval=int(encoding_settings.get("keyframe_interval", DEFAULT_KEYFRAME_INTERVAL)),
+                keyframe_max_age=float(encoding_settings.get("keyframe_max_age", DEFAULT_KEYFRAME_MAX_AGE)),
+                dictionary=encoding_settings.get("dictionary"),
+            )
+        except TypeError as e:
+            raise ValueError(f"invalid encoding settings: {e}") from e
+        if config.keyframe_interval < 1 or config.keyframe_max_age <= 0:
+            raise ValueError("encoding keyframe_interval must be >= 1 and keyframe_max_age must be > 0")
+        return config
+
+
+@dataclass
+class EncodingStats:
+    """ Encoding metrics of one data type """
+    packets: int = 0
+    keyframes: int = 0
+    deltas: int = 0
+    raw_bytes: int = 0
+    encoded_bytes: int = 0
+
+    def __str__(self) -> str:
+        saved = 1 - self.encoded_bytes / self.raw_bytes if self.raw_bytes else 0.0
+        return f"{self.packets} packets ({self.keyframes} keyframes, {self.deltas} deltas), {self.raw_bytes} B ->" \
+               f" {self.encoded_bytes} B ({saved:.0%} saved)"
+
+
+@dataclass
+class _Keyframe:
+    id: int
+    payload: bytes
+    sent: float  # time.monotonic()
+    deltas: int = 0
+    lost: bool = False  # failed to send, so no deltas may be sent against it
+
+
+def load_dictionary(path: str | None) -> bytes | None:
+    """ :return: the preset dictionary in the file, or None if no path is given """
+    if not path:
+        return None
+    with open(path, 'rb') as dictionary_file:
+        return dictionary_file.read()
+
+
+def build_dictionary(samples: list[bytes], size: int = DEFAULT_DICTIONARY_SIZE) -> bytes:
+    """ Builds a preset dictionary from sample payloads, eg recorded packets.  Deflate finds matches nearest the end of
+    the dictionary most cheaply, so the most recent samples go last.
+
+    :param samples: sample payloads, oldest first
+    :param size: the dictionary's maximum size, in bytes (deflate uses at most 32 KiB)
+    :return: the dictionary
+    """
+    dictionary = b''
+    for sample in reversed(samples):
+        if len(dictionary) + len(sample) > size:
+            break
+        dictionary = sample + dictionary
+    return dictionary
+
+
+def xor_delta(payload: bytes, reference: bytes) -> bytes:
+    """ XORs the payload with the reference over their common length.  Applying it again with the same reference
+    restores the payload.
+    """
+    length = min(len(payload), len(reference))
+    delta = int.from_bytes(payload[:length], 'little') ^ int.from_bytes(reference[:length], 'little')
+    return delta.to_bytes(length, 'little') + payload[length:]
+
+
+class DeltaEncoder:
+    """ The sending side: encodes packets in the order they are transmitted.  Not thread safe. """
+
+    def __init__(self, config: EncodingConfig, dictionary: bytes | None = None):
+        """
+        :param config: the encoding config
+        :param dictionary: the preset dictionary, if any
+        """
+        self.config = config
+        self.stats: dict[int, EncodingStats] = {}
+        self._dictionary = dictionary
+        self._keyframes: dict[tuple[int, int], _Keyframe] = {}
+
+    def encode(self, sender: int, data_type: int, payload: bytes, now: float) -> bytes:
+        """ Encodes a packet for transmission
+
+        :param sender: the packet's sender
+        :param data_type: the packet's data type
+        :param payload: the encoded packet
+        :param now: the current time.monotonic()
+        :return: what to send instead, which is at most MAX_EXPANSION bytes longer than the payload
+        """
+        if data_type not in self.config.types or not 0 <= sender <= 255 or not 0 <= data_type <= 255:
+            return payload
+        key = (sender, data_type)
+        keyframe = self._keyframes.get(key)
+        is_keyframe = keyframe is None or keyframe.lost or keyframe.deltas + 1 >= self.config.keyframe_interval \
+            or now - keyframe.sent >= self.config.keyframe_max_age
+        if is_keyframe:
+            keyframe_id = (keyframe.id + 1) % 256 if keyframe is not None else 0
+            flags, body = _KEYFRAME, payload
+        else:
+            keyframe_id = keyframe.id
+            flags, body = 0, xor_delta(payload, keyframe.payload)
+        compressed = self._compress(body)
+        if len(compressed) < len(body):
+            flags, body = flags | _DEFLATED, compressed
+        frame = _HEADER.pack(ENCODED_MAGIC, flags, sender, data_type, keyframe_id) + body
+
+        stats = self.stats.setdefault(data_type, EncodingStats())
+        stats.packets += 1
+        stats.raw_bytes += len(payload)
+        # a keyframe is worth sending even if encoding makes it longer, unless no deltas will be sent against it
+        if len(frame) >= len(payload) and (not is_keyframe or self.config.keyframe_interval == 1):
+            frame = payload
+        elif is_keyframe:
+            self._keyframes[key] = _Keyframe(keyframe_id, payload, now)
+            stats.keyframes += 1
+        else:
+            keyframe.deltas += 1
+            stats.deltas += 1
+        stats.encoded_bytes += len(frame)
+        return frame
+
+    def forget(self, sender: int, data_type: int) -> None:
+        """ Forgets the last keyframe of a (sender, data type), eg because a frame encoded against it failed to send,
+        so the next packet of it is sent as a new keyframe.  Keyframe ids keep counting up, so a stale keyframe the
+        receiver still has never matches a later delta.
+
+        :param sender: the packet's sender
+        :param data_type: the packet's data type
+        """
+        keyframe = self._keyframes.get((sender, data_type))
+        if keyframe is not None:
+            keyframe.lost = True
+
+    def _compress(self, body: bytes) -> bytes:
+        if self._dictionary:
+            compressor = zlib.compressobj(9, zlib.DEFLATED, _WBITS, 9, zlib.Z_DEFAULT_STRATEGY, self._dictionary)
+        else:
+            compressor = zlib.compressobj(9, zlib.DEFLATED, _WBITS, 9)
+        return compressor.compress(body) + compressor.flush()
+
+
+class DeltaDecoder:
+    """ The receiving side: restores encoded packets, in the order they were received.  Not thread safe. """
+
+    def __init__(self, dictionary: bytes | None = None):
+        """
+        :param dictionary: the preset dictionary the sender uses, if any
+        """
+        self.missing_keyframe = 0  # deltas dropped because their keyframe was lost
+        self._dictionary = dictionary
+        self._keyframes: dict[tuple[int, int], tuple[int, bytes]] = {}
+
+    def decode(self, frame: bytes) -> bytes | None:
+        """ Restores a received frame
+
+        :param frame: a frame produced by DeltaEncoder.encode(), or any other packet
+        :return: the encoded packet (frames that aren't encoded are returned as is), or None if it was a delta whose
+                 keyframe never arrived
+        :raises ValueError: if the frame is corrupt, or was compressed with a different dictionary
+        """
+        if not frame.startswith(ENCODED_MAGIC) or len(frame) < _HEADER.size:
+            return frame
+        _, flags, sender, data_type, keyframe_id = _HEADER.unpack_from(frame)
+        body = frame[_HEADER.size:]
+        if flags & _DEFLATED:
+            try:
+                if self._dictionary:
+                    decompressor = zlib.decompressobj(_WBITS, self._dictionary)
+                else:
+                    decompressor = zlib.decompressobj(_WBITS)
+                body = decompressor.decompress(body) + decompressor.flush()
+            except zlib.error as e:
+                raise ValueError(f"failed to inflate encoded frame: {e}") from e
+
+        key = (sender, data_type)
+        if flags & _KEYFRAME:
+            self._keyframes[key] = (keyframe_id, body)
+            return body
+        keyframe = self._keyframes.get(key)
+        if keyframe is None or keyframe[0] != keyframe_id:
+            self.missing_keyframe += 1
+            return None
+        return xor_delta(body, keyframe[1])
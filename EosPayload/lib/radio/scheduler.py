@@ -0,0 +1,441 @@
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field, replace
+from enum import Enum, unique
+
+from EosLib.format.definitions import Type
+from EosLib.packet import Packet
+from EosLib.packet.definitions import Priority
+
+from EosPayload.lib.util import settings_section
+
+"""
+Downlink scheduling for RadioDriver.  Transmissions are paced by a token bucket that fills at the link's measured
+capacity (bytes/s, counting each frame's XBee API overhead), so bursts queue here instead of overrunning the XBee's
+serial buffer.
+
+Which packet goes next:
+    strict classes  (URGENT by default) are always sent first, in arrival order
+    aging           otherwise, a packet that has waited longer than max_wait is sent first, oldest first
+    fair queuing    otherwise, weighted fair queuing across the remaining Priority classes (self-clocked: each packet
+                    is stamped with a virtual finish time of max(virtual time, its class's last finish) + size / weight
+                    and the smallest is sent), so every backlogged class gets a share of the link proportional to its
+                    weight -- DATA keeps moving behind a steady stream of TELEMETRY
+
+Latest-value supersession: packets of the data types listed in `supersede` are snapshots, so a newer packet from the
+same sender replaces an older one of the same type that is still queued, taking its place in the queue.  Under backlog
+the newest position or reading goes out as soon as the old one would have, instead of after every stale one.  Commands
+and acks (NEVER_SUPERSEDE) and strict classes are never superseded.
+
+Capacity: the queue holds at most max_packets packets and max_bytes bytes, so a long link outage can't use up the
+memory and then keep the link busy with stale data for hours.  When a packet doesn't fit, the oldest packets of the
+drop-oldest classes that are no more important than it (strict classes are the most important, then by weight) are
+dropped to make room, least important class first.  If that can't make room, the new packet is dropped, unless its
+class is never-drop: those are queued regardless, and are never dropped to make room for others.  A drop-newest class
+keeps what it has queued and drops new packets instead.  The scheduler is backpressured from when the queue fills past
+backpressure_high until it drains below backpressure_low, which RadioDriver publishes so producers can slow down.
+"""
+
+DEFAULT_RATE = 800.0  # bytes/s, about what the XBee sustains at 9600 baud
+DEFAULT_BURST = 512  # bytes
+DEFAULT_FRAME_OVERHEAD = 18  # bytes of XBee API framing and transmit request header per frame
+DEFAULT_STRICT = ['URGENT']
+DEFAULT_WEIGHTS = {'TELEMETRY': 4.0, 'DATA': 1.0}
+DEFAULT_MAX_WAIT = 60.0  # seconds
+DEFAULT_METRICS_INTERVAL = 60.0  # seconds
+DEFAULT_MAX_PACKETS = 1000
+DEFAULT_MAX_BYTES = 128 * 1024  # about 160s of backlog at the default rate
+DEFAULT_DROP_POLICIES = {'URGENT': 'never-drop'}  # other classes are drop-oldest
+DEFAULT_BACKPRESSURE_HIGH = 0.8  # of capacity
+DEFAULT_BACKPRESSURE_LOW = 0.5  # of capacity
+# commands and their acks: every one of them matters, not just the latest
+NEVER_SUPERSEDE = [Type.CUTDOWN, Type.VALVE, Type.PING]
+
+
+@unique
+class DropPolicy(str, Enum):
+    DROP_OLDEST = 'drop-oldest'  # drop the class's oldest queued packets to make room
+    DROP_NEWEST = 'drop-newest'  # drop new packets of the class while the queue is full
+    NEVER_DROP = 'never-drop'  # queue the class's packets even if the queue is full
+
+
+@unique
+class PutResult(str, Enum):
+    QUEUED = 'queued'
+    SUPERSEDED = 'superseded'  # replaced a queued packet from the same sender of the same data type
+    DROPPED = 'dropped'  # the queue was full
+
+
+@dataclass
+class DownlinkConfig:
+    rate: float = DEFAULT_RATE  # 0 = unpaced
+    burst: int = DEFAULT_BURST
+    frame_overhead: int = DEFAULT_FRAME_OVERHEAD
+    strict: list[Priority] = field(default_factory=lambda: [Priority[name] for name in DEFAULT_STRICT])
+    weights: dict[Priority, float] = field(default_factory=lambda: {Priority[name]: weight
+                                                                    for name, weight in DEFAULT_WEIGHTS.items()})
+    max_wait: float = DEFAULT_MAX_WAIT  # 0 = no aging
+    metrics_interval: float = DEFAULT_METRICS_INTERVAL  # 0 = never log metrics
+    supersede: list[Type] = field(default_factory=list)  # data types whose queued packets newer ones replace
+    max_packets: int = DEFAULT_MAX_PACKETS  # 0 = unlimited
+    max_bytes: int = DEFAULT_MAX_BYTES  # 0 = unlimited
+    drop_policies: dict[Priority, DropPolicy] = field(default_factory=lambda: {
+        Priority[name]: DropPolicy(policy) for name, policy in DEFAULT_DROP_POLICIES.items()})
+    backpressure_high: float = DEFAULT_BACKPRESSURE_HIGH
+    backpressure_low: float = DEFAULT_BACKPRESSURE_LOW
+
+    def weight(self, priority: Priority) -> float:
+        return self.weights.get(priority, 1.0)
+
+    def drop_policy(self, priority: Priority) -> DropPolicy:
+        return self.drop_policies.get(priority, DropPolicy.DROP_OLDEST)
+
+    @staticmethod
+    def from_settings(settings: dict | None) -> 'DownlinkConfig':
+        """ Builds a config from the optional `downlink` dict in the radio driver's settings
+
+        :param settings: the device's settings (may be None)
+        :return: the downlink config
+        """
+        downlink_settings = settings_section(settings, "downlink")
+        try:
+            try:
+                strict = [Priority[name] for name in downlink_settings.get("strict", DEFAULT_STRICT)]
+                weights = {Priority[name]: float(weight)
+                           for name, weight in downlink_settings.get("weights", DEFAULT_WEIGHTS).items()}
+            except KeyError as e:
+                raise ValueError(f"downlink priority {e} is not a Priority") from e
+            try:
+                supersede = [Type[name] for name in downlink_settings.get("supersede", [])]
+            except KeyError as e:
+                raise ValueError(f"downlink supersede type {e} is not a Type") from e
+            try:
+                drop_policy_settings = downlink_settings.get("drop_policy", DEFAULT_DROP_POLICIES)
+                drop_policies = {Priority[name]: DropPolicy(policy) for name, policy in drop_policy_settings.items()}
+            except KeyError as e:
+                raise ValueError(f"downlink drop_policy priority {e} is not a Priority") from e
+            config = DownlinkConfig(
+                rate=float(downlink_settings.get("rate", DEFAULT_RATE)),
+                burst=int(downlink_settings.get("burst", DEFAULT_BURST)),
+                frame_overhead=int(downlink_settings.get("frame_overhead", DEFAULT_FRAME_OVERHEAD)),
+                strict=strict,
+                weights=weights,
+                max_wait=float(downlink_settings.get("max_wait", DEFAULT_MAX_WAIT)),
+                metrics_interval=float(downlink_settings.get("metrics_interval", DEFAULT_METRICS_INTERVAL)),
+                supersede=supersede,
+                max_packets=int(downlink_settings.get("max_packets", DEFAULT_MAX_PACKETS)),
+                max_bytes=int(downlink_settings.get("max_bytes", DEFAULT_MAX_BYTES)),
+                drop_policies=drop_policies,
+                backpressure_high=float(downlink_settings.get("backpressure_high", DEFAULT_BACKPRESSURE_HIGH)),
+                backpressure_low=float(downlink_settings.get("backpressure_low", DEFAULT_BACKPRESSURE_LOW)),
+            )
+        except (TypeError, AttributeError) as e:
+            raise ValueError(f"invalid downlink settings: {e}") from e
+        if config.rate < 0 or config.burst < 1 or config.frame_overhead < 0:
+            raise ValueError("downlink rate and frame_overhead must be >= 0 and burst must be >= 1")
+        if any(weight <= 0 for weight in config.weights.values()):
+            raise ValueError("downlink weights must be > 0")
+        if config.max_wait < 0 or config.metrics_interval < 0:
+            raise ValueError("downlink max_wait and metrics_interval must be >= 0")
+        if any(data_type in NEVER_SUPERSEDE for data_type in config.supersede):
+            raise ValueError(f"downlink can't supersede commands or acks"
+                             f" ({', '.join(data_type.name for data_type in NEVER_SUPERSEDE)})")
+        if config.max_packets < 0 or config.max_bytes < 0:
+            raise ValueError("downlink max_packets and max_bytes must be >= 0")
+        if not 0 < config.backpressure_low < config.backpressure_high:
+            raise ValueError("downlink backpressure_low must be > 0 and below backpressure_high")
+        return config
+
+
+class TokenBucket:
+    """ Paces bytes to a rate, allowing bursts of up to `burst` bytes.  Not thread safe. """
+
+    def __init__(self, rate: float, burst: int, now: float):
+        """
+        :param rate: bytes/s, 0 for no limit
+        :param burst: the bucket size, in bytes
+        :param now: the current time.monotonic()
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = now
+
+    def delay(self, size: int, now: float) -> float:
+        """ :return: how many seconds until `size` bytes may be sent, 0 if they may be sent now.  A frame bigger than
+                     the bucket may be sent once the bucket is full.
+        """
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        return max(0.0, (min(size, self.burst) - self._tokens) / self.rate)
+
+    def consume(self, size: int, now: float) -> None:
+        """ Takes `size` bytes from the bucket.  It may go negative, so a frame bigger than the bucket delays the next
+        one and the average rate is kept.
+        """
+        if self.rate <= 0:
+            return
+        self._refill(now)
+        self._tokens -= size
+
+    def refund(self, size: int, now: float) -> None:
+        """ Returns `size` bytes that were consumed but not sent to the bucket, up to its size.  A negative size takes
+        bytes that were sent but not consumed.
+        """
+        if self.rate <= 0:
+            return
+        self._refill(now)
+        self._tokens = min(float(self.burst), self._tokens + size)
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(float(self.burst), self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+@dataclass
+class QueuedPacket:
+    packet: Packet
+    payload: bytes  # what goes on air
+    priority: Priority
+    enqueued: float  # time.monotonic()
+    finish: float = 0.0  # virtual finish time, for fair queuing
+    key: tuple[int, Type] | None = None  # (sender, data type), if newer packets may supersede it
+
+
+@dataclass
+class ClassMetrics:
+    """ Downlink metrics of one Priority class """
+    queued: int = 0
+    queued_bytes: int = 0
+    sent: int = 0
+    sent_bytes: int = 0
+    aged: int = 0  # sent ahead of its fair share because it waited longer than max_wait
+    superseded: int = 0  # replaced by a newer packet before they were sent
+    dropped: int = 0  # because the queue was full
+    total_wait: float = 0.0  # seconds, of the packets sent
+    max_wait: float = 0.0  # seconds, of the packets sent
+    throughput: float = 0.0  # bytes/s sent, since the scheduler was created
+
+    def __str__(self) -> str:
+        mean_wait = self.total_wait / self.sent if self.sent else 0.0
+        return f"{self.queued} queued ({self.queued_bytes} B), {self.sent} sent ({self.sent_bytes} B," \
+               f" {self.throughput:.1f} B/s, {self.aged} aged), {self.superseded} superseded, {self.dropped}" \
+               f" dropped, wait mean {mean_wait:.1f}s max {self.max_wait:.1f}s"
+
+
+class DownlinkScheduler:
+    """ The radio's transmit queue.  Thread safe: packets are put by the MQTT thread and taken by the transmit thread.
+    """
+
+    def __init__(self, config: DownlinkConfig):
+        """
+        :param config: the downlink config
+        """
+        self.config = config
+        self._condition = threading.Condition()
+        self._queues: dict[Priority, deque[QueuedPacket]] = {}
+        self._last_finish: dict[Priority, float] = {}
+        self._virtual_time = 0.0
+        self._started = time.monotonic()
+        self._bucket = TokenBucket(config.rate, config.burst, self._started)
+        self._metrics: dict[Priority, ClassMetrics] = {}
+        # (sender, data type) -> its queued packet, for the supersedable types
+        self._latest: dict[tuple[int, Type], QueuedPacket] = {}
+        self._backpressure = False
+
+    @property
+    def backpressure(self) -> bool:
+        """ Whether the queue is past its high water mark, and hasn't drained below its low water mark since """
+        with self._condition:
+            return self._backpressure
+
+    def fill(self) -> float:
+        """ :return: how full the queue is, as the larger of its packet and byte counts over their limits """
+        with self._condition:
+            return self._fill()
+
+    def put(self, packet: Packet, payload: bytes, priority: Priority) -> PutResult:
+        """ Queues a packet to be sent, dropping queued packets to make room for it if the queue is full (see the
+        drop policies).  Non-blocking.
+
+        :param packet: the packet
+        :param payload: its encoded form, which is what is sent
+        :param priority: its class
+        :return: whether it was queued, superseded a queued packet (which it replaced in the queue), or dropped
+        """
+        entry = QueuedPacket(packet, payload, priority, time.monotonic())
+        if priority not in self.config.strict and packet.data_header.data_type in self.config.supersede:
+            entry.key = (packet.data_header.sender, packet.data_header.data_type)
+        with self._condition:
+            previous = self._latest.get(entry.key) if entry.key is not None else None
+            if previous is not None and previous.priority == priority:
+                metrics = self._metrics[priority]
+                metrics.queued_bytes += len(payload) - len(previous.payload)
+                metrics.superseded += 1
+                previous.packet = packet
+                previous.payload = payload
+                return PutResult.SUPERSEDED
+            metrics = self._metrics.setdefault(priority, ClassMetrics())
+            if not self._make_room(priority, len(payload)) \
+                    and self.config.drop_policy(priority) != DropPolicy.NEVER_DROP:
+                metrics.dropped += 1
+                return PutResult.DROPPED
+            if entry.key is not None:
+                self._latest[entry.key] = entry
+            if priority not in self.config.strict:
+                entry.finish = max(self._virtual_time, self._last_finish.get(priority, 0.0)) \
+                    + len(payload) / self.config.weight(priority)
+                self._last_finish[priority] = entry.finish
+            self._queues.setdefault(priority, deque()).append(entry)
+            metrics.queued += 1
+            metrics.queued_bytes += len(payload)
+            self._update_backpressure()
+            self._condition.notify()
+            return PutResult.QUEUED
+
+    def get(self, timeout: float, max_size: int | None = None, overhead: int | None = None) -> QueuedPacket | None:
+        """ Waits until a packet is queued and the link has capacity for it, then takes it off the queue
+
+        :param timeout: the longest to wait, in seconds
+        :param max_size: if set, only take the next packet if its payload is at most this many bytes (eg to fill the
+                         rest of a frame).  Packets are never taken out of order.
+        :param overhead: the bytes sent along with the payload, counted against the rate (default the config's
+                         frame_overhead, for a packet sent in its own frame)
+        :return: the packet to send, or None if there was none to send within the timeout (or it was too big)
+        """
+        overhead = self.config.frame_overhead if overhead is None else overhead
+        now = time.monotonic()
+        deadline = now + timeout
+        with self._condition:
+            while True:
+                priority, aged = self._select(now)
+                wait = deadline - now
+                if priority is not None:
+                    entry = self._queues[priority][0]
+                    if max_size is not None and len(entry.payload) > max_size:
+                        return None
+                    delay = self._bucket.delay(len(entry.payload) + overhead, now)
+                    if delay <= 0:
+                        return self._take(priority, aged, overhead, now)
+                    wait = min(wait, delay)
+                if wait <= 0:
+                    return None
+                # re-selects on wakeup: a more urgent packet may have been queued meanwhile
+                self._condition.wait(wait)
+                now = time.monotonic()
+
+    def refund(self, priority: Priority, size: int) -> None:
+        """ Corrects the bytes a taken packet was charged when they changed after it was taken, eg because it was
+        compressed, so the link's capacity isn't wasted (or overrun)
+
+        :param priority: the packet's class
+        :param size: the bytes that weren't sent, or if negative, the extra bytes that were
+        """
+        if size == 0:
+            return
+        with self._condition:
+            self._bucket.refund(size, time.monotonic())
+            self._metrics[priority].sent_bytes -= size
+            self._condition.notify()
+
+    def metrics(self) -> dict[Priority, ClassMetrics]:
+        """ :return: a snapshot of each class's metrics """
+        with self._condition:
+            elapsed = max(time.monotonic() - self._started, 1e-9)
+            return {priority: replace(metrics, throughput=metrics.sent_bytes / elapsed)
+                    for priority, metrics in self._metrics.items()}
+
+    def __len__(self) -> int:
+        with self._condition:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def _select(self, now: float) -> tuple[Priority | None, bool]:
+        """ :return: the class whose head packet goes next (None if nothing is queued), and whether it was aged """
+        for priority in self.config.strict:
+            if self._queues.get(priority):
+                return priority, False
+        heads = [(priority, queue[0]) for priority, queue in self._queues.items() if queue]
+        if not heads:
+            return None, False
+        if self.config.max_wait:
+            priority, oldest = min(heads, key=lambda head: head[1].enqueued)
+            if now - oldest.enqueued >= self.config.max_wait:
+                return priority, True
+        return min(heads, key=lambda head: head[1].finish)[0], False
+
+    def _take(self, priority: Priority, aged: bool, overhead: int, now: float) -> QueuedPacket:
+        """ Removes the class's head packet and accounts for it.  Caller must hold self._condition. """
+        entry = self._queues[priority].popleft()
+        if entry.key is not None and self._latest.get(entry.key) is entry:
+            del self._latest[entry.key]
+        self._bucket.consume(len(entry.payload) + overhead, now)
+        if priority not in self.config.strict:
+            self._virtual_time = max(self._virtual_time, entry.finish)
+        wait = now - entry.enqueued
+        metrics = self._metrics[priority]
+        metrics.queued -= 1
+        metrics.queued_bytes -= len(entry.payload)
+        metrics.sent += 1
+        metrics.sent_bytes += len(entry.payload)
+        metrics.aged += aged
+        metrics.total_wait += wait
+        metrics.max_wait = max(metrics.max_wait, wait)
+        self._update_backpressure()
+        return entry
+
+    def _rank(self, priority: Priority) -> tuple[bool, float]:
+        """ :return: a key that sorts classes from least to most important """
+        return priority in self.config.strict, self.config.weight(priority)
+
+    def _fits(self, size: int, freed_packets: int = 0, freed_bytes: int = 0) -> bool:
+        """ :return: whether a packet of `size` bytes fits, if the given packets and bytes were freed first """
+        packets = sum(metrics.queued for metrics in self._metrics.values()) - freed_packets
+        queued_bytes = sum(metrics.queued_bytes for metrics in self._metrics.values()) - freed_bytes
+        return (not self.config.max_packets or packets + 1 <= self.config.max_packets) \
+            and (not self.config.max_bytes or queued_bytes + size <= self.config.max_bytes)
+
+    def _make_room(self, priority: Priority, size: int) -> bool:
+        """ Drops the oldest packets of the drop-oldest classes no more important than `priority`, least important
+        class first, until a packet of `size` bytes fits.  Drops nothing if that can't make enough room, unless the
+        class is never-drop.  Caller must hold self._condition.
+
+        :return: whether the packet fits
+        """
+        if self._fits(size):
+            return True
+        rank = self._rank(priority)
+        victims = sorted((victim for victim, queue in self._queues.items()
+                          if queue and self.config.drop_policy(victim) == DropPolicy.DROP_OLDEST
+                          and self._rank(victim) <= rank), key=self._rank)
+        if not self._fits(size, sum(self._metrics[victim].queued for victim in victims),
+                          sum(self._metrics[victim].queued_bytes for victim in victims)) \
+                and self.config.drop_policy(priority) != DropPolicy.NEVER_DROP:
+            return False
+        for victim in victims:
+            queue = self._queues[victim]
+            while queue and not self._fits(size):
+                entry = queue.popleft()
+                if entry.key is not None and self._latest.get(entry.key) is entry:
+                    del self._latest[entry.key]
+                metrics = self._metrics[victim]
+                metrics.queued -= 1
+                metrics.queued_bytes -= len(entry.payload)
+                metrics.dropped += 1
+        return self._fits(size)
+
+    def _fill(self) -> float:
+        fill = 0.0
+        if self.config.max_packets:
+            fill = sum(metrics.queued for metrics in self._metrics.values()) / self.config.max_packets
+        if self.config.max_bytes:
+            fill = max(fill, sum(metrics.queued_bytes for metrics in self._metrics.values()) / self.config.max_bytes)
+        return fill
+
+    def _update_backpressure(self) -> None:
+        fill = self._fill()
+        if not self._backpressure and fill >= self.config.backpressure_high:
+            self._backpressure = True
+        elif self._backpressure and fill <= self.config.backpressure_low:
+            self._backpressure = False
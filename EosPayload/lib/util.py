@@ -13,3 +13,23 @@ def validate_process_name(name: str) -> bool:
     :return true if valid, false otherwise
     """
     return name.isascii() and name.replace("-", "").isalnum() and name.lower() == name
+
+
+def settings_section(settings: dict | None, name: str) -> dict:
+    """ Gets an optional dict of settings, eg the `restart` dict in a device's settings
+
+    :param settings: the dict that may contain the section (may be None)
+    :param name: the section's key
+    :return: the section, or an empty dict if it is missing or null
+    :raises ValueError: if the settings or the section aren't a dict
+    """
+    if settings is None:
+        return {}
+    if not isinstance(settings, dict):
+        raise ValueError(f"settings must be a dict, not {type(settings).__name__}")
+    section = settings.get(name)
+    if section is None:
+        return {}
+    if not isinstance(section, dict):
+        raise ValueError(f"{name} settings must be a dict, not {type(section).__name__}")
+    return section
@@ -0,0 +1,100 @@
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from EosPayload.lib.data_log import DataLogConfig
+from EosPayload.lib.data_log.buffered_writer import BufferedDataWriter
+from EosPayload.lib.data_log.writer_thread import DataWriterThread
+
+# Compares the original flush-per-row data_log behavior with buffered data logging, both written inline and via the
+# data writer thread that DriverBase uses.  For the writer thread, rows/s is measured on the producer side (the cost
+# seen by a driver calling data_log) and syscalls include draining the queue on close.
+# Write syscalls are read from /proc/self/io, so syscall counts are only available on Linux.
+#
+# example usage:
+# python scripts/benchmark_data_log.py -n 20000
+
+
+def write_syscalls() -> int | None:
+    """ :return: the number of write syscalls made by this process so far, or None if unavailable """
+    try:
+        with open('/proc/self/io') as io_file:
+            for line in io_file:
+                if line.startswith('syscw:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def make_row(i: int) -> str:
+    return ','.join([datetime.now().isoformat(), str(i), str(i * 0.5), str(i * 1.5)]) + "\n"
+
+
+def bench_flush_per_row(path: str, rows: int) -> tuple[float, int | None]:
+    data_file = open(path, 'a')
+    start_syscalls = write_syscalls()
+    start = time.perf_counter()
+    for i in range(rows):
+        data_file.write(make_row(i))
+        data_file.flush()
+    elapsed = time.perf_counter() - start
+    end_syscalls = write_syscalls()
+    data_file.close()
+    return elapsed, None if start_syscalls is None else end_syscalls - start_syscalls
+
+
+def bench_buffered(path: str, rows: int, config: DataLogConfig) -> tuple[float, int | None]:
+    writer = BufferedDataWriter(open(path, 'a'), config)
+    start_syscalls = write_syscalls()
+    start = time.perf_counter()
+    for i in range(rows):
+        writer.write(make_row(i))
+    writer.close()
+    elapsed = time.perf_counter() - start
+    end_syscalls = write_syscalls()
+    return elapsed, None if start_syscalls is None else end_syscalls - start_syscalls
+
+
+def bench_writer_thread(path: str, rows: int, config: DataLogConfig) -> tuple[float, int | None]:
+    writer = DataWriterThread('bench-data-writer', BufferedDataWriter(open(path, 'a'), config), config,
+                              logging.getLogger('bench'))
+    writer.start()
+    start_syscalls = write_syscalls()
+    start = time.perf_counter()
+    for i in range(rows):
+        writer.put(make_row(i))
+    elapsed = time.perf_counter() - start
+    writer.close()
+    end_syscalls = write_syscalls()
+    dropped = writer.stats().dropped
+    if dropped:
+        print(f"writer thread dropped {dropped} rows (raise --queue-capacity)")
+    return elapsed, None if start_syscalls is None else end_syscalls - start_syscalls
+
+
+def report(name: str, rows: int, elapsed: float, syscalls: int | None) -> None:
+    syscalls_per_row = "n/a" if syscalls is None else f"{syscalls / rows:.4f}"
+    print(f"{name:<16} {rows / elapsed:>12.0f} rows/s {syscalls_per_row:>10} write syscalls/row")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--rows', type=int, default=20000)
+    parser.add_argument('--flush-rows', type=int, default=256)
+    parser.add_argument('--flush-bytes', type=int, default=64 * 1024)
+    parser.add_argument('--flush-interval', type=float, default=2.0)
+    parser.add_argument('--queue-capacity', type=int, default=1 << 20)
+    args = parser.parse_args()
+
+    buffered_config = DataLogConfig(True, args.flush_rows, args.flush_bytes, args.flush_interval, args.queue_capacity)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        report("flush-per-row", args.rows, *bench_flush_per_row(os.path.join(tmp_dir, 'before.dat'), args.rows))
+        report("buffered", args.rows, *bench_buffered(os.path.join(tmp_dir, 'after.dat'), args.rows, buffered_config))
+        report("writer-thread", args.rows,
+               *bench_writer_thread(os.path.join(tmp_dir, 'thread.dat'), args.rows, buffered_config))
@@ -0,0 +1,68 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from importlib import import_module
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# Measures what discovering drivers costs OrchEOStrator, each scenario in a fresh interpreter:
+#   eager    import every module in EosPayload/drivers (how drivers were discovered before the registry)
+#   registry scan the drivers package source without importing any driver
+#   enabled  scan, then import only the drivers enabled in the config file (what each driver process does for itself)
+# Reports wall time, how many modules ended up imported, and which driver modules failed to import (eg because a
+# hardware library isn't installed on this machine).
+#
+# example usage:
+# python scripts/benchmark_driver_import.py -c config.json
+
+SCENARIOS = ['eager', 'registry', 'enabled']
+
+
+def run_scenario(scenario: str, config_filepath: str) -> dict:
+    modules_before = len(sys.modules)
+    failures = []
+    start = time.perf_counter()
+    if scenario == 'eager':
+        from EosPayload.lib.driver_registry import DRIVERS_DIR, DRIVERS_PACKAGE
+        for file_name in sorted(os.listdir(DRIVERS_DIR)):
+            if file_name.endswith('.py') and file_name != '__init__.py':
+                try:
+                    import_module(f"{DRIVERS_PACKAGE}.{file_name[:-3]}")
+                except Exception as e:
+                    failures.append(f"{file_name[:-3]} ({type(e).__name__})")
+    else:
+        from EosPayload import drivers
+        from EosPayload.lib.driver_registry import load_driver_class
+        registry = drivers.get_registry()
+        if scenario == 'enabled':
+            with open(config_filepath) as config_file:
+                devices = json.load(config_file)["devices"]
+            for device in devices:
+                driver = registry.get(device.get("driver_class"))
+                if device.get("enabled") and driver is not None:
+                    try:
+                        load_driver_class(driver)
+                    except Exception as e:
+                        failures.append(f"{driver.module.rsplit('.', 1)[-1]} ({type(e).__name__})")
+    elapsed = time.perf_counter() - start
+    return {'time': elapsed, 'modules': len(sys.modules) - modules_before, 'failures': failures}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-c', '--config-filepath', default='config.json')
+    parser.add_argument('--scenario', choices=SCENARIOS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        print(json.dumps(run_scenario(args.scenario, args.config_filepath)))
+        sys.exit(0)
+
+    for scenario in SCENARIOS:
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--scenario', scenario,
+                                 '-c', args.config_filepath], capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.splitlines()[-1])
+        print(f"{scenario:<10} {result['time'] * 1000:>9.1f} ms   {result['modules']:>5} modules imported"
+              + (f"   failed: {', '.join(result['failures'])}" if result['failures'] else ""))
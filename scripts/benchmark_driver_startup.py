@@ -0,0 +1,120 @@
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from EosPayload.lib.orcheostrator.spawn import DEFAULT_PRELOAD_MODULES
+
+# Starts processes the way OrchEOStrator starts drivers (one per driver, each importing its modules and then reporting
+# ready over a pipe) with each start method, and reports the wall time until every process is ready, each process's
+# startup time, and its RSS and PSS (proportional set size, which splits pages shared copy-on-write between the
+# processes sharing them).  Each scenario runs in a fresh interpreter so imports don't leak between them.
+#
+# example usage:
+# python scripts/benchmark_driver_startup.py -n 11
+# python scripts/benchmark_driver_startup.py -n 11 -m EosPayload.drivers.GPS_driver EosPayload.drivers.camera_driver
+
+SCENARIOS = {
+    'fork': ('fork', False),
+    'spawn': ('spawn', False),
+    'forkserver': ('forkserver', False),
+    'forkserver+preload': ('forkserver', True),
+}
+
+
+def fake_driver(modules: list[str], connection) -> None:
+    for module in modules:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass
+    connection.send(time.monotonic())
+    connection.recv()  # stay alive until the parent has measured memory
+
+
+def memory_kb(pid: int) -> tuple[int, int]:
+    """ :return: (RSS, PSS) of the process in kB """
+    rss = pss = 0
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                rss = int(line.split()[1])
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as smaps:
+            for line in smaps:
+                if line.startswith('Pss:'):
+                    pss = int(line.split()[1])
+    except OSError:
+        pass
+    return rss, pss
+
+
+def run_scenario(name: str, drivers: int, modules: list[str]) -> dict:
+    method, preload = SCENARIOS[name]
+    context = multiprocessing.get_context(method)
+    if method == 'fork':
+        # OrchEOStrator has the common modules imported by the time it forks
+        for module in DEFAULT_PRELOAD_MODULES:
+            try:
+                importlib.import_module(module)
+            except ImportError:
+                pass
+    if preload:
+        context.set_forkserver_preload(DEFAULT_PRELOAD_MODULES + modules)
+
+    start = time.monotonic()
+    processes = []
+    for _ in range(drivers):
+        parent_end, child_end = context.Pipe()
+        process = context.Process(target=fake_driver, args=(modules, child_end), daemon=True)
+        process_start = time.monotonic()
+        process.start()
+        processes.append((process, parent_end, process_start))
+
+    startup_times = []
+    for _, parent_end, process_start in processes:
+        startup_times.append(parent_end.recv() - process_start)
+    wall_time = time.monotonic() - start
+
+    memory = [memory_kb(process.pid) for process, _, _ in processes]
+    for process, parent_end, _ in processes:
+        parent_end.send(None)
+        process.join()
+    return {
+        'wall_time': wall_time,
+        'startup_times': startup_times,
+        'rss_kb': [rss for rss, _ in memory],
+        'pss_kb': [pss for _, pss in memory],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--drivers', type=int, default=11)
+    parser.add_argument('-m', '--modules', nargs='*', default=[],
+                        help="modules each driver imports, in addition to the common ones")
+    parser.add_argument('--scenario', choices=SCENARIOS.keys(), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    modules = DEFAULT_PRELOAD_MODULES + args.modules
+
+    if args.scenario:
+        print(json.dumps(run_scenario(args.scenario, args.drivers, modules)))
+        sys.exit(0)
+
+    print(f"{args.drivers} drivers, each importing: {', '.join(modules)}")
+    for scenario in SCENARIOS:
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--scenario', scenario,
+                                 '-n', str(args.drivers), '-m', *args.modules],
+                                capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.splitlines()[-1])
+        print(f"{scenario:<20} wall {result['wall_time']:>6.2f} s"
+              f"   startup median {statistics.median(result['startup_times']) * 1000:>7.1f} ms"
+              f"   max {max(result['startup_times']) * 1000:>7.1f} ms"
+              f"   RSS mean {statistics.mean(result['rss_kb']) / 1024:>6.1f} MiB"
+              f"   PSS mean {statistics.mean(result['pss_kb']) / 1024:>6.1f} MiB")
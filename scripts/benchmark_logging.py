@@ -0,0 +1,54 @@
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from EosPayload.lib.logger import LoggingConfig, init_logging, shutdown_logging
+
+# Measures the latency of a logger.info() call as seen by the calling thread, with synchronous logging and with the
+# queued logging mode.  Console output is sent to /dev/null so the terminal doesn't skew the results.
+#
+# example usage:
+# python scripts/benchmark_logging.py -n 20000
+
+
+def bench(log_filename: str, config: LoggingConfig, calls: int) -> list[float]:
+    init_logging(log_filename, config)
+    logger = logging.getLogger('benchmark.thread-device-read')
+    latencies = []
+    for i in range(calls):
+        start = time.perf_counter()
+        logger.info(f"Enqueuing packet seq={i % 256}")
+        latencies.append(time.perf_counter() - start)
+    shutdown_logging()
+    return latencies
+
+
+def report(name: str, latencies: list[float]) -> None:
+    latencies_us = sorted(latency * 1e6 for latency in latencies)
+    p99 = latencies_us[int(len(latencies_us) * 0.99)]
+    print(f"{name:<12} mean {statistics.mean(latencies_us):>8.2f} us   median {statistics.median(latencies_us):>8.2f} us"
+          f"   p99 {p99:>8.2f} us   max {latencies_us[-1]:>10.2f} us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--calls', type=int, default=20000)
+    args = parser.parse_args()
+
+    real_stderr = sys.stderr
+    sys.stderr = open(os.devnull, 'w')
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            sync_latencies = bench(os.path.join(tmp_dir, 'sync.log'), LoggingConfig(queued=False), args.calls)
+            queued_latencies = bench(os.path.join(tmp_dir, 'queued.log'), LoggingConfig(queued=True), args.calls)
+    finally:
+        sys.stderr.close()
+        sys.stderr = real_stderr
+
+    report("synchronous", sync_latencies)
+    report("queued", queued_latencies)
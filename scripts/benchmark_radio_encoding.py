@@ -0,0 +1,162 @@
+import argparse
+import io
+import os
+import sys
+from datetime import datetime
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from EosLib.device import Device
+from EosLib.format.definitions import Type
+from EosLib.format.formats.position import FlightState, Position
+from EosLib.format.formats.science_data import ScienceData
+from EosLib.format.formats.telemetry_data import TelemetryData
+from EosLib.packet import Packet
+from EosLib.packet.data_header import DataHeader
+from EosLib.packet.definitions import Priority
+
+from EosPayload.lib.data_log.binary_format import MAGIC, read_header
+from EosPayload.lib.data_log.rotation import open_segment
+from EosPayload.lib.radio.encoding import DEFAULT_DICTIONARY_SIZE, DEFAULT_KEYFRAME_INTERVAL, DeltaDecoder, \
+    DeltaEncoder, EncodingConfig, build_dictionary, load_dictionary
+from EosPayload.lib.radio.scheduler import DEFAULT_FRAME_OVERHEAD
+
+# Replays recorded driver data files through the radio's delta encoding (see EosPayload.lib.radio.encoding) and reports
+# the bytes on air it saves, per file and per data type.  Each record of a data file (a record of a binary data file,
+# whose segments may be compressed, or a line of a CSV data file) is rebuilt into the packet its driver sent: a
+# Position from the GPS driver, ScienceData from the science driver, or TelemetryData from the telemetry driver, with
+# the sender and priority those drivers use, encoded with Packet.encode().  Each packet is compared sent raw, deflated on
+# its own, and delta encoded, and counted with the XBee's per-frame overhead.  Every delta encoded packet is decoded
+# again to check it round trips.
+#
+# A dictionary trained on the same files it is measured on overstates its benefit: train it on an earlier flight with
+# --write-dictionary, then pass it with --dictionary.
+#
+# example usage:
+# python scripts/benchmark_radio_encoding.py eos_artifacts/data/gps-driver-002.dat:POSITION \
+#     eos_artifacts/data/science-driver-011.dat:SCIENCE_DATA
+# python scripts/benchmark_radio_encoding.py old_flight/*.dat --write-dictionary radio.dict
+
+
+# the sender and priority of each data type's packets, as the drivers that log them send them (see config.json)
+SENDERS = {
+    Type.POSITION: (Device.GPS, Priority.TELEMETRY),
+    Type.SCIENCE_DATA: (Device.MISC_SENSOR_1, Priority.DATA),
+    Type.TELEMETRY_DATA: (Device.MISC_SENSOR_2, Priority.TELEMETRY),
+}
+
+
+def position(values: list) -> Position:
+    """ :return: the position the GPS driver sent with a data log row: time, latitude, longitude, altitude, speed,
+    satellites
+    """
+    gps_time, latitude, longitude, altitude, speed, satellites = (float(value) for value in values)
+    return Position(datetime.fromtimestamp(gps_time), latitude, longitude, altitude, speed, int(satellites),
+                    FlightState.UNKNOWN)
+
+
+def telemetry_data(values: list) -> TelemetryData:
+    """ :return: the telemetry the telemetry driver sent with a data log row: temperature, x, y and z rotation """
+    temperature, x_rotation, y_rotation, z_rotation = (float(value) for value in values)
+    # pressure and humidity aren't logged
+    return TelemetryData(temperature, 0.0, 0.0, x_rotation, y_rotation, z_rotation)
+
+
+def read_packets(path: str, data_type: Type) -> list[bytes]:
+    """ Rebuilds the packets a driver sent from its data file
+
+    :param path: a binary or CSV data file
+    :param data_type: the data type of the driver's packets
+    :return: the encoded packets, one per record
+    """
+    with open_segment(path) as data_file:
+        data = data_file.read()
+    if data.startswith(MAGIC):
+        if data_type == Type.SCIENCE_DATA:
+            raise ValueError(f"{path}: science data is only logged as CSV")
+        schema, data_offset = read_header(io.BytesIO(data))
+        rows = [record[1:] for record in schema.unpack_all(data[data_offset:])]  # without the timestamp
+    else:
+        rows = [line for line in data.decode().splitlines() if line.strip()]
+        if data_type != Type.SCIENCE_DATA:
+            rows = [row.split(',')[1:] for row in rows]  # without the timestamp data_log() prepends
+    if data_type == Type.POSITION:
+        bodies = [position(row) for row in rows]
+    elif data_type == Type.SCIENCE_DATA:
+        bodies = [ScienceData.decode_from_csv(row) for row in rows]  # the science driver logs encode_to_csv() rows
+    else:
+        bodies = [telemetry_data(row) for row in rows]
+    sender, priority = SENDERS[data_type]
+    return [Packet(body, DataHeader(sender, data_type, priority)).encode() for body in bodies]
+
+
+def on_air(size: int) -> int:
+    return size + DEFAULT_FRAME_OVERHEAD
+
+
+def replay(packets: list[bytes], data_type: Type, keyframe_interval: int, dictionary: bytes | None) -> int:
+    """ :return: the bytes on air of the packets, delta encoded with the given keyframe interval """
+    config = EncodingConfig(enabled=True, types=[data_type], keyframe_interval=keyframe_interval)
+    encoder = DeltaEncoder(config, dictionary)
+    decoder = DeltaDecoder(dictionary)
+    sender, _ = SENDERS[data_type]
+    total = 0
+    for i, packet in enumerate(packets):
+        frame = encoder.encode(sender, data_type, packet, float(i))
+        if decoder.decode(frame) != packet:
+            raise Exception(f"packet {i} didn't round trip")
+        total += on_air(len(frame))
+    return total
+
+
+def saved(raw: int, encoded: int) -> str:
+    return f"{1 - encoded / raw:.1%}" if raw else "-"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('data_files', nargs='+', metavar='data_file[:TYPE]',
+                        help="a data file, and the data type of its packets: POSITION, SCIENCE_DATA or"
+                             " TELEMETRY_DATA (default)")
+    parser.add_argument('-k', '--keyframe-interval', type=int, default=DEFAULT_KEYFRAME_INTERVAL)
+    parser.add_argument('-d', '--dictionary', required=False, help="a preset dictionary to compress with")
+    parser.add_argument('-w', '--write-dictionary', required=False,
+                        help="train a dictionary on the data files and write it here instead of benchmarking")
+    parser.add_argument('--dictionary-size', type=int, default=DEFAULT_DICTIONARY_SIZE)
+    args = parser.parse_args()
+
+    files = []
+    for arg in args.data_files:
+        path, _, type_name = arg.partition(':')
+        data_type = Type[type_name or 'TELEMETRY_DATA']
+        if data_type not in SENDERS:
+            parser.error(f"can't rebuild {data_type.name} packets from a data file")
+        files.append((path, data_type, read_packets(path, data_type)))
+
+    if args.write_dictionary:
+        # an equal share of the most recent packets of each file
+        share = args.dictionary_size // len(files)
+        dictionary = b''.join(build_dictionary(packets, share) for _, _, packets in files)
+        with open(args.write_dictionary, 'wb') as dictionary_file:
+            dictionary_file.write(dictionary)
+        print(f"wrote a {len(dictionary)} byte dictionary to {args.write_dictionary}")
+        sys.exit(0)
+
+    dictionary = load_dictionary(args.dictionary)
+    print(f"{'file':<40} {'type':<16} {'packets':>8} {'raw B':>10} {'deflate B':>10} {'saved':>7}"
+          f" {'delta B':>10} {'saved':>7}")
+    totals: dict[Type, list[int]] = {}
+    for path, data_type, packets in files:
+        raw = sum(on_air(len(packet)) for packet in packets)
+        deflated = replay(packets, data_type, 1, dictionary)  # every packet a keyframe: compression alone
+        delta = replay(packets, data_type, args.keyframe_interval, dictionary)
+        print(f"{os.path.basename(path):<40} {data_type.name:<16} {len(packets):>8} {raw:>10} {deflated:>10}"
+              f" {saved(raw, deflated):>7} {delta:>10} {saved(raw, delta):>7}")
+        type_totals = totals.setdefault(data_type, [0, 0, 0, 0])
+        for i, value in enumerate((len(packets), raw, deflated, delta)):
+            type_totals[i] += value
+
+    print()
+    print(f"{'type':<16} {'packets':>8} {'raw B':>10} {'deflate B':>10} {'saved':>7} {'delta B':>10} {'saved':>7}")
+    for data_type, (packets, raw, deflated, delta) in totals.items():
+        print(f"{data_type.name:<16} {packets:>8} {raw:>10} {deflated:>10} {saved(raw, deflated):>7} {delta:>10}"
+              f" {saved(raw, delta):>7}")
@@ -0,0 +1,122 @@
+import argparse
+import logging
+import os
+import statistics
+import struct
+import sys
+import tempfile
+import threading
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import paho.mqtt.client as mosquitto
+
+from EosPayload.lib.mqtt import MQTT_HOST, QOS, Topic
+from EosPayload.lib.mqtt.local_transport import LocalBus, LocalTransport
+
+# Compares the local bus with MQTT (mosquitto) for an intra-payload topic: one-way latency of single messages, and
+# throughput of a burst of messages.  Publisher and subscriber use separate connections, as two drivers would.  The
+# MQTT run is skipped if no broker is reachable.
+#
+# example usage:
+# python scripts/benchmark_transport.py -n 5000 -s 64
+
+TOPIC = Topic.HEALTH_HEARTBEAT.value
+TIMESTAMP = struct.Struct('<q')
+
+
+class Receiver:
+    """ Records the latency of every message received, and signals once the expected number has arrived """
+
+    def __init__(self):
+        self.latencies = []
+        self.expected = 0
+        self.done = threading.Event()
+
+    def reset(self, expected: int) -> None:
+        self.latencies = []
+        self.expected = expected
+        self.done.clear()
+
+    def receive(self, payload: bytes) -> None:
+        (sent_ns,) = TIMESTAMP.unpack_from(payload)
+        self.latencies.append(time.perf_counter_ns() - sent_ns)
+        if len(self.latencies) >= self.expected:
+            self.done.set()
+
+
+def run(publish, receiver: Receiver, messages: int, size: int) -> tuple[list[int], float, int]:
+    """ :return: (one-way latencies in ns, burst throughput in messages/s, messages lost in the burst) """
+    padding = b'\x00' * max(0, size - TIMESTAMP.size)
+
+    latencies = []
+    for _ in range(messages):
+        receiver.reset(1)
+        publish(TIMESTAMP.pack(time.perf_counter_ns()) + padding)
+        if receiver.done.wait(1):
+            latencies.extend(receiver.latencies)
+
+    receiver.reset(messages)
+    start = time.perf_counter()
+    for _ in range(messages):
+        publish(TIMESTAMP.pack(time.perf_counter_ns()) + padding)
+    receiver.done.wait(10)
+    elapsed = time.perf_counter() - start
+    return latencies, len(receiver.latencies) / elapsed, messages - len(receiver.latencies)
+
+
+def bench_local(messages: int, size: int) -> tuple[list[int], float, int]:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        bus = LocalBus(logging.getLogger('benchmark'), os.path.join(tmp_dir, 'bus.sock'))
+        bus.start()
+        receiver = Receiver()
+        subscriber = LocalTransport(bus.path, [TOPIC], lambda _topic, payload: receiver.receive(payload))
+        subscriber.subscribe(TOPIC)
+        publisher = LocalTransport(bus.path, [TOPIC], lambda _topic, _payload: None)
+        time.sleep(0.1)  # let the bus process the subscription
+        try:
+            return run(lambda payload: publisher.publish(TOPIC, payload), receiver, messages, size)
+        finally:
+            publisher.close()
+            subscriber.close()
+            bus.close()
+
+
+def bench_mqtt(messages: int, size: int) -> tuple[list[int], float, int]:
+    receiver = Receiver()
+    subscriber = mosquitto.Client(protocol=mosquitto.MQTTv5)
+    subscriber.on_message = lambda _client, _user_data, message: receiver.receive(message.payload)
+    publisher = mosquitto.Client(protocol=mosquitto.MQTTv5)
+    subscriber.connect(MQTT_HOST)
+    publisher.connect(MQTT_HOST)
+    subscriber.loop_start()
+    publisher.loop_start()
+    subscriber.subscribe(TOPIC, QOS.DELIVER_AT_MOST_ONCE)
+    time.sleep(0.5)  # let the broker process the subscription
+    try:
+        return run(lambda payload: publisher.publish(TOPIC, payload, QOS.DELIVER_AT_MOST_ONCE), receiver, messages,
+                   size)
+    finally:
+        for client in (publisher, subscriber):
+            client.loop_stop()
+            client.disconnect()
+
+
+def report(name: str, latencies: list[int], throughput: float, lost: int) -> None:
+    latencies_us = sorted(latency / 1000 for latency in latencies)
+    p99 = latencies_us[int(len(latencies_us) * 0.99)]
+    print(f"{name:<10} latency median {statistics.median(latencies_us):>8.1f} us   p99 {p99:>8.1f} us"
+          f"   throughput {throughput:>10.0f} msg/s   lost {lost}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--messages', type=int, default=5000)
+    parser.add_argument('-s', '--size', type=int, default=64, help="payload size in bytes")
+    args = parser.parse_args()
+
+    report("local bus", *bench_local(args.messages, args.size))
+    try:
+        report("mqtt", *bench_mqtt(args.messages, args.size))
+    except OSError as e:
+        print(f"mqtt       skipped, broker not reachable at {MQTT_HOST}: {e}")
@@ -0,0 +1,21 @@
+import argparse
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from EosPayload.lib.data_log.binary_format import binary_to_csv
+
+# Converts a binary driver data file (see EosPayload.lib.data_log.binary_format) back to CSV.
+# To load a binary data file for analysis instead, use read_binary_data_file() from the same module.
+#
+# example usage:
+# python scripts/convert_data_file.py eos_artifacts/data/gps-driver-002.dat -o gps-driver-002.csv
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('data_file')
+    parser.add_argument('-o', '--output', required=False)
+    args = parser.parse_args()
+
+    output = args.output if args.output else os.path.splitext(args.data_file)[0] + '.csv'
+    rows = binary_to_csv(args.data_file, output)
+    print(f"wrote {rows} rows to {output}")
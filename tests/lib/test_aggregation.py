@@ -0,0 +1,48 @@
+import pytest
+
+from EosPayload.lib.radio.aggregation import AGGREGATE_MAGIC, AggregationConfig, aggregate_size, encode_frame, \
+    max_subframe_payload, split_frame
+
+
+def test_single_packet_is_sent_as_is():
+    assert encode_frame([b'packet']) == b'packet'
+    assert split_frame(b'packet') == [b'packet']
+
+
+def test_round_trip():
+    payloads = [b'a', b'bb' * 10, bytes(255), AGGREGATE_MAGIC + b'nested']
+
+    frame = encode_frame(payloads)
+
+    assert frame.startswith(AGGREGATE_MAGIC)
+    assert len(frame) == aggregate_size(payloads)
+    assert split_frame(frame) == payloads
+
+
+def test_packets_too_big_to_aggregate():
+    with pytest.raises(ValueError):
+        encode_frame([b'a', bytes(256)])
+    assert max_subframe_payload(256) == 253
+    assert max_subframe_payload(1024) == 255
+
+
+@pytest.mark.parametrize("frame", [
+    AGGREGATE_MAGIC,  # no sub-frames
+    AGGREGATE_MAGIC + b'\x01a',  # a single sub-frame
+    AGGREGATE_MAGIC + b'\x01a\x05bc',  # truncated sub-frame
+    AGGREGATE_MAGIC + b'\x01a\x00',  # empty sub-frame
+    AGGREGATE_MAGIC + b'\x01a\x01',  # length without a packet
+])
+def test_malformed_aggregate_passes_through(frame):
+    assert split_frame(frame) == [frame]
+
+
+def test_config_from_settings():
+    config = AggregationConfig.from_settings({"aggregation": {"enabled": True, "max_frame": 100}})
+
+    assert config.enabled
+    assert config.max_frame == 100
+    with pytest.raises(ValueError):
+        AggregationConfig.from_settings({"aggregation": {"window": -1}})
+    with pytest.raises(ValueError):
+        AggregationConfig.from_settings({"aggregation": {"max_frame": 5}})
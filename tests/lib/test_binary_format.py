@@ -0,0 +1,156 @@
+import json
+import logging
+import math
+import os
+from datetime import datetime
+
+import pytest
+
+from EosPayload.lib.data_log import Compression
+from EosPayload.lib.data_log.binary_format import MAGIC, DataLogSchema, binary_to_csv, open_binary_data_file, \
+    read_binary_data_file, read_header
+from EosPayload.lib.data_log.rotation import RotatingDataFile, open_segment
+
+SCHEMA = DataLogSchema([('latitude', 'd'), ('altitude_m', 'f'), ('satellites', 'B'), ('fix', '?')])
+RECORDS = [(1_700_000_000_000_000_000 + i * 1_000_000_000, [33.7756 + i, 300.5 + i, i, i % 2 == 0]) for i in range(5)]
+
+
+def write_data_file(path: str, schema: DataLogSchema = SCHEMA, records=RECORDS) -> str:
+    file, actual_path = open_binary_data_file(path, schema)
+    with file:
+        for timestamp_ns, values in records:
+            file.write(schema.pack(timestamp_ns, values))
+    return actual_path
+
+
+def test_pack_unpack_round_trip():
+    data = b''.join(SCHEMA.pack(timestamp_ns, values) for timestamp_ns, values in RECORDS)
+
+    records = list(SCHEMA.unpack_all(data))
+
+    assert len(data) == len(RECORDS) * SCHEMA.record_size
+    assert [record[0] for record in records] == [timestamp_ns for timestamp_ns, _ in RECORDS]
+    for record, (_, values) in zip(records, RECORDS):
+        assert record[1] == values[0]
+        assert record[2] == pytest.approx(values[1])  # float32
+        assert record[3:] == tuple(values[2:])
+
+
+def test_unpack_ignores_partial_record():
+    data = b''.join(SCHEMA.pack(timestamp_ns, values) for timestamp_ns, values in RECORDS)
+
+    assert len(list(SCHEMA.unpack_all(data[:-1]))) == len(RECORDS) - 1
+
+
+def test_pack_none_values():
+    (record,) = SCHEMA.unpack_all(SCHEMA.pack(0, [None, None, None, None]))
+
+    assert math.isnan(record[1]) and math.isnan(record[2])
+    assert record[3:] == (0, False)
+
+
+def test_invalid_schema_and_values():
+    with pytest.raises(ValueError):
+        DataLogSchema([('a', 'd'), ('a', 'd')])
+    with pytest.raises(ValueError):
+        DataLogSchema([('timestamp_ns', 'q')])
+    with pytest.raises(ValueError):
+        DataLogSchema([('a', 's')])
+    with pytest.raises(ValueError):
+        SCHEMA.pack(0, [1.0])
+
+
+def test_header_round_trip(tmp_path):
+    path = write_data_file(str(tmp_path / "gps.dat"))
+
+    with open(path, 'rb') as file:
+        schema, data_offset = read_header(file)
+
+    assert schema == SCHEMA
+    assert os.path.getsize(path) == data_offset + len(RECORDS) * SCHEMA.record_size
+
+
+def test_read_header_rejects_other_files(tmp_path):
+    path = tmp_path / "other.dat"
+    path.write_bytes(b"not a data file")
+    with open(path, 'rb') as file, pytest.raises(ValueError):
+        read_header(file)
+
+    header = json.dumps({"version": 99, "fields": []}).encode()
+    path.write_bytes(MAGIC + len(header).to_bytes(4, 'little') + header)
+    with open(path, 'rb') as file, pytest.raises(ValueError):
+        read_header(file)
+
+
+def test_reopen_truncates_partial_record(tmp_path):
+    path = write_data_file(str(tmp_path / "gps.dat"))
+    with open(path, 'ab') as file:
+        file.write(b'\x01\x02\x03')  # a record cut short by a power loss
+
+    assert write_data_file(path, records=RECORDS[:1]) == path
+    with open(path, 'rb') as file:
+        schema, data_offset = read_header(file)
+        records = list(schema.unpack_all(file.read()))
+
+    assert len(records) == len(RECORDS) + 1
+    assert records[-1][0] == RECORDS[0][0]
+
+
+def test_reopen_with_a_different_schema_uses_a_new_file(tmp_path):
+    path = write_data_file(str(tmp_path / "gps.dat"))
+    other_schema = DataLogSchema([('voltage', 'd')])
+
+    other_path = write_data_file(path, other_schema, [(0, [1.5])])
+
+    assert other_path == str(tmp_path / "gps.1.dat")
+    with open(path, 'rb') as file:
+        assert read_header(file)[0] == SCHEMA
+
+
+def test_binary_to_csv(tmp_path):
+    path = write_data_file(str(tmp_path / "gps.dat"))
+    csv_path = str(tmp_path / "gps.csv")
+
+    assert binary_to_csv(path, csv_path) == len(RECORDS)
+    with open(csv_path) as csv_file:
+        rows = [line.rstrip("\n").split(",") for line in csv_file]
+
+    assert len(rows) == len(RECORDS)
+    timestamp_ns, values = RECORDS[1]
+    assert rows[1][0] == datetime.fromtimestamp(timestamp_ns / 1e9).isoformat()
+    assert float(rows[1][1]) == values[0]
+    assert rows[1][3:] == ["1", "False"]
+
+
+def test_read_binary_data_file(tmp_path):
+    pytest.importorskip("numpy")
+    path = write_data_file(str(tmp_path / "gps.dat"))
+
+    for mmap in (False, True):
+        data = read_binary_data_file(path, mmap=mmap)
+        assert list(data['timestamp_ns']) == [timestamp_ns for timestamp_ns, _ in RECORDS]
+        assert list(data['satellites']) == [values[2] for _, values in RECORDS]
+
+
+def test_compressed_rotated_segment(tmp_path):
+    opener = lambda path: open_binary_data_file(path, SCHEMA)[0]
+    max_bytes = 2 * SCHEMA.record_size  # headers written by the opener are not counted
+    data_file = RotatingDataFile(str(tmp_path), "gps", ".dat", opener, max_bytes, 0, Compression.GZIP,
+                                 logging.getLogger("test"))
+    for timestamp_ns, values in RECORDS:
+        data_file.write(SCHEMA.pack(timestamp_ns, values))
+    data_file.close()
+    data_file.compressor_thread.join(timeout=10)
+
+    with open(tmp_path / "gps.index.json") as index_file:
+        index = json.load(index_file)
+    assert [entry["file"] for entry in index] == [f"gps.seg{segment:05}.dat.gz" for segment in (1, 2, 3)]
+
+    timestamps = []
+    for entry in index:
+        segment_path = str(tmp_path / entry["file"])
+        with open_segment(segment_path) as segment:
+            schema, _ = read_header(segment)
+            timestamps += [record[0] for record in schema.unpack_all(segment.read())]
+        assert binary_to_csv(segment_path, str(tmp_path / "segment.csv")) >= 1
+    assert timestamps == [timestamp_ns for timestamp_ns, _ in RECORDS]
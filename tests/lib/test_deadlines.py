@@ -0,0 +1,92 @@
+from EosPayload.lib.orcheostrator.deadlines import DeadlineHeap
+
+
+def test_due_earliest_first():
+    deadlines = DeadlineHeap()
+    deadlines.schedule('c', 30.0)
+    deadlines.schedule('a', 10.0)
+    deadlines.schedule('b', 20.0)
+
+    assert deadlines.next_deadline() == 10.0
+    assert deadlines.pop_due(5.0) == []
+    assert deadlines.pop_due(20.0) == ['a', 'b']
+    assert 'a' not in deadlines and 'c' in deadlines
+    assert len(deadlines) == 1
+    assert deadlines.next_deadline() == 30.0
+
+
+def test_same_deadline():
+    deadlines = DeadlineHeap()
+    # keys that can't be compared with each other
+    first, second = ('heartbeat', object()), ('heartbeat', object())
+    deadlines.schedule(first, 10.0)
+    deadlines.schedule(second, 10.0)
+
+    assert deadlines.pop_due(10.0) == [first, second]
+
+
+def test_reschedule_later():
+    deadlines = DeadlineHeap()
+    deadlines.schedule('a', 10.0)
+    deadlines.schedule('b', 15.0)
+    deadlines.schedule('a', 20.0)
+
+    assert len(deadlines) == 2
+    assert deadlines.pop_due(10.0) == []
+    assert deadlines.pop_due(15.0) == ['b']
+    assert deadlines.next_deadline() == 20.0
+    assert deadlines.pop_due(20.0) == ['a']
+
+
+def test_reschedule_earlier():
+    deadlines = DeadlineHeap()
+    deadlines.schedule('a', 20.0)
+    deadlines.schedule('a', 5.0)
+
+    assert deadlines.next_deadline() == 5.0
+    assert deadlines.pop_due(5.0) == ['a']
+    # the superseded deadline doesn't fire
+    assert deadlines.next_deadline() is None
+    assert deadlines.pop_due(20.0) == []
+
+
+def test_reschedule_to_the_same_deadline():
+    deadlines = DeadlineHeap()
+    deadlines.schedule('a', 10.0)
+    deadlines.schedule('a', 10.0)
+
+    assert len(deadlines) == 1
+    assert deadlines.pop_due(10.0) == ['a']
+    assert deadlines.pop_due(10.0) == []
+
+
+def test_cancel():
+    deadlines = DeadlineHeap()
+    deadlines.schedule('a', 10.0)
+    deadlines.schedule('b', 20.0)
+    deadlines.cancel('a')
+    deadlines.cancel('not scheduled')
+
+    assert 'a' not in deadlines
+    assert deadlines.next_deadline() == 20.0
+    assert deadlines.pop_due(20.0) == ['b']
+
+
+def test_cancel_and_schedule_again():
+    deadlines = DeadlineHeap()
+    deadlines.schedule('a', 10.0)
+    deadlines.cancel('a')
+    deadlines.schedule('a', 10.0)
+
+    assert deadlines.pop_due(10.0) == ['a']
+    assert len(deadlines) == 0
+
+
+def test_clear():
+    deadlines = DeadlineHeap()
+    deadlines.schedule('a', 10.0)
+    deadlines.clear()
+
+    assert len(deadlines) == 0
+    assert deadlines.next_deadline() is None
+    assert deadlines.pop_due(10.0) == []
@@ -0,0 +1,166 @@
+import random
+import struct
+
+import pytest
+from EosLib.device import Device
+from EosLib.format.definitions import Type
+
+from EosPayload.lib.radio.encoding import ENCODED_MAGIC, MAX_EXPANSION, DeltaDecoder, DeltaEncoder, EncodingConfig, \
+    build_dictionary, xor_delta
+
+SENDER = Device.GPS
+
+
+def reading(i: int) -> bytes:
+    """ :return: a packet that differs only slightly from the previous one """
+    return struct.pack('<BBBdddd', SENDER, Type.POSITION, 9, 1.7e9 + i, 33.7756 + i * 1e-6, -84.3963, 300.0 + i / 10)
+
+
+def is_keyframe(frame: bytes) -> bool:
+    return frame.startswith(ENCODED_MAGIC) and bool(frame[2] & 0x01)
+
+
+def keyframe_id(frame: bytes) -> int:
+    return frame[5]
+
+
+def encoder(**kwargs) -> DeltaEncoder:
+    return DeltaEncoder(EncodingConfig(enabled=True, types=[Type.POSITION], **kwargs))
+
+
+def test_xor_delta_round_trip():
+    payload, reference = b'\x01\x02\x03\x04\x05', b'\x01\x02\xff'
+    delta = xor_delta(payload, reference)
+
+    assert delta[:2] == b'\x00\x00'
+    assert xor_delta(delta, reference) == payload
+
+
+def test_round_trip():
+    sender = encoder(keyframe_interval=5)
+    receiver = DeltaDecoder()
+    packets = [reading(i) for i in range(50)]
+
+    frames = [sender.encode(SENDER, Type.POSITION, packet, float(i)) for i, packet in enumerate(packets)]
+
+    assert [receiver.decode(frame) for frame in frames] == packets
+    assert sum(len(frame) for frame in frames) < sum(len(packet) for packet in packets)
+    assert all(len(frame) <= len(packet) + MAX_EXPANSION for frame, packet in zip(frames, packets))
+    stats = sender.stats[Type.POSITION]
+    assert (stats.packets, stats.keyframes, stats.deltas) == (50, 10, 40)
+
+
+def test_round_trip_with_dictionary():
+    dictionary = build_dictionary([reading(i) for i in range(-100, 0)])
+    sender = DeltaEncoder(EncodingConfig(enabled=True, types=[Type.POSITION]), dictionary)
+    receiver = DeltaDecoder(dictionary)
+
+    for i in range(20):
+        packet = reading(i)
+        assert receiver.decode(sender.encode(SENDER, Type.POSITION, packet, float(i))) == packet
+
+
+def test_keyframe_max_age():
+    sender = encoder(keyframe_interval=100, keyframe_max_age=10.0)
+
+    assert is_keyframe(sender.encode(SENDER, Type.POSITION, reading(0), 0.0))
+    assert not is_keyframe(sender.encode(SENDER, Type.POSITION, reading(1), 5.0))
+    assert is_keyframe(sender.encode(SENDER, Type.POSITION, reading(2), 10.0))
+
+
+def test_lost_keyframe():
+    sender = encoder(keyframe_interval=4)
+    receiver = DeltaDecoder()
+    packets = [reading(i) for i in range(12)]
+    frames = [sender.encode(SENDER, Type.POSITION, packet, float(i)) for i, packet in enumerate(packets)]
+    assert is_keyframe(frames[4]) and is_keyframe(frames[8])
+
+    decoded = [receiver.decode(frame) for i, frame in enumerate(frames) if i != 4]
+
+    # the deltas against the lost keyframe are dropped, not decoded against the previous one
+    assert decoded == packets[:4] + [None] * 3 + packets[8:]
+    assert receiver.missing_keyframe == 3
+
+
+def test_forget_sends_a_new_keyframe():
+    sender = encoder(keyframe_interval=10)
+    receiver = DeltaDecoder()
+    receiver.decode(sender.encode(SENDER, Type.POSITION, reading(0), 0.0))
+    receiver.decode(sender.encode(SENDER, Type.POSITION, reading(1), 1.0))
+
+    sender.forget(SENDER, Type.POSITION)
+    lost = sender.encode(SENDER, Type.POSITION, reading(2), 2.0)
+    delta = sender.encode(SENDER, Type.POSITION, reading(3), 3.0)
+
+    assert is_keyframe(lost)
+    assert keyframe_id(lost) == 1
+    # the receiver never got keyframe 1, and doesn't decode its delta against keyframe 0
+    assert receiver.decode(delta) is None
+
+
+def test_keyframe_id_wraps_around():
+    sender = encoder(keyframe_interval=2)
+    receiver = DeltaDecoder()
+    keyframe_ids = []
+
+    for i in range(600):
+        packet = reading(i)
+        frame = sender.encode(SENDER, Type.POSITION, packet, float(i))
+        if is_keyframe(frame):
+            keyframe_ids.append(keyframe_id(frame))
+        assert receiver.decode(frame) == packet
+
+    assert keyframe_ids == [i % 256 for i in range(300)]
+    assert receiver.missing_keyframe == 0
+
+
+def test_senders_and_types_are_encoded_separately():
+    sender = DeltaEncoder(EncodingConfig(enabled=True, types=[Type.POSITION, Type.TELEMETRY_DATA]))
+    receiver = DeltaDecoder()
+    streams = [(SENDER, Type.POSITION), (Device.RADIO, Type.POSITION), (SENDER, Type.TELEMETRY_DATA)]
+
+    for i in range(30):
+        for stream_sender, data_type in streams:
+            packet = bytes([stream_sender, data_type]) + reading(i)
+            assert receiver.decode(sender.encode(stream_sender, data_type, packet, float(i))) == packet
+
+
+def test_unencoded_packets_pass_through():
+    sender = encoder()
+    receiver = DeltaDecoder()
+    packet = b'ping'
+
+    assert sender.encode(SENDER, Type.PING, packet, 0.0) == packet
+    assert receiver.decode(packet) == packet
+    assert receiver.decode(ENCODED_MAGIC) == ENCODED_MAGIC  # too short to be encoded
+
+
+def test_incompressible_delta_is_sent_unchanged():
+    sender = encoder(keyframe_interval=10)
+    receiver = DeltaDecoder()
+    receiver.decode(sender.encode(SENDER, Type.POSITION, bytes(range(64)), 0.0))
+    noise = random.Random(1).randbytes(64)
+
+    frame = sender.encode(SENDER, Type.POSITION, noise, 1.0)
+
+    assert frame == noise
+    assert receiver.decode(frame) == noise
+
+
+def test_corrupt_frame():
+    frame = encoder().encode(SENDER, Type.POSITION, bytes(64), 0.0)
+    assert frame[2] & 0x02  # deflated
+
+    with pytest.raises(ValueError):
+        DeltaDecoder().decode(frame[:6] + b'\xff' * 8)
+
+
+def test_config_from_settings():
+    config = EncodingConfig.from_settings({"encoding": {"enabled": True, "types": ["POSITION"]}})
+
+    assert config.enabled
+    assert config.types == [Type.POSITION]
+    with pytest.raises(ValueError):
+        EncodingConfig.from_settings({"encoding": {"types": ["NOT_A_TYPE"]}})
+    with pytest.raises(ValueError):
+        EncodingConfig.from_settings({"encoding": {"keyframe_interval": 0}})
@@ -0,0 +1,44 @@
+import logging
+
+import pytest
+
+from EosPayload.lib.logger import LoggingConfig, init_logging, shutdown_logging
+
+
+@pytest.fixture(autouse=True)
+def restore_root_handlers():
+    root = logging.getLogger('')
+    handlers, level = root.handlers[:], root.level
+    yield
+    root.handlers[:] = handlers
+    root.setLevel(level)
+
+
+@pytest.mark.parametrize("queued", [False, True])
+def test_pending_summaries_are_logged_at_shutdown(tmp_path, queued):
+    log_path = tmp_path / "test.log"
+    init_logging(str(log_path), LoggingConfig(queued=queued, dedup=True, rate_limit=1.0, rate_limit_burst=2))
+    repeating = logging.getLogger("repeating")
+    for _ in range(5):
+        repeating.error("sensor not responding")
+    chatty = logging.getLogger("chatty")
+    for i in range(5):
+        chatty.info(f"reading {i}")
+
+    shutdown_logging()
+
+    log = log_path.read_text()
+    assert log.count("sensor not responding") == 2
+    assert "previous message repeated 4 more times: sensor not responding" in log
+    assert "3 messages suppressed by rate limit" in log
+
+
+def test_dedup_is_off_by_default(tmp_path):
+    log_path = tmp_path / "test.log"
+    init_logging(str(log_path))
+    for _ in range(3):
+        logging.getLogger("repeating").error("sensor not responding")
+
+    shutdown_logging()
+
+    assert log_path.read_text().count("sensor not responding") == 3
@@ -0,0 +1,186 @@
+import paho.mqtt.client as mosquitto
+import pytest
+
+from EosPayload.lib.mqtt import client as mqtt_client
+from EosPayload.lib.mqtt.client import Client
+from EosPayload.lib.mqtt.resilience import _RECORD_HEADER, ResilienceConfig, SpillQueue
+
+
+RECORDS = [("a/topic", b"first", False), ("b/topic", b"second", True), ("a/topic", b"", False)]
+
+
+@pytest.fixture
+def spill_path(tmp_path) -> str:
+    return str(tmp_path / "spill.bin")
+
+
+def drain(spill: SpillQueue) -> list[tuple[str, bytes, bool]]:
+    records = []
+    while (record := spill.pop()) is not None:
+        records.append(record)
+    return records
+
+
+def test_records_pop_in_order(spill_path):
+    spill = SpillQueue(spill_path, 1024)
+    for record in RECORDS:
+        assert spill.put(*record)
+
+    assert drain(spill) == RECORDS
+    assert not spill.pending
+    assert (spill.spilled, spill.replayed, spill.dropped) == (3, 3, 0)
+
+
+def test_records_survive_reopen(spill_path):
+    spill = SpillQueue(spill_path, 1024)
+    for record in RECORDS:
+        spill.put(*record)
+    spill.close()
+
+    reopened = SpillQueue(spill_path, 1024)
+
+    assert reopened.pending
+    assert drain(reopened) == RECORDS
+
+
+def test_file_is_truncated_once_drained(spill_path, tmp_path):
+    spill = SpillQueue(spill_path, 1024)
+    spill.put(*RECORDS[0])
+    drain(spill)
+    spill.put(*RECORDS[1])
+
+    assert drain(spill) == [RECORDS[1]]
+    assert (tmp_path / "spill.bin").stat().st_size == 0
+
+
+def test_full_queue_drops_new_records(spill_path):
+    record_size = _RECORD_HEADER.size + len("a/topic") + len(b"first")
+    spill = SpillQueue(spill_path, 2 * record_size)
+
+    assert spill.put("a/topic", b"first", False)
+    assert spill.put("a/topic", b"first", False)
+    assert not spill.put("a/topic", b"later", False)
+
+    # the oldest records are the ones kept
+    assert drain(spill) == [("a/topic", b"first", False)] * 2
+    assert spill.dropped == 1
+
+
+@pytest.mark.parametrize("cut", [1, _RECORD_HEADER.size + 3])
+def test_truncated_trailing_record_is_dropped(spill_path, cut):
+    spill = SpillQueue(spill_path, 1024)
+    spill.put(*RECORDS[0])
+    spill.put(*RECORDS[1])
+    spill.close()
+    with open(spill_path, 'r+b') as f:
+        size = f.seek(0, 2)
+        f.truncate(size - (_RECORD_HEADER.size + len("b/topic") + len(b"second")) + cut)
+
+    reopened = SpillQueue(spill_path, 1024)
+
+    assert drain(reopened) == [RECORDS[0]]
+    assert reopened.replayed == 1
+    # and the queue is usable again afterwards
+    assert reopened.put(*RECORDS[2])
+    assert drain(reopened) == [RECORDS[2]]
+
+
+def test_corrupt_record_stops_replay(spill_path):
+    with open(spill_path, 'wb') as f:
+        f.write(_RECORD_HEADER.pack(0, 2, 1) + b"\xff\xfex")
+        f.write(_RECORD_HEADER.pack(0, 1, 1) + b"ty")
+
+    spill = SpillQueue(spill_path, 1024)
+
+    assert spill.pop() is None
+    assert not spill.pending
+    assert spill.replayed == 0
+
+
+@pytest.mark.parametrize("spill_max_bytes", [0, -1])
+def test_non_positive_spill_max_bytes_disables_spilling(spill_max_bytes):
+    config = ResilienceConfig.from_settings({"mqtt": {"resilient": True, "spill_max_bytes": spill_max_bytes}},
+                                            spill_path="spill.bin")
+
+    assert config.resilient
+    assert config.spill_path is None
+
+
+class Broker:
+    def __init__(self):
+        self.connected = False
+        self.published = []
+
+    def publish(self, topic, payload, qos=0, retain=False, properties=None):
+        self.published.append((topic, payload, properties is not None))
+        info = mosquitto.MQTTMessageInfo(0)
+        info._set_as_published()
+        return info
+
+
+@pytest.fixture
+def broker(monkeypatch) -> Broker:
+    fake_broker = Broker()
+    # nothing actually connects; the test decides whether the client is connected
+    monkeypatch.setattr(mosquitto.Client, 'connect_async', lambda *args, **kwargs: None)
+    monkeypatch.setattr(mosquitto.Client, 'loop_start', lambda self: None)
+    monkeypatch.setattr(mosquitto.Client, 'loop_stop', lambda self, force=False: None)
+    monkeypatch.setattr(mosquitto.Client, 'is_connected', lambda self: fake_broker.connected)
+    monkeypatch.setattr(mosquitto.Client, 'publish', lambda self, *args, **kwargs: fake_broker.publish(*args, **kwargs))
+    monkeypatch.setattr(mqtt_client.time, 'sleep', lambda seconds: None)
+    return fake_broker
+
+
+def resilient_client(spill_path: str) -> Client:
+    return Client("localhost", resilience=ResilienceConfig(resilient=True, spill_path=spill_path))
+
+
+def test_publishes_spill_while_disconnected(broker, spill_path):
+    client = resilient_client(spill_path)
+
+    info = client.publish_batch("a/topic", [b"first"])
+    client.publish_batch("b/topic", [b"second", b"third"])
+
+    assert info.rc == mosquitto.MQTT_ERR_SUCCESS
+    assert broker.published == []
+    assert client._spill.spilled == 2
+
+
+def test_spilled_publishes_replay_in_order_on_reconnect(broker, spill_path):
+    client = resilient_client(spill_path)
+    for payload in [b"first", b"second", b"third"]:
+        client.publish_batch("a/topic", [payload])
+
+    broker.connected = True
+    assert client.on_connect == client._handle_connect
+    client.on_connect(client, None, None, 0)
+    client._replay_thread.join(timeout=5)
+
+    assert [payload for _, payload, _ in broker.published] == [b"first", b"second", b"third"]
+    assert not client._spill.pending
+    # with the spill drained, publishes go straight out again
+    client.publish_batch("a/topic", [b"fourth"])
+    assert broker.published[-1] == ("a/topic", b"fourth", False)
+
+
+def test_publishes_queue_behind_pending_replay(broker, spill_path):
+    client = resilient_client(spill_path)
+    client.publish_batch("a/topic", [b"first"])
+
+    broker.connected = True
+    # connected, but the spilled message hasn't been replayed yet
+    client.publish_batch("a/topic", [b"second"])
+    assert broker.published == []
+    client._replay_spill()
+
+    assert [payload for _, payload, _ in broker.published] == [b"first", b"second"]
+
+
+def test_replay_stops_when_the_connection_drops(broker, spill_path):
+    client = resilient_client(spill_path)
+    client.publish_batch("a/topic", [b"first"])
+
+    client._replay_spill()
+
+    assert broker.published == []
+    assert client._spill.pending
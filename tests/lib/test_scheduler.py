@@ -0,0 +1,207 @@
+from types import SimpleNamespace
+
+import pytest
+from EosLib.device import Device
+from EosLib.format.definitions import Type
+from EosLib.packet.definitions import Priority
+
+from EosPayload.lib.radio import scheduler
+from EosPayload.lib.radio.scheduler import DownlinkConfig, DownlinkScheduler, DropPolicy, NEVER_SUPERSEDE, PutResult
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    fake_clock = Clock()
+    monkeypatch.setattr(scheduler.time, 'monotonic', lambda: fake_clock.now)
+    return fake_clock
+
+
+def make_packet(data_type: Type = Type.DATA, sender: Device = Device.GPS):
+    # the scheduler only reads the data header
+    return SimpleNamespace(data_header=SimpleNamespace(sender=sender, data_type=data_type))
+
+
+def unpaced(**kwargs) -> DownlinkScheduler:
+    return DownlinkScheduler(DownlinkConfig(rate=0, **kwargs))
+
+
+def put(downlink: DownlinkScheduler, priority: Priority, size: int = 10, data_type: Type = Type.DATA,
+        sender: Device = Device.GPS) -> tuple[object, PutResult]:
+    packet = make_packet(data_type, sender)
+    return packet, downlink.put(packet, b'x' * size, priority)
+
+
+def test_fair_share_under_backlog(clock):
+    downlink = unpaced(max_wait=0)
+    for _ in range(50):
+        put(downlink, Priority.TELEMETRY)
+        put(downlink, Priority.DATA)
+
+    sent = [downlink.get(timeout=0).priority for _ in range(50)]
+
+    # TELEMETRY is weighted 4, DATA 1
+    assert 39 <= sent.count(Priority.TELEMETRY) <= 41
+    assert 9 <= sent.count(Priority.DATA) <= 11
+
+
+def test_data_keeps_moving_behind_telemetry(clock):
+    downlink = unpaced(max_wait=0)
+    put(downlink, Priority.DATA)
+    for _ in range(20):
+        put(downlink, Priority.TELEMETRY)
+
+    sent = [downlink.get(timeout=0).priority for _ in range(6)]
+
+    assert Priority.DATA in sent
+
+
+def test_strict_class_goes_first(clock):
+    downlink = unpaced(max_wait=1.0)
+    put(downlink, Priority.DATA)
+    put(downlink, Priority.TELEMETRY)
+    clock.advance(10.0)
+    put(downlink, Priority.URGENT)
+    put(downlink, Priority.URGENT)
+
+    # ahead of older packets, even ones past max_wait
+    assert [downlink.get(timeout=0).priority for _ in range(2)] == [Priority.URGENT, Priority.URGENT]
+
+
+def test_aging_past_max_wait(clock):
+    downlink = unpaced(max_wait=5.0)
+    data, _ = put(downlink, Priority.DATA, size=200)
+    for _ in range(10):
+        put(downlink, Priority.TELEMETRY)
+
+    assert downlink.get(timeout=0).priority == Priority.TELEMETRY
+    clock.advance(5.0)
+    entry = downlink.get(timeout=0)
+
+    assert entry.packet is data
+    assert downlink.metrics()[Priority.DATA].aged == 1
+
+
+def test_pacing_delay(clock):
+    downlink = DownlinkScheduler(DownlinkConfig(rate=100.0, burst=100, frame_overhead=0))
+    put(downlink, Priority.TELEMETRY, size=100)
+    put(downlink, Priority.TELEMETRY, size=50)
+
+    assert downlink.get(timeout=0) is not None
+    assert downlink.get(timeout=0) is None
+    clock.advance(0.4)
+    assert downlink.get(timeout=0) is None
+    clock.advance(0.1)
+    assert downlink.get(timeout=0) is not None
+
+
+def test_refund_credits_unsent_bytes(clock):
+    downlink = DownlinkScheduler(DownlinkConfig(rate=100.0, burst=100, frame_overhead=0))
+    put(downlink, Priority.TELEMETRY, size=100)
+    put(downlink, Priority.TELEMETRY, size=50)
+
+    downlink.get(timeout=0)
+    downlink.refund(Priority.TELEMETRY, 50)
+
+    assert downlink.get(timeout=0) is not None
+
+
+def test_supersession(clock):
+    downlink = unpaced(supersede=[Type.POSITION])
+    put(downlink, Priority.TELEMETRY, data_type=Type.TELEMETRY_DATA)
+    _, first = put(downlink, Priority.TELEMETRY, data_type=Type.POSITION)
+    newest, second = put(downlink, Priority.TELEMETRY, data_type=Type.POSITION)
+    _, other_sender = put(downlink, Priority.TELEMETRY, data_type=Type.POSITION, sender=Device.RADIO)
+
+    assert (first, second, other_sender) == (PutResult.QUEUED, PutResult.SUPERSEDED, PutResult.QUEUED)
+    assert len(downlink) == 3
+    downlink.get(timeout=0)
+    # in the superseded packet's place, ahead of the other sender's
+    assert downlink.get(timeout=0).packet is newest
+    assert downlink.metrics()[Priority.TELEMETRY].superseded == 1
+
+
+@pytest.mark.parametrize("data_type", NEVER_SUPERSEDE)
+def test_commands_are_never_superseded(clock, data_type):
+    downlink = unpaced(supersede=[Type.POSITION])
+    results = [put(downlink, Priority.TELEMETRY, data_type=data_type)[1] for _ in range(3)]
+
+    assert results == [PutResult.QUEUED] * 3
+    assert len(downlink) == 3
+    with pytest.raises(ValueError):
+        DownlinkConfig.from_settings({"downlink": {"supersede": [data_type.name]}})
+
+
+def test_strict_classes_are_never_superseded(clock):
+    downlink = unpaced(supersede=[Type.POSITION])
+    results = [put(downlink, Priority.URGENT, data_type=Type.POSITION)[1] for _ in range(2)]
+
+    assert results == [PutResult.QUEUED] * 2
+
+
+def test_drop_oldest(clock):
+    downlink = unpaced(max_packets=3)
+    packets = [put(downlink, Priority.DATA)[0] for _ in range(3)]
+    newest, result = put(downlink, Priority.DATA)
+
+    assert result == PutResult.QUEUED
+    assert [downlink.get(timeout=0).packet for _ in range(3)] == packets[1:] + [newest]
+    assert downlink.metrics()[Priority.DATA].dropped == 1
+
+
+def test_drop_oldest_of_a_less_important_class(clock):
+    downlink = unpaced(max_packets=3)
+    for _ in range(3):
+        put(downlink, Priority.DATA)
+
+    assert put(downlink, Priority.TELEMETRY)[1] == PutResult.QUEUED
+    assert downlink.metrics()[Priority.DATA].dropped == 1
+    # but not of a more important one
+    downlink = unpaced(max_packets=3)
+    for _ in range(3):
+        put(downlink, Priority.TELEMETRY)
+    assert put(downlink, Priority.DATA)[1] == PutResult.DROPPED
+
+
+def test_drop_newest(clock):
+    downlink = unpaced(max_packets=3, drop_policies={Priority.DATA: DropPolicy.DROP_NEWEST})
+    packets = [put(downlink, Priority.DATA)[0] for _ in range(3)]
+
+    assert put(downlink, Priority.DATA)[1] == PutResult.DROPPED
+    assert [downlink.get(timeout=0).packet for _ in range(3)] == packets
+    assert downlink.metrics()[Priority.DATA].dropped == 1
+
+
+def test_never_drop(clock):
+    downlink = unpaced(max_packets=3, drop_policies={Priority.URGENT: DropPolicy.NEVER_DROP})
+    results = [put(downlink, Priority.URGENT)[1] for _ in range(5)]
+
+    assert results == [PutResult.QUEUED] * 5
+    assert len(downlink) == 5
+    # and never dropped to make room for others
+    assert put(downlink, Priority.DATA)[1] == PutResult.DROPPED
+    assert downlink.metrics()[Priority.URGENT].dropped == 0
+
+
+def test_backpressure_hysteresis(clock):
+    downlink = unpaced(max_packets=10, backpressure_high=0.8, backpressure_low=0.5)
+    for _ in range(7):
+        put(downlink, Priority.DATA)
+    assert not downlink.backpressure
+
+    put(downlink, Priority.DATA)
+    assert downlink.backpressure
+    downlink.get(timeout=0)
+    downlink.get(timeout=0)
+    assert downlink.backpressure  # 0.6 is between the water marks
+    downlink.get(timeout=0)
+    assert not downlink.backpressure
+    put(downlink, Priority.DATA)
+    assert not downlink.backpressure
@@ -0,0 +1,62 @@
+import pytest
+
+from EosPayload.lib.data_log import DataLogConfig
+from EosPayload.lib.logger import LoggingConfig
+from EosPayload.lib.orcheostrator.scheduling import SchedulingConfig
+from EosPayload.lib.orcheostrator.shutdown import ShutdownConfig
+from EosPayload.lib.orcheostrator.supervisor import RestartConfig
+from EosPayload.lib.radio.scheduler import DownlinkConfig
+from EosPayload.lib.util import settings_section
+
+
+def test_settings_section():
+    assert settings_section(None, "restart") == {}
+    assert settings_section({}, "restart") == {}
+    assert settings_section({"restart": None}, "restart") == {}
+    assert settings_section({"restart": {"enabled": True}}, "restart") == {"enabled": True}
+
+
+@pytest.mark.parametrize("settings", [True, [], {"restart": True}, {"restart": [1]}, {"restart": "yes"}])
+def test_settings_section_must_be_a_dict(settings):
+    with pytest.raises(ValueError):
+        settings_section(settings, "restart")
+
+
+@pytest.mark.parametrize("parse, settings", [
+    (ShutdownConfig.from_settings, {"shutdown": True}),
+    (ShutdownConfig.from_settings, {"shutdown": {"timeout": None}}),
+    (ShutdownConfig.from_settings, {"shutdown": {"timeout": "soon"}}),
+    (SchedulingConfig.from_settings, {"scheduling": {"cpus": 3}}),
+    (DownlinkConfig.from_settings, {"downlink": {"weights": [1]}}),
+    (DataLogConfig.from_settings, {"data_log": True}),
+    (DataLogConfig.from_settings, {"data_log": {"flush_rows": None}}),
+    (DataLogConfig.from_settings, {"data_log": {"format": "bin"}}),
+    (DataLogConfig.from_settings, {"data_log": {"queue_capacity": 0}}),
+])
+def test_bad_types_raise_value_error(parse, settings):
+    with pytest.raises(ValueError):
+        parse(settings)
+
+
+@pytest.mark.parametrize("settings", [
+    {"restart": {"window": None}},
+    {"restart": {"max_restarts": "many"}},
+    {"restart": 1},
+])
+def test_bad_restart_settings(settings):
+    with pytest.raises(ValueError):
+        RestartConfig.from_settings(settings)
+    with pytest.raises(ValueError):
+        RestartConfig.from_settings(None, settings)
+
+
+@pytest.mark.parametrize("settings", [
+    {"logging": True},
+    {"logging": {"console_level": 1.5}},
+    {"logging": {"file_level": None}},
+    {"logging": {"file_level": "LOUD"}},
+    {"logging": {"rate_limit": None}},
+])
+def test_bad_logging_settings(settings):
+    with pytest.raises(ValueError):
+        LoggingConfig.from_settings(settings)